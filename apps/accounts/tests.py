@@ -1,3 +1,28 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
 
-# Create your tests here.
+from apps.core.testing import QueryBudgetTestCase
+from apps.posts.seeding import Seeder, scaled
+
+
+class ProfileQueryTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeder = Seeder(seed=1)
+        cls.seeder.run(**scaled(20))
+
+    def test_profile(self):
+        self.client.force_login(User.objects.earliest("pk"))
+        self.assertQueryBudget(
+            reverse("profile"), 6, lambda: self.seeder.run(**scaled(40))
+        )
+
+    def test_profile_changelist(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "x")
+        )
+        self.assertQueryBudget(
+            reverse("admin:accounts_profile_changelist"),
+            5,
+            lambda: self.seeder.create_users(20),
+        )
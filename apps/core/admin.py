@@ -1,3 +1,24 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ImageManifest, OutboundEmail, PendingDerivatives
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ["subject", "recipients", "status", "attempts", "created_at", "sent_at"]
+    list_filter = ["status", "created_at"]
+    search_fields = ["subject", "recipients"]
+    readonly_fields = ["last_error", "sent_at"]
+
+
+@admin.register(PendingDerivatives)
+class PendingDerivativesAdmin(admin.ModelAdmin):
+    list_display = ["name", "attempts", "next_attempt_at", "created_at"]
+    search_fields = ["name"]
+    readonly_fields = ["last_error"]
+
+
+@admin.register(ImageManifest)
+class ImageManifestAdmin(admin.ModelAdmin):
+    list_display = ["name", "updated_at"]
+    search_fields = ["name"]
@@ -1,5 +1,40 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
 
 class CoreConfig(AppConfig):
+    # The module also holds the staticfiles config; "apps.core" means this one.
+    default = True
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        from django.apps import apps
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_init, post_save
+
+        from . import images, timing
+
+        connection_created.connect(timing.instrument_connection)
+
+        for label in images.IMAGE_FIELDS:
+            model = apps.get_model(label)
+            post_init.connect(images.remember_image, sender=model)
+            post_save.connect(images.image_saved, sender=model)
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    # The site only links Font Awesome's CSS and webfonts (or the subset
+    # built from them); its SVGs, sprites, JS and sources are thousands
+    # of files that collectstatic would otherwise hash and compress.
+    ignore_patterns = BaseStaticFilesConfig.ignore_patterns + [
+        f"vendor/fontawesome-free-*/{directory}/*"
+        for directory in (
+            "js",
+            "metadata",
+            "scss",
+            "sprites",
+            "sprites-full",
+            "svgs",
+            "svgs-full",
+        )
+    ]
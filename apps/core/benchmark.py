@@ -0,0 +1,287 @@
+"""
+View benchmarks through the Django test client.
+
+Each size gets a fresh test database, seeded with ``apps.posts.seeding``
+at that many posts, and a private in-memory cache, so runs do not touch
+development data and start from the same state. Requests are made as a
+logged-in seeded user: that path skips the anonymous page cache and is
+the one whose cost grows with the data.
+
+``sqlite_concurrency`` is a separate benchmark for SQLite deployments: it
+seeds a file database once per connection profile, then has reader
+processes load comment threads while writer processes add comments, and
+reports the throughput and lock errors of each side.
+"""
+
+import multiprocessing
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection, connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.core import cache
+from apps.posts.comments import load_comment_thread
+from apps.posts.models import Category, Comment, Post
+from apps.posts.seeding import USERNAME_PREFIX, Seeder, scaled
+
+VIEWS = ("home", "post_detail", "search", "category_view", "profile")
+
+BENCHMARK_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(settings.BASE_DIR),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def view_urls():
+    """One representative URL per benchmarked view, from the seeded data."""
+    post = (
+        Post.objects.filter(status="published")
+        .order_by("-comment_count", "pk")
+        .first()
+    )
+    category = Category.objects.order_by("pk").first()
+    return {
+        "home": reverse("home"),
+        "post_detail": post.get_absolute_url(),
+        "search": f"{reverse('search')}?q=engine",
+        "category_view": reverse("category_view", args=[category.slug]),
+        "profile": reverse("profile"),
+    }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, round(fraction * len(sorted_values)) - 1)]
+
+
+def measure(client, url, repeat):
+    client.get(url)  # warm up caches and lazy imports
+    timings, queries, size, status = [], 0, 0, None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = len(captured.captured_queries)
+        size = len(response.content)
+        status = response.status_code
+    timings.sort()
+    return {
+        "status": status,
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "min_ms": round(timings[0], 3),
+        "queries": queries,
+        "bytes": size,
+    }
+
+
+def run_size(posts, repeat, views=VIEWS, seed=0):
+    Seeder(seed=seed).run(**scaled(posts))
+    user = User.objects.filter(username__startswith=USERNAME_PREFIX).earliest("pk")
+    client = Client()
+    client.force_login(user)
+    urls = view_urls()
+    return [
+        {
+            "size": posts,
+            "view": name,
+            "url": urls[name],
+            **measure(client, urls[name], repeat),
+        }
+        for name in views
+    ]
+
+
+def run(sizes, repeat=20, views=VIEWS, seed=0, progress=None):
+    progress = progress or (lambda message: None)
+    results = []
+    with override_settings(CACHES=BENCHMARK_CACHES, PERF_SAMPLE_RATE=0):
+        for size in sizes:
+            progress(f"Benchmarking {size} posts")
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+            cache.clear_all()
+            try:
+                results.extend(run_size(size, repeat, views, seed))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    ``[(size, view, before, after, flags)]`` for every (size, view) in both
+    runs. Flags are ``"latency"`` when the median grew past ``threshold``
+    and ``"queries"`` when the query count went up.
+    """
+    before = {(row["size"], row["view"]): row for row in baseline["results"]}
+    rows = []
+    for row in current["results"]:
+        old = before.get((row["size"], row["view"]))
+        if old is None:
+            continue
+        flags = []
+        if row["median_ms"] > old["median_ms"] * (1 + threshold):
+            flags.append("latency")
+        if row["queries"] > old["queries"]:
+            flags.append("queries")
+        rows.append((row["size"], row["view"], old, row, flags))
+    return rows
+
+
+SQLITE_PROFILES = ("default", "production")
+
+
+def _sqlite_options(profile):
+    return dict(settings.SQLITE_OPTIONS) if profile == "production" else {}
+
+
+def _read(post_ids, author_ids, rng):
+    load_comment_thread(Post.objects.only("pk").get(pk=rng.choice(post_ids)))
+
+
+def _write(post_ids, author_ids, rng):
+    # Read, then write, in one transaction: the order in which a deferred
+    # transaction deadlocks against another writer.
+    with transaction.atomic():
+        post = Post.objects.only("pk").get(pk=rng.choice(post_ids))
+        Comment.objects.create(
+            post=post, author_id=rng.choice(author_ids), content="Benchmark comment"
+        )
+
+
+def _hammer(operation, post_ids, author_ids, duration, seed):
+    """
+    Repeat ``operation`` for ``duration`` seconds in a worker process.
+    Returns the latencies of the successful calls and the error count.
+    """
+    connections.close_all()  # never share the parent's sqlite handle
+    rng = random.Random(seed)
+    timings, errors = [], 0
+    deadline = time.perf_counter() + duration
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                operation(post_ids, author_ids, rng)
+            except OperationalError:
+                # "database is locked": the request would have been a 500.
+                errors += 1
+            else:
+                timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        connections.close_all()
+    return timings, errors
+
+
+def _summary(outcomes, duration):
+    timings = sorted(value for values, _ in outcomes for value in values)
+    return {
+        "count": len(timings),
+        "per_second": round(len(timings) / duration, 1),
+        "p50_ms": round(percentile(timings, 0.5) or 0, 3),
+        "p95_ms": round(percentile(timings, 0.95) or 0, 3),
+        "errors": sum(errors for _, errors in outcomes),
+    }
+
+
+def contend(readers, writers, duration, seed=0):
+    """
+    Run ``readers`` processes loading comment threads and ``writers``
+    processes adding comments, one transaction per comment, for
+    ``duration`` seconds. Processes rather than threads, like gunicorn
+    workers, so the GIL does not hide the database's own locking.
+    """
+    post_ids = list(
+        Post.objects.filter(status="published").values_list("pk", flat=True)
+    )
+    author_ids = list(User.objects.values_list("pk", flat=True))
+    connections.close_all()
+    jobs = [(_read, post_ids, author_ids, duration, seed + n) for n in range(readers)]
+    jobs += [(_write, post_ids, author_ids, duration, seed - n - 1) for n in range(writers)]
+    # Forked workers inherit the configured settings and the test database.
+    with multiprocessing.get_context("fork").Pool(len(jobs)) as pool:
+        outcomes = pool.starmap(_hammer, jobs)
+    return {
+        "reads": _summary(outcomes[:readers], duration),
+        "writes": _summary(outcomes[readers:], duration),
+    }
+
+
+def sqlite_concurrency(
+    posts=200, readers=4, writers=2, duration=5.0, profiles=SQLITE_PROFILES,
+    seed=0, progress=None,
+):
+    """Compare connection profiles on a throwaway SQLite file per profile."""
+    progress = progress or (lambda message: None)
+    settings_dict = connection.settings_dict
+    saved_options = settings_dict.get("OPTIONS", {})
+    saved_test_name = settings_dict["TEST"].get("NAME")
+    results = []
+    with (
+        override_settings(CACHES=BENCHMARK_CACHES, PERF_SAMPLE_RATE=0),
+        tempfile.TemporaryDirectory() as directory,
+    ):
+        try:
+            for profile in profiles:
+                progress(f"Benchmarking the {profile} profile")
+                connection.close()
+                # Workers open their own connections from this same dict.
+                settings_dict["OPTIONS"] = _sqlite_options(profile)
+                settings_dict["TEST"]["NAME"] = str(Path(directory) / f"{profile}.db")
+                old_name = connection.creation.create_test_db(
+                    verbosity=0, autoclobber=True, serialize=False
+                )
+                cache.clear_all()
+                try:
+                    Seeder(seed=seed).run(**scaled(posts))
+                    results.append(
+                        {"profile": profile, **contend(readers, writers, duration, seed)}
+                    )
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            settings_dict["OPTIONS"] = saved_options
+            settings_dict["TEST"]["NAME"] = saved_test_name
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "sqlite": connection.Database.sqlite_version,
+        "posts": posts,
+        "readers": readers,
+        "writers": writers,
+        "duration": duration,
+        "results": results,
+    }
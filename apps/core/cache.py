@@ -0,0 +1,327 @@
+"""
+Two-level cache used by the apps.
+
+L1 is a small LRU kept in each worker process, L2 is the Django cache
+configured in ``CACHES`` (file based or Redis) and shared by all workers.
+Keys live in namespaces that can be invalidated as a whole by bumping
+their version, and ``get_or_set`` makes sure only one caller recomputes a
+missing value while the others wait for it.
+
+    posts_cache = namespace("posts")
+    post = posts_cache.get_or_set(f"detail:{slug}", load_post, timeout=300)
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+MISSING = object()
+COUNTERS = ("l1_hits", "l2_hits", "misses", "sets", "lock_waits")
+NAMES_KEY = "ns:names"
+
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LRUCache(getattr(settings, "CACHE_L1_MAX_ENTRIES", 1024))
+
+
+class CacheNamespace:
+    def __init__(self, name, alias=DEFAULT_CACHE_ALIAS):
+        self.name = name
+        self.alias = alias
+        self.l1_timeout = getattr(settings, "CACHE_L1_TIMEOUT", 5)
+        self.lock_timeout = getattr(settings, "CACHE_LOCK_TIMEOUT", 30)
+        self.lock_wait = getattr(settings, "CACHE_LOCK_WAIT", 5)
+        self._counts = defaultdict(int)
+        self._counts_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    # -- keys and versions ----------------------------------------------
+
+    @property
+    def _version_key(self):
+        return f"ns:{self.name}:version"
+
+    def version(self):
+        version = local_cache.get(self._version_key)
+        if version is MISSING:
+            version = self.shared.get(self._version_key)
+            if version is None:
+                # Seed from the clock so a version key evicted from L2 never
+                # comes back as a number older entries were stored under.
+                self.shared.add(self._version_key, time.time_ns() // 1000, None)
+                version = self.shared.get(self._version_key)
+            local_cache.set(self._version_key, version, self.l1_timeout)
+        return version
+
+    def make_key(self, key):
+        return f"{self.name}:{self.version()}:{key}"
+
+    def invalidate(self):
+        """Drop every key of the namespace by moving to a new version."""
+        try:
+            version = self.shared.incr(self._version_key)
+        except ValueError:
+            version = time.time_ns() // 1000
+            self.shared.set(self._version_key, version, None)
+        local_cache.set(self._version_key, version, self.l1_timeout)
+        return version
+
+    # -- reads and writes -----------------------------------------------
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        if timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def get(self, key, default=None):
+        full_key = self.make_key(key)
+        value = local_cache.get(full_key)
+        if value is not MISSING:
+            self._count("l1_hits")
+            return value
+        value = self.shared.get(full_key, MISSING)
+        if value is MISSING:
+            self._count("misses")
+            return default
+        self._count("l2_hits")
+        local_cache.set(full_key, value, self.l1_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        full_key = self.make_key(key)
+        self.shared.set(full_key, value, timeout)
+        local_cache.set(full_key, value, self._l1_timeout(timeout))
+        self._count("sets")
+
+    def get_many(self, keys):
+        """
+        ``{key: value}`` for every key found. L1 is checked first and the
+        rest are fetched from L2 in one round trip.
+        """
+        keys = list(dict.fromkeys(keys))
+        found, remote = {}, {}
+        for key in keys:
+            full_key = self.make_key(key)
+            value = local_cache.get(full_key)
+            if value is MISSING:
+                remote[full_key] = key
+            else:
+                self._count("l1_hits")
+                found[key] = value
+        if remote:
+            for full_key, value in self.shared.get_many(list(remote)).items():
+                self._count("l2_hits")
+                local_cache.set(full_key, value, self.l1_timeout)
+                found[remote[full_key]] = value
+            for _ in range(len(keys) - len(found)):
+                self._count("misses")
+        return found
+
+    def set_many(self, mapping, timeout=DEFAULT_TIMEOUT):
+        full = {self.make_key(key): value for key, value in mapping.items()}
+        self.shared.set_many(full, timeout)
+        l1_timeout = self._l1_timeout(timeout)
+        for full_key, value in full.items():
+            local_cache.set(full_key, value, l1_timeout)
+            self._count("sets")
+
+    def delete(self, key):
+        full_key = self.make_key(key)
+        local_cache.delete(full_key)
+        self.shared.delete(full_key)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT):
+        """
+        Return the cached value for ``key``, computing it with ``default()``
+        when missing. Threads of this process share one computation, and
+        across processes a lock in L2 lets a single worker recompute while
+        the rest wait up to ``CACHE_LOCK_WAIT`` seconds for its result.
+        """
+        value = self.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        with self._flight(key):
+            value = self._peek(key)
+            if value is not MISSING:
+                return value
+
+            lock_key = f"lock:{self.make_key(key)}"
+            token = uuid.uuid4().hex
+            if not self.shared.add(lock_key, token, self.lock_timeout):
+                self._count("lock_waits")
+                value = self._wait_for(key)
+                if value is not MISSING:
+                    return value
+            try:
+                value = default() if callable(default) else default
+                self.set(key, value, timeout)
+            finally:
+                if self.shared.get(lock_key) == token:
+                    self.shared.delete(lock_key)
+            return value
+
+    def _peek(self, key):
+        full_key = self.make_key(key)
+        value = local_cache.get(full_key)
+        if value is MISSING:
+            value = self.shared.get(full_key, MISSING)
+        return value
+
+    def _wait_for(self, key):
+        deadline = time.monotonic() + self.lock_wait
+        delay = 0.01
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            value = self._peek(key)
+            if value is not MISSING:
+                local_cache.set(self.make_key(key), value, self.l1_timeout)
+                return value
+            delay = min(delay * 2, 0.2)
+        return MISSING
+
+    def _flight(self, key):
+        with self._flights_lock:
+            lock = self._flights.get(key)
+            if lock is None:
+                lock = self._flights[key] = _FlightLock(self, key)
+            lock.users += 1
+        return lock
+
+    def _land(self, flight):
+        with self._flights_lock:
+            flight.users -= 1
+            if not flight.users:
+                self._flights.pop(flight.key, None)
+
+    # -- statistics -----------------------------------------------------
+
+    def _count(self, counter):
+        with self._counts_lock:
+            self._counts[counter] += 1
+        if time.monotonic() - self._last_flush > getattr(
+            settings, "CACHE_STATS_FLUSH_INTERVAL", 10
+        ):
+            self.flush_stats()
+
+    def _stats_key(self, counter):
+        return f"stats:{self.name}:{counter}"
+
+    def flush_stats(self):
+        """Add this process' counters to the totals kept in L2."""
+        with self._counts_lock:
+            counts, self._counts = self._counts, defaultdict(int)
+            self._last_flush = time.monotonic()
+        if counts:
+            names = self.shared.get(NAMES_KEY, set())
+            if self.name not in names:
+                self.shared.set(NAMES_KEY, names | {self.name}, None)
+        for counter, delta in counts.items():
+            key = self._stats_key(counter)
+            if not self.shared.add(key, delta, None):
+                try:
+                    self.shared.incr(key, delta)
+                except ValueError:
+                    self.shared.set(key, delta, None)
+
+    def stats(self):
+        self.flush_stats()
+        totals = self.shared.get_many([self._stats_key(c) for c in COUNTERS])
+        stats = {c: totals.get(self._stats_key(c), 0) for c in COUNTERS}
+        hits = stats["l1_hits"] + stats["l2_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_ratio"] = hits / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._counts_lock:
+            self._counts.clear()
+        self.shared.delete_many([self._stats_key(c) for c in COUNTERS])
+
+
+class _FlightLock:
+    def __init__(self, namespace, key):
+        self.namespace = namespace
+        self.key = key
+        self.users = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+        self.namespace._land(self)
+
+
+_namespaces = {}
+_namespaces_lock = threading.Lock()
+
+
+def namespace(name, alias=DEFAULT_CACHE_ALIAS):
+    with _namespaces_lock:
+        if name not in _namespaces:
+            _namespaces[name] = CacheNamespace(name, alias)
+        return _namespaces[name]
+
+
+def known_namespaces(alias=DEFAULT_CACHE_ALIAS):
+    """Names of every namespace that has reported statistics to L2."""
+    return sorted(caches[alias].get(NAMES_KEY, set()) | set(_namespaces))
+
+
+def clear_all():
+    local_cache.clear()
+    for alias in settings.CACHES:
+        caches[alias].clear()
@@ -0,0 +1,38 @@
+"""
+Independent ORM work from async views.
+
+Django connections belong to a thread, so overlapping two queries means
+running them on two threads. ``gather`` does that when
+CONCURRENT_ORM_QUERIES is on; otherwise the callables run one after
+another on the request's sync thread, exactly like a sync view would.
+That is the mode for SQLite test databases, which other threads cannot
+see, and for work that must see the request's own uncommitted writes.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+def _in_worker(func):
+    # Worker threads never see request_started/request_finished, so they
+    # recycle their connections around each piece of work instead.
+    def run():
+        close_old_connections()
+        try:
+            return func()
+        finally:
+            close_old_connections()
+
+    return run
+
+
+async def gather(*funcs):
+    """Call each zero-argument callable and return the results in order."""
+    if not getattr(settings, "CONCURRENT_ORM_QUERIES", False):
+        return await sync_to_async(lambda: [func() for func in funcs])()
+    return await asyncio.gather(
+        *(sync_to_async(_in_worker(func), thread_sensitive=False)() for func in funcs)
+    )
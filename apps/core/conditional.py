@@ -0,0 +1,111 @@
+"""
+Conditional GET for pages whose content can be versioned cheaply.
+
+A view decorated with ``conditional_page(version)`` first calls
+``version(request, *args, **kwargs)``, which should run one small query
+and return ``(parts, last_modified)``, or ``None`` to skip straight to the
+view (for instance when the object does not exist). The ETag hashes those
+parts together with who is asking, so a 304 is never served across a
+login, a logout or a new CSRF cookie. Async views can be decorated too;
+``version`` is then called on a sync thread.
+"""
+
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+
+def has_pending_messages(request):
+    """True if a flash message is waiting to be shown on this page."""
+    if request.COOKIES.get(getattr(settings, "MESSAGE_COOKIE_NAME", "messages")):
+        return True
+    session = getattr(request, "session", None)
+    return bool(session is not None and session.get("_messages"))
+
+
+def viewer_key(request):
+    user = getattr(request, "user", None)
+    return (
+        user.pk if user is not None and user.is_authenticated else None,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        request.get_full_path(),
+    )
+
+
+def make_etag(request, parts):
+    digest = hashlib.sha1(repr((parts, viewer_key(request))).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def _validators(version, request, args, kwargs):
+    """``(etag, timestamp)`` for this request, or None to skip the check."""
+    if request.method not in ("GET", "HEAD") or has_pending_messages(request):
+        return None
+    state = version(request, *args, **kwargs)
+    if state is None:
+        return None
+    parts, last_modified = state
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+    return make_etag(request, parts), timestamp
+
+
+def _finish(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        response.headers.setdefault("ETag", etag)
+        if timestamp is not None:
+            response.headers.setdefault("Last-Modified", http_date(timestamp))
+    # Revalidate on every visit instead of letting browsers guess
+    # a freshness lifetime from Last-Modified.
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+def conditional_page(version):
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_inner(request, *args, **kwargs):
+                # The session and user are loaded lazily, so even the
+                # checks have to run on a sync thread.
+                validators = await sync_to_async(_validators)(
+                    version, request, args, kwargs
+                )
+                if validators is None:
+                    return await view(request, *args, **kwargs)
+                etag, timestamp = validators
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=timestamp
+                )
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(response, etag, timestamp)
+
+            return async_inner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            validators = _validators(version, request, args, kwargs)
+            if validators is None:
+                return view(request, *args, **kwargs)
+            etag, timestamp = validators
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finish(response, etag, timestamp)
+
+        return inner
+
+    return decorator
@@ -0,0 +1,99 @@
+from django.db.models import Count, F, Max, Q, Window
+from django.db.models.functions import RowNumber
+
+from apps.posts import cards
+from apps.posts.models import Category, Post
+
+from .concurrency import gather
+
+BANNER_SIZE = 5
+
+# (context name, category slug, number of cards)
+HOME_SECTIONS = [
+    ("new_builds", "builds", 9),
+    ("new_guides", "guides", 6),
+    ("new_reviews", "reviews", 4),
+]
+
+
+def published_posts():
+    return Post.objects.filter(status="published")
+
+
+def _section_post_ids(sections):
+    """Subquery with the newest post ids of every section category."""
+    through = Post.category.through
+    depth = max(limit for _, _, limit in sections)
+    ranked = (
+        through.objects.filter(
+            post__status="published",
+            category__slug__in=[slug for _, slug, _ in sections],
+        )
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=[F("category_id")],
+                order_by=[F("post__created_at").desc(), F("post_id").desc()],
+            )
+        )
+        .filter(position__lte=depth)
+    )
+    return ranked.values("post_id")
+
+
+def home_posts(sections=HOME_SECTIONS, banner_size=BANNER_SIZE):
+    """Every post shown on the home page, newest first, with categories."""
+    banner_ids = published_posts().order_by("-created_at", "-id").values("id")[
+        :banner_size
+    ]
+    return list(
+        published_posts()
+        .filter(Q(id__in=banner_ids) | Q(id__in=_section_post_ids(sections)))
+        .select_related("author")
+        .defer("content", "content_html")
+        .prefetch_related("category")
+        .order_by("-created_at", "-id")
+    )
+
+
+def _assemble_feed(posts, total, sections, banner_size):
+    feed = {"banner_posts": posts[:banner_size]}
+    for name, slug, limit in sections:
+        feed[name] = [
+            post
+            for post in posts
+            if any(category.slug == slug for category in post.category.all())
+        ][:limit]
+    feed["total_posts"] = total
+    feed["categories"] = Category.objects.all()
+    return feed
+
+
+def build_home_feed(sections=HOME_SECTIONS, banner_size=BANNER_SIZE):
+    """
+    Load every post shown on the home page in one query (plus one to
+    prefetch categories) and split them into sections in memory.
+
+    A post that belongs to several sections is fetched once and the same
+    instance is reused wherever it appears.
+    """
+    posts = home_posts(sections, banner_size)
+    return _assemble_feed(posts, published_posts().count(), sections, banner_size)
+
+
+async def abuild_home_feed(sections=HOME_SECTIONS, banner_size=BANNER_SIZE):
+    """``build_home_feed`` with the posts and the post count loaded concurrently."""
+    posts, total = await gather(
+        lambda: home_posts(sections, banner_size),
+        published_posts().count,
+    )
+    return _assemble_feed(posts, total, sections, banner_size)
+
+
+def home_version(request):
+    """
+    Newest change and number of published posts, for conditional GETs,
+    plus the cards version for renamed authors and categories.
+    """
+    state = published_posts().aggregate(latest=Max("updated_at"), total=Count("pk"))
+    return (state["latest"], state["total"], cards.version()), state["latest"]
@@ -0,0 +1,220 @@
+"""
+Font Awesome subsetting.
+
+The templates use a couple of dozen icons out of several thousand.
+``build`` scans every template directory for ``fa*`` classes, writes a
+stylesheet with only the matching icon rules and the @font-face blocks
+of the styles in use, and cuts those webfonts down to the icons' code
+points with fontTools. The output goes to STATIC_BUILD_DIR, which
+collectstatic picks up like any other static directory.
+``{% icon_stylesheet %}`` links the subset when it has been built and
+the full vendor stylesheet otherwise, so a build without fontTools still
+works, with the heavier stylesheet.
+"""
+
+import functools
+import re
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template import engines
+
+FONT_AWESOME = "vendor/fontawesome-free-7.0.0-web"
+FULL_STYLESHEET = f"{FONT_AWESOME}/css/all.min.css"
+SOURCE_STYLESHEET = f"{FONT_AWESOME}/css/all.css"
+OUTPUT_DIR = "fontawesome"
+STYLESHEET = f"{OUTPUT_DIR}/css/icons.css"
+
+STYLE_CLASSES = {
+    "fa": "solid",
+    "fas": "solid",
+    "fa-solid": "solid",
+    "far": "regular",
+    "fa-regular": "regular",
+    "fab": "brands",
+    "fa-brands": "brands",
+}
+FONT_FILES = {
+    "solid": "fa-solid-900.woff2",
+    "regular": "fa-regular-400.woff2",
+    "brands": "fa-brands-400.woff2",
+}
+
+_class_attribute = re.compile(r"""\bclass\s*=\s*(["'])(.*?)\1""", re.S)
+_token = re.compile(r"(?<![\w-])fa[a-z]?(?:-[a-z0-9]+)*(?![\w-])")
+_comment = re.compile(r"/\*.*?\*/", re.S)
+_license = re.compile(r"/\*!.*?\*/", re.S)
+_icon_body = re.compile(r'^\s*--fa:\s*"\\([0-9a-f]+)";?\s*$')
+_font_src = re.compile(r'url\("\.\./webfonts/([^"]+)"\)')
+
+
+def template_dirs():
+    dirs = []
+    for engine in engines.all():
+        dirs.extend(engine.template_dirs)
+    return dirs
+
+
+def used_classes(dirs=None):
+    """Every ``fa``-prefixed name in a template's class attributes."""
+    classes = set()
+    for directory in dirs if dirs is not None else template_dirs():
+        for path in Path(directory).rglob("*.html"):
+            for _, value in _class_attribute.findall(path.read_text(encoding="utf-8")):
+                classes.update(_token.findall(value))
+    return classes
+
+
+def split_rules(css):
+    """
+    The top-level ``(prelude, body)`` pairs of a stylesheet, comments
+    removed. At-rules such as @keyframes keep their nested blocks whole.
+    """
+    css = _comment.sub("", css)
+    rules, depth, start, body_start = [], 0, 0, 0
+    for index, char in enumerate(css):
+        if char == "{":
+            if depth == 0:
+                body_start = index + 1
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                prelude = css[start : body_start - 1].strip()
+                rules.append((prelude, css[body_start:index].strip()))
+                start = index + 1
+    return rules
+
+
+def _selectors(prelude):
+    return [selector.strip() for selector in prelude.split(",")]
+
+
+class Subset:
+    """The part of the Font Awesome stylesheet that ``classes`` need."""
+
+    def __init__(self, css, classes):
+        self.classes = set(classes)
+        self.styles = {STYLE_CLASSES[name] for name in self.classes & STYLE_CLASSES.keys()}
+        self.codepoints = set()
+        self.known = set(STYLE_CLASSES)
+        self.license = "\n".join(_license.findall(css))
+        self.rules = []
+        for prelude, body in split_rules(css):
+            self._add(prelude, body)
+        if self.codepoints and not self.styles:
+            # A bare icon class renders with the default (solid) style.
+            self.styles.add("solid")
+        self.fonts = {FONT_FILES[style] for style in self.styles}
+        self.rules = [
+            (prelude, body)
+            for prelude, body in self.rules
+            if prelude != "@font-face" or self._font_of(body) in self.fonts
+        ]
+
+    def _add(self, prelude, body):
+        if prelude == "@font-face":
+            # Only the current families: the v4 and v5 shims are not used.
+            if "Font Awesome 7" in body:
+                self.rules.append((prelude, body))
+            return
+        icon = _icon_body.match(body)
+        names = [selector[1:] for selector in _selectors(prelude)]
+        if icon is None or not all(name.startswith("fa-") for name in names):
+            self.known.update(_token.findall(prelude))
+            self.rules.append((prelude, body))
+            return
+        self.known.update(names)
+        used = [name for name in names if name in self.classes]
+        if used:
+            self.codepoints.add(int(icon[1], 16))
+            self.rules.append((",".join(f".{name}" for name in used), body))
+
+    @staticmethod
+    def _font_of(body):
+        match = _font_src.search(body)
+        return match[1] if match else None
+
+    @property
+    def unknown(self):
+        """Classes the templates use that Font Awesome does not define."""
+        return self.classes - self.known
+
+    def css(self):
+        rules = "\n".join(f"{prelude}{{{body}}}" for prelude, body in self.rules)
+        return f"{self.license}\n{rules}\n"
+
+
+def require_font_tools():
+    """Raise ImportError unless fontTools and brotli (for WOFF2) are installed."""
+    # Only the static build needs them.
+    import brotli  # noqa: F401
+    from fontTools import subset  # noqa: F401
+
+
+def subset_font(source, target, codepoints):
+    from fontTools import subset
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = []
+    options.notdef_outline = True
+    font = subset.load_font(str(source), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    subset.save_font(font, str(target), options)
+
+
+def build(output_dir=None, classes=None):
+    """
+    Write the subset stylesheet and webfonts; returns the ``Subset``. The
+    files are written to a scratch directory and moved into place at the
+    end, so a failed build leaves no partial output behind.
+    """
+    require_font_tools()
+    target = Path(output_dir or settings.STATIC_BUILD_DIR) / OUTPUT_DIR
+    source = Path(finders.find(SOURCE_STYLESHEET))
+    classes = used_classes() if classes is None else classes
+    result = Subset(source.read_text(encoding="utf-8"), classes)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{OUTPUT_DIR}-", dir=target.parent))
+    try:
+        staging.chmod(0o755)  # mkdtemp creates it private
+        (staging / "css").mkdir()
+        (staging / "webfonts").mkdir()
+        for font in result.fonts:
+            subset_font(
+                source.parent.parent / "webfonts" / font,
+                staging / "webfonts" / font,
+                result.codepoints,
+            )
+        (staging / "css" / Path(STYLESHEET).name).write_text(result.css(), encoding="utf-8")
+        remove(output_dir)
+        staging.rename(target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    subset_available.cache_clear()
+    return result
+
+
+def remove(output_dir=None):
+    """Delete a built subset, so the full stylesheet is linked again."""
+    target = Path(output_dir or settings.STATIC_BUILD_DIR) / OUTPUT_DIR
+    shutil.rmtree(target, ignore_errors=True)
+    subset_available.cache_clear()
+
+
+@functools.cache
+def subset_available():
+    return finders.find(STYLESHEET) is not None
+
+
+def stylesheet():
+    """Static path of the icon stylesheet to link."""
+    return STYLESHEET if subset_available() else FULL_STYLESHEET
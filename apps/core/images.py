@@ -0,0 +1,322 @@
+"""
+Resized WebP/JPEG copies of uploaded images.
+
+Derivatives are stored next to the original as ``<name>.w<width>.<ext>``.
+Saving a new image queues it as a ``PendingDerivatives`` row in the same
+transaction, and ``generate_image_derivatives --loop`` resizes queued
+images in a process pool. Which widths exist for an image is stored as an
+``ImageManifest`` row and read through the "images" cache namespace, so
+templates build ``srcset`` attributes without touching the storage.
+"""
+
+import logging
+import os
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import namespace
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+images_cache = namespace("images")
+LEASE = timedelta(minutes=30)
+
+
+def widths():
+    return tuple(getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", (320, 640, 1024, 1600)))
+
+
+def derivative_name(name, width, fmt):
+    stem, _ = os.path.splitext(name)
+    return f"{stem}.w{width}.{FORMATS[fmt][1]}"
+
+
+def is_derivative(name):
+    stem = os.path.splitext(name)[0]
+    suffix = os.path.splitext(stem)[1]
+    return suffix[:2] == ".w" and suffix[2:].isdigit()
+
+
+def generate_derivatives(name, storage=None):
+    """Write every derivative of ``name`` and return its manifest."""
+    storage = storage or default_storage
+    targets = widths()
+    with storage.open(name, "rb") as original:
+        image = Image.open(original)
+        # Let the JPEG decoder scale down while reading; a 6000px photo
+        # decodes much faster at the size of the largest derivative.
+        image.draft("RGB", (max(targets), max(targets)))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    manifest = {fmt: [] for fmt in FORMATS}
+    for width in [w for w in targets if w < image.width] or [image.width]:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt, (pil_format, _, options) in FORMATS.items():
+            frame = resized
+            if pil_format == "JPEG" and frame.mode not in ("RGB", "L"):
+                frame = frame.convert("RGB")
+            elif frame.mode == "P":
+                frame = frame.convert("RGBA")
+            buffer = BytesIO()
+            frame.save(buffer, pil_format, **options)
+            target = derivative_name(name, width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            saved = storage.save(target, ContentFile(buffer.getvalue()))
+            manifest[fmt].append([width, saved])
+
+    store_manifest(name, manifest)
+    return manifest
+
+
+def store_manifest(name, manifest):
+    from .models import ImageManifest
+
+    ImageManifest.objects.update_or_create(name=name, defaults={"manifest": manifest})
+    images_cache.set(name, manifest, None)
+
+
+def probe_derivatives(name, storage=None):
+    """Rebuild a manifest from the files that exist in the storage."""
+    storage = storage or default_storage
+    manifest = {fmt: [] for fmt in FORMATS}
+    for fmt in FORMATS:
+        for width in widths():
+            target = derivative_name(name, width, fmt)
+            if storage.exists(target):
+                manifest[fmt].append([width, target])
+    return manifest
+
+
+def get_manifest(name):
+    """
+    Derivatives of ``name``, from the cache or else its ``ImageManifest``.
+    An image without one uses the original until the worker has generated
+    the derivatives.
+    """
+    from .models import ImageManifest
+
+    if not name:
+        return None
+    manifest = images_cache.get(name)
+    if manifest is None:
+        stored = ImageManifest.objects.filter(name=name).values_list("manifest", flat=True)
+        manifest = stored.first() or {fmt: [] for fmt in FORMATS}
+        images_cache.set(name, manifest, None)
+    return manifest
+
+
+def srcset(name, fmt="webp", storage=None):
+    storage = storage or default_storage
+    manifest = get_manifest(name) or {}
+    return ", ".join(f"{storage.url(path)} {width}w" for width, path in manifest.get(fmt, []))
+
+
+def best_url(name, min_width, fmt="webp", storage=None):
+    """URL of the smallest derivative at least ``min_width`` wide."""
+    storage = storage or default_storage
+    candidates = (get_manifest(name) or {}).get(fmt, [])
+    for width, path in candidates:
+        if width >= min_width:
+            return storage.url(path)
+    if candidates:
+        return storage.url(candidates[-1][1])
+    return storage.url(name)
+
+
+# -- background generation ------------------------------------------------
+
+
+def _setup_worker():
+    import django
+
+    django.setup()
+
+
+def _generate_in_worker(name):
+    generate_derivatives(name)
+    return name
+
+
+def schedule_derivatives(*names):
+    """
+    Queue ``names`` for the worker as part of the current transaction.
+    With IMAGE_DERIVATIVES_SYNC they are generated right after the commit
+    instead, for development without a worker.
+    """
+    from .models import PendingDerivatives
+
+    names = [name for name in dict.fromkeys(names) if name and not is_derivative(name)]
+    if not names:
+        return
+    if getattr(settings, "IMAGE_DERIVATIVES_SYNC", False):
+        transaction.on_commit(lambda: [_generate_logged(name) for name in names])
+        return
+    PendingDerivatives.objects.bulk_create(
+        [PendingDerivatives(name=name) for name in names],
+        update_conflicts=True,
+        unique_fields=["name"],
+        # A replaced image starts over, even if the old one was failing.
+        update_fields=["attempts", "next_attempt_at"],
+    )
+
+
+def _generate_logged(name):
+    try:
+        generate_derivatives(name)
+    except Exception as exc:
+        logger.error("Image derivative task failed: %s", exc, exc_info=exc)
+
+
+def claim(batch_size, lease=LEASE):
+    """Take up to ``batch_size`` due images, leased like queued mail."""
+    from .models import PendingDerivatives
+
+    with transaction.atomic():
+        due = PendingDerivatives.objects.filter(
+            next_attempt_at__lte=timezone.now()
+        ).order_by("next_attempt_at", "pk")
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        PendingDerivatives.objects.filter(pk__in=[task.pk for task in batch]).update(
+            next_attempt_at=timezone.now() + lease
+        )
+    return batch
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(60 * 2 ** (attempts - 1), 6 * 60 * 60))
+
+
+def generate_pending(batch_size=20, pool=None, max_attempts=5):
+    """
+    Generate one batch of queued images, in ``pool`` when given. Returns
+    ``(done, failed)``; failures are retried with a backoff and dropped
+    after ``max_attempts``.
+
+    If the pool breaks, the images it had not finished are rescheduled the
+    same way and ``BrokenProcessPool`` is raised for the caller to replace
+    the pool.
+    """
+    batch = claim(batch_size)
+    if not batch:
+        return 0, 0
+    done = failed = 0
+    remaining = list(batch)
+    try:
+        if pool is not None:
+            futures = [pool.submit(_generate_in_worker, task.name) for task in batch]
+        for index, task in enumerate(batch):
+            try:
+                if pool is None:
+                    generate_derivatives(task.name)
+                else:
+                    futures[index].result()
+            except BrokenProcessPool:
+                raise
+            except Exception as exc:
+                failed += 1
+                _reschedule(task, exc, max_attempts)
+            else:
+                done += 1
+                task.delete()
+            remaining.remove(task)
+    except BrokenProcessPool as exc:
+        for task in remaining:
+            _reschedule(task, exc, max_attempts)
+        raise
+    return done, failed
+
+
+def _reschedule(task, exc, max_attempts):
+    task.attempts += 1
+    task.last_error = f"{type(exc).__name__}: {exc}"
+    if task.attempts >= max_attempts:
+        logger.error("Giving up on derivatives of %s: %s", task.name, task.last_error)
+        task.delete()
+    else:
+        task.next_attempt_at = timezone.now() + retry_delay(task.attempts)
+        task.save(update_fields=["attempts", "last_error", "next_attempt_at"])
+
+
+def image_names():
+    """Every image name stored in an IMAGE_FIELDS field."""
+    from django.apps import apps
+
+    names = set()
+    for label, field in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        names.update(
+            model._default_manager.exclude(**{field: ""})
+            .exclude(**{f"{field}__isnull": True})
+            .values_list(field, flat=True)
+        )
+    return names
+
+
+def refresh_manifests(names=None):
+    """
+    Probe the storage for every image without an ``ImageManifest``, and
+    queue the ones that have no derivatives at all. Returns the names that
+    were queued.
+    """
+    from .models import ImageManifest
+
+    names = sorted(image_names() if names is None else names)
+    stored = set(ImageManifest.objects.values_list("name", flat=True))
+    missing = []
+    for name in names:
+        if name in stored:
+            continue
+        manifest = probe_derivatives(name)
+        if any(manifest.values()):
+            store_manifest(name, manifest)
+        else:
+            missing.append(name)
+    schedule_derivatives(*missing)
+    return missing
+
+
+# -- model hooks ------------------------------------------------------------
+
+# Image fields that get derivatives, by model label.
+IMAGE_FIELDS = {
+    "posts.Post": "image",
+    "posts.Category": "image",
+    "accounts.Profile": "avatar",
+}
+
+
+def _image_name(instance, field):
+    # Read the raw value so a deferred image field is not fetched.
+    value = instance.__dict__.get(field)
+    return getattr(value, "name", value)
+
+
+def remember_image(sender, instance, **kwargs):
+    instance._loaded_image_name = _image_name(instance, IMAGE_FIELDS[sender._meta.label])
+
+
+def image_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    name = _image_name(instance, IMAGE_FIELDS[sender._meta.label])
+    if name and name != getattr(instance, "_loaded_image_name", None):
+        schedule_derivatives(name)
+    instance._loaded_image_name = name
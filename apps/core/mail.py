@@ -0,0 +1,152 @@
+"""
+Outbound mail queue.
+
+``QueuedEmailBackend`` is the site's EMAIL_BACKEND: ``send_mail`` and
+everything built on it (contact form, password reset) only insert an
+``OutboundEmail`` row. ``send_queued_mail`` delivers the rows through
+MAIL_QUEUE_BACKEND, one connection per batch, and reschedules failures
+with an exponential backoff until MAIL_QUEUE_MAX_ATTEMPTS is reached.
+"""
+
+import logging
+import smtplib
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+LEASE = timedelta(minutes=30)
+
+# Errors that mean the connection itself is gone, not just this message.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        rows = [
+            OutboundEmail.from_message(message)
+            for message in email_messages
+            if message.recipients()
+        ]
+        OutboundEmail.objects.bulk_create(rows)
+        return len(rows)
+
+
+def retry_delay(attempts):
+    base = getattr(settings, "MAIL_QUEUE_RETRY_DELAY", 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 6 * 60 * 60))
+
+
+def claim(batch_size, lease=LEASE):
+    """
+    Take up to ``batch_size`` due messages. They are leased by moving
+    ``next_attempt_at`` past the time a batch can take, so if the worker
+    dies they come back on their own and no other worker picks them up
+    meanwhile.
+    """
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(
+            status=OutboundEmail.QUEUED, next_attempt_at__lte=timezone.now()
+        ).order_by("next_attempt_at", "pk")
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            next_attempt_at=timezone.now() + lease
+        )
+    return batch
+
+
+def is_permanent(error):
+    """True for 5xx SMTP replies, which will not change on a retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def _record_failure(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"
+    if email.attempts >= max_attempts or is_permanent(error):
+        email.status = OutboundEmail.FAILED
+        logger.error("Giving up on outbound email %s: %s", email.pk, email.last_error)
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def _deliver(backend, email, max_attempts):
+    try:
+        backend.send_messages([email.message])
+    except Exception as error:
+        _record_failure(email, error, max_attempts)
+        if isinstance(error, CONNECTION_ERRORS):
+            backend.close()
+            backend.open()
+        return email.status
+    email.status = OutboundEmail.SENT
+    email.sent_at = timezone.now()
+    email.attempts += 1
+    email.last_error = ""
+    email.save(update_fields=["status", "sent_at", "attempts", "last_error"])
+    return email.status
+
+
+def send_queued(batch_size=100, max_attempts=None):
+    """
+    Deliver one batch of due messages over a single connection. Returns a
+    Counter of the resulting statuses.
+    """
+    max_attempts = max_attempts or getattr(settings, "MAIL_QUEUE_MAX_ATTEMPTS", 5)
+    results = Counter()
+    batch = claim(batch_size)
+    if not batch:
+        return results
+    backend = get_connection(settings.MAIL_QUEUE_BACKEND, fail_silently=False)
+    try:
+        backend.open()
+    except Exception as error:
+        # Nothing was attempted, so the messages keep their attempt count
+        # and just wait for the server.
+        logger.warning("Cannot reach the mail server: %s", error)
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            next_attempt_at=timezone.now() + retry_delay(1)
+        )
+        results[OutboundEmail.QUEUED] += len(batch)
+        return results
+    try:
+        for index, email in enumerate(batch):
+            try:
+                results[_deliver(backend, email, max_attempts)] += 1
+            except Exception as error:
+                # The connection could not be reopened; leave the rest of
+                # the batch for later.
+                logger.warning("Lost the mail server: %s", error)
+                results[email.status] += 1
+                rest = [other.pk for other in batch[index + 1 :]]
+                OutboundEmail.objects.filter(pk__in=rest).update(
+                    next_attempt_at=timezone.now() + retry_delay(1)
+                )
+                results[OutboundEmail.QUEUED] += len(rest)
+                break
+    finally:
+        backend.close()
+    return results
+
+
+def purge_sent(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = OutboundEmail.objects.filter(
+        status=OutboundEmail.SENT, sent_at__lt=cutoff
+    ).delete()
+    return deleted
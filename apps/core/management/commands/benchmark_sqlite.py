@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure SQLite read throughput while comments are being written, "
+        "with and without the production connection profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=200)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument(
+            "--duration", type=float, default=5, help="Seconds per profile."
+        )
+        parser.add_argument(
+            "--profiles",
+            default=",".join(benchmark.SQLITE_PROFILES),
+            help=f"Comma-separated subset of {', '.join(benchmark.SQLITE_PROFILES)}.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON here instead of stdout.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("This benchmark needs the SQLite backend.")
+        profiles = [name for name in options["profiles"].split(",") if name]
+        unknown = set(profiles) - set(benchmark.SQLITE_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+        results = benchmark.sqlite_concurrency(
+            posts=options["posts"],
+            readers=options["readers"],
+            writers=options["writers"],
+            duration=options["duration"],
+            profiles=profiles,
+            seed=options["seed"],
+            progress=self.stderr.write,
+        )
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as target:
+                target.write(output + "\n")
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        for row in results["results"]:
+            reads, writes = row["reads"], row["writes"]
+            self.stderr.write(
+                f"{row['profile']:<11}{reads['per_second']:>9.1f} reads/s "
+                f"(p95 {reads['p95_ms']:.1f} ms, {reads['errors']} errors)"
+                f"{writes['per_second']:>9.1f} writes/s "
+                f"(p95 {writes['p95_ms']:.1f} ms, {writes['errors']} errors)"
+            )
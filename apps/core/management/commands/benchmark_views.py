@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main views at several data sizes on a throwaway database "
+        "and print the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="100,1000",
+            help="Comma-separated post counts to seed (default 100,1000).",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--views",
+            default=",".join(benchmark.VIEWS),
+            help=f"Comma-separated subset of {', '.join(benchmark.VIEWS)}.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON here instead of stdout.")
+        parser.add_argument(
+            "--compare",
+            metavar="FILE",
+            help="Earlier results to compare against; regressions are listed.",
+        )
+        parser.add_argument("--threshold", type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",") if size]
+        except ValueError:
+            raise CommandError("--sizes must be a list of numbers.")
+        views = [name for name in options["views"].split(",") if name]
+        unknown = set(views) - set(benchmark.VIEWS)
+        if unknown:
+            raise CommandError(f"Unknown views: {', '.join(sorted(unknown))}")
+
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"], encoding="utf-8") as source:
+                    baseline = json.load(source)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read {options['compare']}: {error}")
+
+        results = benchmark.run(
+            sizes,
+            repeat=options["repeat"],
+            views=views,
+            seed=options["seed"],
+            progress=self.stderr.write,
+        )
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as target:
+                target.write(output + "\n")
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self._report(benchmark.compare(baseline, results, options["threshold"]))
+
+    def _report(self, rows):
+        for size, view, before, after, flags in rows:
+            line = (
+                f"{size:>7} {view:<15}{before['median_ms']:>9.1f} ms ->"
+                f"{after['median_ms']:>9.1f} ms"
+                f"{before['queries']:>5} ->{after['queries']:>4} queries"
+            )
+            self.stderr.write(
+                self.style.ERROR(f"{line}  {', '.join(flags)}") if flags else line
+            )
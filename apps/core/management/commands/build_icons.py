@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from apps.core import icons
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the Font Awesome subset the templates use to STATIC_BUILD_DIR, "
+        "or fall back to the full stylesheet when it cannot be built."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Directory to write to instead of STATIC_BUILD_DIR.")
+
+    def handle(self, *args, **options):
+        try:
+            result = icons.build(options["output"])
+        except Exception as error:
+            # The site works with the full stylesheet; don't fail the deploy.
+            icons.remove(options["output"])
+            self.stderr.write(
+                self.style.WARNING(
+                    f"Could not subset the icons ({type(error).__name__}: {error}); "
+                    "the full Font Awesome stylesheet will be linked instead."
+                )
+            )
+            return
+        for name in sorted(result.unknown):
+            self.stderr.write(f"Unknown icon class: {name}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Kept {len(result.codepoints)} icons in {', '.join(sorted(result.fonts))}."
+            )
+        )
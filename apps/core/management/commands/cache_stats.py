@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from apps.core import cache
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters for each cache namespace."
+
+    def add_arguments(self, parser):
+        parser.add_argument("namespaces", nargs="*")
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters after printing."
+        )
+
+    def handle(self, *args, **options):
+        names = options["namespaces"] or cache.known_namespaces()
+        if not names:
+            self.stdout.write("No cache namespaces have reported yet.")
+            return
+        header = f"{'namespace':<20}{'l1 hits':>10}{'l2 hits':>10}{'misses':>10}{'sets':>10}{'waits':>8}{'ratio':>8}"
+        self.stdout.write(header)
+        for name in names:
+            ns = cache.namespace(name)
+            stats = ns.stats()
+            self.stdout.write(
+                f"{name:<20}{stats['l1_hits']:>10}{stats['l2_hits']:>10}"
+                f"{stats['misses']:>10}{stats['sets']:>10}{stats['lock_waits']:>8}"
+                f"{stats['hit_ratio']:>8.1%}"
+            )
+            if options["reset"]:
+                ns.reset_stats()
@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.core import images
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate resized WebP/JPEG copies of queued post, category and avatar "
+        "images, after queueing the ones that have none yet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", None),
+        )
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Queue every image, including those that already have derivatives.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the queue instead of draining it once.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when the queue is empty (with --loop).",
+        )
+        parser.add_argument(
+            "--refresh-every",
+            type=float,
+            default=15 * 60,
+            help="Seconds between checks for images without a manifest (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        if options["force"]:
+            images.schedule_derivatives(*sorted(images.image_names()))
+        started = time.perf_counter()
+        done = failed = 0
+        refreshed = None
+        pool = self.make_pool(options["workers"])
+        try:
+            while True:
+                # A long-running worker never gets request_finished.
+                close_old_connections()
+                if refreshed is None or (
+                    time.monotonic() - refreshed > options["refresh_every"]
+                ):
+                    images.refresh_manifests()
+                    refreshed = time.monotonic()
+                try:
+                    batch_done, batch_failed = images.generate_pending(
+                        options["batch_size"], pool
+                    )
+                except BrokenProcessPool:
+                    # A worker died (killed for memory, usually); its batch
+                    # has been rescheduled, so carry on with a fresh pool.
+                    self.stderr.write("The process pool broke; starting a new one.")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self.make_pool(options["workers"])
+                    continue
+                done += batch_done
+                failed += batch_failed
+                if batch_done + batch_failed < options["batch_size"]:
+                    if not options["loop"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated derivatives for {done} images in {elapsed:.1f}s, {failed} failed."
+            )
+        )
+
+    def make_pool(self, workers):
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            initializer=images._setup_worker,
+        )
@@ -0,0 +1,133 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core import perflog
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarise the request log per view (latency percentiles, queries, "
+        "size) and optionally compare it against a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "files",
+            nargs="*",
+            help="Log files to read (default: the files of every process under PERF_LOG_FILE).",
+        )
+        parser.add_argument("--since", help="Only requests at or after this ISO time.")
+        parser.add_argument("--until", help="Only requests before this ISO time.")
+        parser.add_argument(
+            "--baseline",
+            nargs="+",
+            metavar="FILE",
+            help="Log files to compare against (default: the same files).",
+        )
+        parser.add_argument("--baseline-since")
+        parser.add_argument("--baseline-until")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Relative p50/p95 growth flagged as a regression (default 0.2).",
+        )
+        parser.add_argument("--min-requests", type=int, default=20)
+        parser.add_argument("--json", action="store_true", help="Print JSON.")
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error if any view regressed.",
+        )
+
+    def handle(self, *args, **options):
+        files = options["files"] or perflog.log_files(settings.PERF_LOG_FILE)
+        current = self._aggregate(files, options["since"], options["until"])
+
+        comparing = any(
+            options[key] for key in ("baseline", "baseline_since", "baseline_until")
+        )
+        rows = None
+        if comparing:
+            baseline = self._aggregate(
+                options["baseline"] or files,
+                options["baseline_since"],
+                options["baseline_until"],
+            )
+            rows = perflog.regressions(
+                baseline, current, options["threshold"], options["min_requests"]
+            )
+
+        if options["json"]:
+            self._write_json(current, rows)
+        else:
+            self._write_table(current)
+            if rows is not None:
+                self._write_comparison(rows)
+
+        regressed = [name for name, *_, flags in rows or () if flags]
+        if regressed and options["fail_on_regression"]:
+            raise CommandError(f"Regressions in: {', '.join(regressed)}")
+
+    def _aggregate(self, files, since, until):
+        try:
+            since = perflog.parse_timestamp(since) if since else None
+            until = perflog.parse_timestamp(until) if until else None
+        except ValueError as error:
+            raise CommandError(f"Invalid time: {error}")
+        try:
+            return perflog.aggregate(perflog.read_records(files, since, until))
+        except OSError as error:
+            raise CommandError(str(error))
+
+    def _write_json(self, current, rows):
+        report = {name: stats.summary() for name, stats in sorted(current.items())}
+        output = {"views": report}
+        if rows is not None:
+            output["comparison"] = [
+                {"view": name, "baseline": before, "current": after, "regressions": flags}
+                for name, before, after, flags in rows
+            ]
+        self.stdout.write(json.dumps(output, indent=2))
+
+    def _write_table(self, current):
+        if not current:
+            self.stdout.write("No requests in the log.")
+            return
+        self.stdout.write(
+            f"{'view':<28}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'queries':>9}{'max q':>7}{'avg KB':>9}{'5xx':>6}"
+        )
+        ordered = sorted(current.items(), key=lambda item: -item[1].requests)
+        for name, stats in ordered:
+            summary = stats.summary()
+            self.stdout.write(
+                f"{name:<28}{summary['requests']:>10}{summary['p50_ms']:>10.1f}"
+                f"{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}"
+                f"{summary['queries']:>9.1f}{summary['max_queries']:>7}"
+                f"{summary['bytes'] / 1024:>9.1f}{summary['errors']:>6}"
+            )
+
+    def _write_comparison(self, rows):
+        self.stdout.write("")
+        if not rows:
+            self.stdout.write("Not enough requests on both sides to compare.")
+            return
+        self.stdout.write(
+            f"{'view':<28}{'p95 before':>12}{'p95 after':>12}{'change':>9}"
+            f"{'q before':>10}{'q after':>9}"
+        )
+        for name, before, after, flags in rows:
+            change = after["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0
+            line = (
+                f"{name:<28}{before['p95_ms']:>12.1f}{after['p95_ms']:>12.1f}"
+                f"{change:>+9.0%}{before['queries']:>10.1f}{after['queries']:>9.1f}"
+            )
+            if flags:
+                self.stdout.write(self.style.ERROR(f"{line}  regressed: {', '.join(flags)}"))
+            else:
+                self.stdout.write(line)
+        if not any(flags for *_, flags in rows):
+            self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,23 @@
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed media blobs that no upload links to."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        storage = storages["default"]
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError("The default storage is not content addressed.")
+        orphans = storage.orphaned_blobs()
+        for name in orphans:
+            self.stdout.write(name)
+            if not options["dry_run"]:
+                storage.delete(name)
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(orphans)} orphaned blobs."))
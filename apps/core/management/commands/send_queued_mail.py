@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.core import mail
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbound email in batches over one connection each."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the queue instead of sending one batch.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when the queue is empty (with --loop).",
+        )
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=30,
+            help="Delete sent messages older than this many days.",
+        )
+
+    def handle(self, *args, **options):
+        mail.purge_sent(options["keep_days"])
+        try:
+            while True:
+                # A long-running worker never gets request_finished.
+                close_old_connections()
+                results = mail.send_queued(
+                    options["batch_size"], options["max_attempts"]
+                )
+                if results:
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"Sent {results['sent']}, retrying {results['queued']}, "
+                            f"failed {results['failed']}."
+                        )
+                    )
+                if not options["loop"]:
+                    break
+                if sum(results.values()) < options["batch_size"]:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
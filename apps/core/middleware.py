@@ -0,0 +1,219 @@
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import pagecache, replicas, timing
+from .conditional import has_pending_messages
+
+CACHED_VIEWS = ("landing", "home", "post_detail", "category_view")
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Serve whole pages to logged-out GET requests from the page cache.
+
+    Goes after the authentication and messages middleware. Pages that
+    set a cookie, used the CSRF token or were rendered while a flash
+    message was waiting are never stored, so nothing personal is shared.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(getattr(settings, "PAGE_CACHE_VIEWS", CACHED_VIEWS))
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        key = getattr(request, "_page_cache_key", None)
+        if key is not None:
+            if self._storable(request, response):
+                pagecache.store(key, response)
+            response.headers.setdefault("X-Page-Cache", "miss")
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        key = getattr(request, "_page_cache_key", None)
+        if key is not None:
+            if self._storable(request, response):
+                await sync_to_async(pagecache.store)(key, response)
+            response.headers.setdefault("X-Page-Cache", "miss")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self._cacheable(request):
+            return None
+        key = pagecache.page_key(request)
+        entry = pagecache.lookup(key)
+        if entry is not None:
+            response = pagecache.replay(request, entry, HttpResponse)
+            response["X-Page-Cache"] = "hit"
+            return response
+        request._page_cache_key = key
+        return None
+
+    def _cacheable(self, request):
+        match = request.resolver_match
+        return (
+            request.method in ("GET", "HEAD")
+            and match is not None
+            and match.url_name in self.views
+            and not request.user.is_authenticated
+            and not has_pending_messages(request)
+        )
+
+    @staticmethod
+    def _storable(request, response):
+        messages = getattr(request, "_messages", None)
+        return (
+            request.method == "GET"
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+            and not getattr(messages, "added_new", False)
+        )
+
+
+class ReplicaMiddleware:
+    """
+    Track whether a request wrote to the database and, if it did, pin the
+    browser to the primary for a few seconds (see ``apps.core.replicas``).
+
+    Goes before the session middleware so session saves count as writes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = replicas.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.stop(token)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = replicas.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.stop(token)
+        return self._finish(state, response)
+
+    @staticmethod
+    def _finish(state, response):
+        if state.wrote:
+            replicas.pin(response)
+        return response
+
+
+class RequestTimingMiddleware:
+    """
+    Measure every request and add a ``Server-Timing`` header.
+
+    Goes first in MIDDLEWARE so the totals include the other middleware.
+    A ``PERF_SAMPLE_RATE`` share of requests is also written to
+    ``PERF_LOG_FILE``, one JSON object per line.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PERF_SAMPLE_RATE", 0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer, token = timing.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.stop(token)
+        return self._finish(request, response, timer)
+
+    async def __acall__(self, request):
+        timer, token = timing.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.stop(token)
+        return self._finish(request, response, timer)
+
+    def _finish(self, request, response, timer):
+        total = timer.elapsed()
+        response["Server-Timing"] = timing.server_timing(timer, total)
+        if self.sample_rate and random.random() < self.sample_rate:
+            timing.write(self._record(request, response, timer, total))
+        return response
+
+    @staticmethod
+    def _record(request, response, timer, total):
+        match = request.resolver_match
+        return {
+            "ts": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match is not None else None,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            "sql_count": timer.sql_count,
+            "sql_ms": round(timer.sql_time * 1000, 2),
+            "template_ms": round(timer.template_time * 1000, 2),
+            "bytes": None if response.streaming else len(response.content),
+            "page_cache": response.get("X-Page-Cache"),
+        }
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, usable under ASGI without falling back to a thread for the
+    whole request. Known static files are served from a worker thread;
+    everything else goes straight on to the async handler.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(
+                static_file, request
+            )
+        return await self.get_response(request)
@@ -1,3 +1,104 @@
+import base64
+import copy
+import pickle
+
 from django.db import models
+from django.utils import timezone
+
+
+class OutboundEmail(models.Model):
+    """
+    A message waiting for ``send_queued_mail``. The whole EmailMessage is
+    pickled so alternatives, headers and attachments survive the trip;
+    subject and recipients are copied out for the admin.
+    """
+
+    QUEUED = "queued"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (QUEUED, "Queued"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+
+    subject = models.CharField(max_length=255, blank=True)
+    recipients = models.TextField()
+    message_data = models.TextField(editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipients}"
+
+    @classmethod
+    def from_message(cls, message):
+        message = copy.copy(message)
+        message.connection = None
+        return cls(
+            subject=message.subject[:255],
+            recipients=", ".join(message.recipients()),
+            message_data=base64.b64encode(pickle.dumps(message)).decode("ascii"),
+        )
+
+    @property
+    def message(self):
+        return pickle.loads(base64.b64decode(self.message_data))
+
+    class Meta:
+        verbose_name = "Outbound email"
+        verbose_name_plural = "Outbound emails"
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="core_outbound_due_idx"
+            )
+        ]
+
+
+class PendingDerivatives(models.Model):
+    """
+    An image waiting for ``generate_image_derivatives --loop``. Rows are
+    written in the same transaction as the upload, so no image is lost
+    between the save and the worker.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "Pending derivatives"
+        verbose_name_plural = "Pending derivatives"
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["next_attempt_at"], name="core_derivatives_due_idx")
+        ]
+
+
+class ImageManifest(models.Model):
+    """
+    The derivatives that exist for an image, as written by the worker. The
+    "images" cache namespace only mirrors these rows, so a culled or
+    cleared cache costs a query rather than the ``srcset``.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    manifest = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
 
-# Create your models here.
+    class Meta:
+        verbose_name = "Image manifest"
+        verbose_name_plural = "Image manifests"
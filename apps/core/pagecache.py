@@ -0,0 +1,89 @@
+"""
+Full-page cache for logged-out readers.
+
+Every cached path has a generation number in L2; a page is stored under
+its path, the generation and a hash of the query string. Purging a path
+just moves its generation on, so the old pages are never read again and
+expire on their own. The generation is always read from L2, never from
+the per-process L1, so a purge is seen by every worker at once.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .cache import MISSING, namespace
+
+pages_cache = namespace("pages")
+
+# Headers worth replaying from a cached page.
+STORED_HEADERS = (
+    "Content-Type",
+    "Content-Language",
+    "ETag",
+    "Last-Modified",
+    "Cache-Control",
+    "Vary",
+    "X-Frame-Options",
+    "Referrer-Policy",
+    "Cross-Origin-Opener-Policy",
+    "X-Content-Type-Options",
+)
+
+
+def timeout():
+    return getattr(settings, "PAGE_CACHE_TIMEOUT", 600)
+
+
+def _generation_key(path):
+    return pages_cache.make_key(f"gen:{path}")
+
+
+def generation(path):
+    key = _generation_key(path)
+    value = pages_cache.shared.get(key)
+    if value is None:
+        pages_cache.shared.add(key, time.time_ns() // 1000, None)
+        value = pages_cache.shared.get(key)
+    return value
+
+
+def page_key(request):
+    path = request.path
+    query = hashlib.sha1(request.META.get("QUERY_STRING", "").encode()).hexdigest()
+    return f"page:{path}:{generation(path)}:{query}"
+
+
+def purge(paths):
+    """Stop serving the cached pages of every path in ``paths``."""
+    stamp = time.time_ns() // 1000
+    pages_cache.shared.set_many(
+        {_generation_key(path): stamp for path in set(paths)}, None
+    )
+
+
+def store(key, response):
+    headers = {
+        name: response[name] for name in STORED_HEADERS if response.has_header(name)
+    }
+    pages_cache.set(key, (response.status_code, response.content, headers), timeout())
+
+
+def lookup(key):
+    entry = pages_cache.get(key, MISSING)
+    return None if entry is MISSING else entry
+
+
+def replay(request, entry, response_class):
+    status, content, headers = entry
+    etag = headers.get("ETag")
+    last_modified = parse_http_date_safe(headers.get("Last-Modified", ""))
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = response_class(content, status=status)
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,183 @@
+"""
+Reading the request log written by ``RequestTimingMiddleware``.
+
+Files are streamed line by line and each view keeps a fixed-size summary,
+so memory does not grow with the size of the log. Latency percentiles
+come from ``QuantileSketch``, a log-bucketed histogram in the style of
+DDSketch: every percentile it reports is within ``relative_accuracy`` of
+the true value, whatever the distribution.
+"""
+
+import json
+import math
+import re
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.utils import timezone
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        # Values too small to bucket (0 ms responses, mostly).
+        self.zeros = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 1e-6:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        # Fold the lowest bucket into the next one up; only the low tail
+        # loses accuracy, which no percentile we report looks at.
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return max(self.min, 0.0)
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                value = 2 * self.gamma**index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class ViewStats:
+    """Running totals for one view."""
+
+    def __init__(self):
+        self.latency = QuantileSketch()
+        self.requests = 0
+        self.errors = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.bytes = 0
+
+    def add(self, record):
+        self.requests += 1
+        self.latency.add(record.get("total_ms") or 0)
+        queries = record.get("sql_count") or 0
+        self.queries += queries
+        self.max_queries = max(self.max_queries, queries)
+        self.bytes += record.get("bytes") or 0
+        if (record.get("status") or 0) >= 500:
+            self.errors += 1
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            **{
+                f"p{round(q * 100)}_ms": self.latency.quantile(q)
+                for q in PERCENTILES
+            },
+            "queries": self.queries / self.requests if self.requests else 0,
+            "max_queries": self.max_queries,
+            "bytes": self.bytes / self.requests if self.requests else 0,
+            "errors": self.errors,
+        }
+
+
+def parse_timestamp(value):
+    moment = datetime.fromisoformat(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def log_files(base):
+    """
+    Every file of the log ``base`` names: the ``<name>.<pid><ext>`` file of
+    each process and their rotated copies.
+    """
+    base = Path(base)
+    pattern = re.compile(rf"{re.escape(base.stem)}\.\d+{re.escape(base.suffix)}(\.\d+)?")
+    files = sorted(
+        path for path in base.parent.glob(f"{base.stem}.*") if pattern.fullmatch(path.name)
+    )
+    return [str(path) for path in files]
+
+
+def read_records(paths, since=None, until=None):
+    """
+    Yield the records of every file in ``paths`` logged in
+    ``[since, until)``. Lines that are not valid records are skipped.
+    """
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                    moment = parse_timestamp(record["ts"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if since is not None and moment < since:
+                    continue
+                if until is not None and moment >= until:
+                    continue
+                yield record
+
+
+def aggregate(records):
+    """``{view name: ViewStats}`` over ``records``."""
+    views = {}
+    for record in records:
+        name = record.get("view") or "(unresolved)"
+        stats = views.get(name)
+        if stats is None:
+            stats = views[name] = ViewStats()
+        stats.add(record)
+    return views
+
+
+def regressions(baseline, current, threshold=0.2, min_requests=20):
+    """
+    Compare two ``aggregate`` results view by view. A view regresses when
+    its p50 or p95 grows by more than ``threshold`` or it runs at least one
+    more query per request on average. Views with fewer than
+    ``min_requests`` on either side are not judged.
+    """
+    rows = []
+    for name in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[name].summary(), current[name].summary()
+        if min(before["requests"], after["requests"]) < min_requests:
+            continue
+        flags = []
+        for key in ("p50_ms", "p95_ms"):
+            if before[key] and after[key] > before[key] * (1 + threshold):
+                flags.append(key)
+        if after["queries"] - before["queries"] >= 1:
+            flags.append("queries")
+        rows.append((name, before, after, flags))
+    return rows
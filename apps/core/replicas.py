@@ -0,0 +1,157 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+With DATABASE_REPLICA_URLS set, settings add one ``replicaN`` alias per
+URL to DATABASES and DATABASE_REPLICAS, and install ``ReplicaRouter``.
+Reads go to a replica only inside views decorated with ``replica_reads``,
+only for GET and HEAD, and only until the request writes. Everything
+else stays on the primary.
+
+``ReplicaMiddleware`` sets a short-lived cookie on every response whose
+request wrote to the database. While it lasts, that browser reads from
+the primary, so a new comment or profile change shows up on the next
+page even if the replicas are behind. Replicas that fail a health check
+are skipped for REPLICA_HEALTH_INTERVAL seconds.
+"""
+
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = "db_pin"
+# Never read from a replica: a login must not look missing because the
+# session row has not been replicated yet.
+PRIMARY_ONLY_APPS = {"sessions"}
+
+_current = ContextVar("replica_request", default=None)
+_health = {}
+_health_lock = threading.Lock()
+
+
+class RequestState:
+    """What the router needs to know about the current request."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.use_replica = False
+        self.wrote = False
+        self.alias = None
+
+
+def start(request):
+    state = RequestState(pinned=PIN_COOKIE in request.COOKIES)
+    return state, _current.set(state)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def pin(response):
+    """Keep this browser on the primary for REPLICA_PIN_SECONDS."""
+    response.set_cookie(
+        PIN_COOKIE,
+        "1",
+        max_age=getattr(settings, "REPLICA_PIN_SECONDS", 10),
+        httponly=True,
+        samesite="Lax",
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+def _allow_replica(request):
+    state = _current.get()
+    if state is not None and request.method in ("GET", "HEAD") and not state.pinned:
+        state.use_replica = True
+
+
+def replica_reads(view):
+    """Let ``view`` read from a replica when the request allows it."""
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            _allow_replica(request)
+            return await view(request, *args, **kwargs)
+
+    else:
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            _allow_replica(request)
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _probe(alias):
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError as error:
+        logger.warning("Replica %s failed its health check: %s", alias, error)
+        return False
+    return True
+
+
+def is_healthy(alias):
+    """Whether ``alias`` answered its last check, rechecking when stale."""
+    now = time.monotonic()
+    interval = getattr(settings, "REPLICA_HEALTH_INTERVAL", 30)
+    with _health_lock:
+        checked = _health.get(alias)
+    if checked is not None and now - checked[1] < interval:
+        return checked[0]
+    healthy = _probe(alias)
+    with _health_lock:
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def reset_health():
+    with _health_lock:
+        _health.clear()
+
+
+def replica_for(state):
+    """The replica this request reads from, picked once per request."""
+    if state.alias is None:
+        healthy = [
+            alias
+            for alias in getattr(settings, "DATABASE_REPLICAS", ())
+            if is_healthy(alias)
+        ]
+        state.alias = random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+    return state.alias
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if (
+            state is None
+            or not state.use_replica
+            or state.wrote
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+        ):
+            return DEFAULT_DB_ALIAS
+        return replica_for(state)
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data.
+        return True
@@ -0,0 +1,164 @@
+"""
+Storage backends.
+
+Local media storage keeps every upload once, under its SHA-256.
+
+The blob lives at ``cas/<ab>/<sha256><ext>`` and the name Django stores
+on the model (``posts/media/my-build.jpg``) is a relative symlink to it,
+so identical uploads share one file and a blob never changes once
+written. ``url()`` points straight at the blob, which is what lets
+``serve_media`` hand out immutable cache headers.
+
+``StaticStorage`` is WhiteNoise's compressed manifest storage: every
+collected file gets a content hash in its name plus gzip and brotli
+copies, so WhiteNoise can serve it with a one-year immutable lifetime.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+BLOB_DIR = "cas"
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    # -- writing --------------------------------------------------------
+
+    def _save(self, name, content):
+        digest, spooled = self._hash(content)
+        try:
+            blob = self.blob_name(digest, os.path.splitext(name)[1])
+            blob_path = self.path(blob)
+            if not os.path.exists(blob_path):
+                self._write_blob(blob_path, spooled)
+        finally:
+            spooled.close()
+
+        link_path = self.path(name)
+        os.makedirs(os.path.dirname(link_path), exist_ok=True)
+        target = os.path.relpath(blob_path, os.path.dirname(link_path))
+        while True:
+            try:
+                os.symlink(target, link_path)
+                break
+            except FileExistsError:
+                # Another writer took the name since get_available_name().
+                name = self.get_available_name(name)
+                link_path = self.path(name)
+        return name.replace("\\", "/")
+
+    @staticmethod
+    def blob_name(digest, extension):
+        return f"{BLOB_DIR}/{digest[:2]}/{digest}{extension.lower()}"
+
+    @staticmethod
+    def _hash(content):
+        digest = hashlib.sha256()
+        spooled = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        if hasattr(content, "seek"):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+            spooled.write(chunk)
+        spooled.seek(0)
+        return digest.hexdigest(), spooled
+
+    def _write_blob(self, blob_path, source):
+        directory = os.path.dirname(blob_path)
+        os.makedirs(directory, exist_ok=True)
+        # Write next to the final path and rename, so a blob is either
+        # complete or absent and concurrent identical uploads are harmless.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for chunk in iter(lambda: source.read(64 * 1024), b""):
+                    tmp.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, name):
+        # Only the link goes; the blob may be shared with other names.
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        path = self.path(name)
+        if os.path.islink(path):
+            os.remove(path)
+        else:
+            super().delete(name)
+
+    def exists(self, name):
+        return os.path.lexists(self.path(name))
+
+    # -- urls -----------------------------------------------------------
+
+    def url(self, name):
+        # Resolved on every call: another process may have re-saved the
+        # name since, pointing the link at a different blob.
+        return super().url(self.resolve(name) if name else name)
+
+    def resolve(self, name):
+        """Blob name behind ``name``, or ``name`` itself for plain files."""
+        path = self.path(name)
+        if not os.path.islink(path):
+            return name
+        blob_path = os.path.normpath(
+            os.path.join(os.path.dirname(path), os.readlink(path))
+        )
+        return os.path.relpath(blob_path, self.location).replace("\\", "/")
+
+    # -- maintenance ------------------------------------------------------
+
+    def orphaned_blobs(self):
+        """Blobs no name links to any more."""
+        root = self.path(BLOB_DIR)
+        if not os.path.isdir(root):
+            return []
+        linked = set()
+        for directory, dirnames, filenames in os.walk(self.location):
+            if os.path.abspath(directory) == os.path.abspath(root):
+                dirnames[:] = []
+                continue
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if os.path.islink(path):
+                    linked.add(os.path.realpath(path))
+        orphans = []
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if not filename.startswith(".") and os.path.realpath(path) not in linked:
+                    orphans.append(os.path.relpath(path, self.location))
+        return orphans
+
+
+def is_blob(name):
+    return name.startswith(f"{BLOB_DIR}/")
+
+
+def media_cache_control(name):
+    if is_blob(name):
+        return "public, max-age=31536000, immutable"
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 300)}"
+
+
+class StaticStorage(CompressedManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Nothing has been collected (development, tests): link the
+            # source file by its plain name instead of failing the render.
+            return name
@@ -0,0 +1,13 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from apps.core import icons
+
+register = template.Library()
+
+
+@register.simple_tag
+def icon_stylesheet():
+    """The Font Awesome subset when it has been built, the full set otherwise."""
+    return format_html('<link rel="stylesheet" href="{}" />', static(icons.stylesheet()))
@@ -0,0 +1,47 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from apps.core import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, **attrs):
+    """
+    Render ``image`` as a <picture> with WebP and JPEG srcsets.
+
+        {% responsive_image post.image alt=post.title class="w-full" sizes="33vw" width=400 height=256 %}
+    """
+    if not image:
+        return ""
+    sizes = attrs.pop("sizes", "100vw")
+    attrs.setdefault("loading", "lazy")
+    attrs.setdefault("decoding", "async")
+    webp = images.srcset(image.name, "webp")
+    jpeg = images.srcset(image.name, "jpeg")
+    img_attrs = format_html_join(
+        " ", '{}="{}"', ((key, value) for key, value in attrs.items() if value is not None)
+    )
+    if not webp:
+        return format_html('<img src="{}" {} />', image.url, img_attrs)
+    return format_html(
+        '<picture class="contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}" />'
+        '<img src="{}" srcset="{}" sizes="{}" {} />'
+        "</picture>",
+        webp,
+        sizes,
+        image.url,
+        jpeg,
+        sizes,
+        img_attrs,
+    )
+
+
+@register.filter
+def derivative_url(image, min_width):
+    """URL of a resized copy at least ``min_width`` pixels wide."""
+    if not image:
+        return ""
+    return images.best_url(image.name, int(min_width))
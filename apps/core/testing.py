@@ -0,0 +1,310 @@
+"""
+Test helpers: query budgets and plans for views, replica stand-ins and a
+local SMTP server.
+
+``QueryBudgetTestCase.assertQueryBudget`` requests a URL, lets the test
+add more data, requests it again and fails if the second request ran more
+queries than the first (the N+1 signature) or more than the budget. The
+failure lists every query grouped by the line of project code that ran
+it. Caches are emptied before each request so the counts are the cold,
+worst-case ones.
+
+``assertNoFullScans`` runs EXPLAIN on every SELECT a URL issues and fails
+when one of them reads a whole table instead of going through an index.
+
+``ReplicaTestCase`` adds replica databases for the router tests.
+"""
+
+import json
+import re
+import socketserver
+import threading
+import traceback
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import TestCase, override_settings
+
+from . import cache
+
+_django = Path(django.__file__).resolve().parent
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+# Project modules that only wrap the request or the render and never run
+# queries of their own.
+_passthrough = {"testing.py", "timing.py", "middleware.py"}
+# A bare "SCAN t" in SQLite's plan is a full scan; with "USING INDEX" it
+# walks an index in order and stops at the LIMIT.
+_sqlite_scan = re.compile(r"^SCAN (\w+)$")
+_sqlite_subquery = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\w+)$")
+
+
+def _describe(frame, path, root):
+    return f"{path.relative_to(root)}:{frame.lineno} in {frame.name}"
+
+
+def _call_site():
+    """
+    The innermost line of project code behind the current query, followed
+    by the innermost Django frame outside the ORM when that is what
+    actually asked (a template lookup, the session backend...).
+    """
+    root = Path(settings.BASE_DIR).resolve()
+    apps = root / "apps"
+    via = None
+    for frame in reversed(traceback.extract_stack()):
+        path = Path(frame.filename).resolve()
+        if path.is_relative_to(apps):
+            if path.name == "tests.py" or (
+                path.name in _passthrough and path.parent.name == "core"
+            ):
+                continue
+            site = _describe(frame, path, root)
+            return f"{site} via {via}" if via else site
+        orm = path.is_relative_to(_django / "db")
+        if via is None and path.is_relative_to(_django) and not orm:
+            via = _describe(frame, path, _django.parent)
+    return via or "(unknown)"
+
+
+def _sqlite_full_scans(cursor, sql, params):
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    details = [row[3] for row in cursor.fetchall()]
+    # CTEs and subqueries are scanned too, but they are not tables.
+    derived = {m[1] for m in map(_sqlite_subquery.match, details) if m}
+    return [m[1] for m in map(_sqlite_scan.match, details) if m and m[1] not in derived]
+
+
+def _postgresql_full_scans(cursor, sql, params):
+    # Tiny test tables make a sequential scan the cheapest plan, so it is
+    # switched off: what is left is a scan no index can replace.
+    with transaction.atomic():
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans, nodes = [], [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan":
+            scans.append(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+
+def full_scans(sql, params):
+    """Tables a SELECT reads in full, according to the database's EXPLAIN."""
+    explain = {
+        "sqlite": _sqlite_full_scans,
+        "postgresql": _postgresql_full_scans,
+    }.get(connection.vendor)
+    if explain is None:
+        return []
+    with connection.cursor() as cursor:
+        return explain(cursor, sql, params)
+
+
+class QueryLog:
+    """Every query run on the default connection, with the code that ran it."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((_call_site(), sql, params))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def report(self):
+        sites = defaultdict(Counter)
+        for site, sql, _ in self.queries:
+            sites[site][_literals.sub("?", sql)] += 1
+        lines = []
+        for site, statements in sorted(sites.items(), key=lambda item: -item[1].total()):
+            lines.append(f"  {statements.total()} from {site}")
+            for sql, count in statements.most_common():
+                lines.append(f"    {count} x {sql}")
+        return "\n".join(lines)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class QueryBudgetTestCase(TestCase):
+    def capture(self, url, client=None):
+        cache.clear_all()
+        log = QueryLog()
+        with connection.execute_wrapper(log):
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200, f"GET {url}")
+        return log
+
+    def assertNoFullScans(self, url, client=None):
+        """Every SELECT behind ``url`` must use an index."""
+        problems = []
+        for site, sql, params in self.capture(url, client).queries:
+            if not sql.lstrip().upper().startswith("SELECT"):
+                continue
+            tables = full_scans(sql, params)
+            if tables:
+                problems.append(f"  {', '.join(dict.fromkeys(tables))} from {site}\n    {sql}")
+        if problems:
+            self.fail(f"GET {url} scanned whole tables:\n" + "\n".join(problems))
+
+    def assertQueryBudget(self, url, budget, grow, client=None):
+        """
+        ``url`` must run at most ``budget`` queries, and no more after
+        ``grow()`` has added data than before.
+        """
+        before = self.capture(url, client)
+        grow()
+        after = self.capture(url, client)
+        if len(after) > len(before):
+            self.fail(
+                f"GET {url} ran {len(before)} queries, then {len(after)} with more "
+                f"data.\nBefore:\n{before.report()}\nAfter:\n{after.report()}"
+            )
+        if len(after) > budget:
+            self.fail(
+                f"GET {url} ran {len(after)} queries, over its budget of "
+                f"{budget}.\n{after.report()}"
+            )
+
+
+class ReplicaTestCase(TestCase):
+    """
+    Runs with a ``replica`` alias next to the test database: a migrated
+    but empty database that never sees the primary's writes, like a
+    replica that is far behind. ``unreachable_replica()`` adds one that
+    cannot be connected to at all.
+    """
+
+    replica = "replica"
+
+    @classmethod
+    def setUpClass(cls):
+        primary = connections.settings[DEFAULT_DB_ALIAS]
+        connections.settings[cls.replica] = {
+            **primary,
+            "TEST": {**primary["TEST"], "NAME": None, "MIRROR": None},
+        }
+        cls._replica_name = connections[cls.replica].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        # Not a class attribute: the runner checks and creates the declared
+        # databases before any test runs, when this alias does not exist.
+        cls.databases = {DEFAULT_DB_ALIAS, cls.replica}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[cls.replica].creation.destroy_test_db(cls._replica_name, verbosity=0)
+        cls._drop_alias(cls.replica)
+
+    @staticmethod
+    def _drop_alias(alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    @contextmanager
+    def unreachable_replica(self, alias="broken_replica"):
+        """
+        A replica alias whose database cannot be opened. It only exists
+        inside the block, so the test case never opens a transaction on it.
+        """
+        cls = type(self)
+        connections.settings[alias] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(Path(settings.BASE_DIR) / "missing" / "replica.sqlite3"),
+            "OPTIONS": {},
+        }
+        databases = cls.databases
+        cls.databases = databases | {alias}
+        try:
+            yield alias
+        finally:
+            cls.databases = databases
+            self._drop_alias(alias)
+
+
+class SMTPStub:
+    """
+    A minimal SMTP server on localhost for mail delivery tests.
+
+    ``messages`` collects ``(sender, recipients, data)`` for every message
+    accepted and ``connections`` counts sessions. Addresses in ``refuse``
+    get a 550 at RCPT; the first ``fail_data`` messages get a 451.
+    """
+
+    def __init__(self, refuse=(), fail_data=0):
+        self.refuse = set(refuse)
+        self.fail_data = fail_data
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                with stub._lock:
+                    stub.connections += 1
+                self.reply("220 stub ESMTP")
+                sender, recipients = None, []
+                for raw in self.rfile:
+                    command = raw.decode().strip()
+                    verb = command[:4].upper()
+                    if verb in ("EHLO", "HELO"):
+                        self.reply("250 stub")
+                    elif verb == "MAIL":
+                        sender, recipients = command[10:].strip("<> "), []
+                        self.reply("250 OK")
+                    elif verb == "RCPT":
+                        address = command[8:].strip("<> ")
+                        if address in stub.refuse:
+                            self.reply("550 No such user")
+                        else:
+                            recipients.append(address)
+                            self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        lines = []
+                        for line in self.rfile:
+                            if line == b".\r\n":
+                                break
+                            lines.append(line)
+                        with stub._lock:
+                            failing = stub.fail_data > 0
+                            if failing:
+                                stub.fail_data -= 1
+                            else:
+                                stub.messages.append((sender, recipients, b"".join(lines)))
+                        self.reply("451 Try again later" if failing else "250 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("250 OK")
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,3 +1,714 @@
-from django.test import TestCase
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.core.mail import EmailMessage
+from django.db import connection
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from apps.posts.models import Category, Comment, Post
+from apps.posts.seeding import Seeder, scaled
+
+from . import cache, icons, images, perflog, replicas, timing
+from .storage import ContentAddressedStorage, media_cache_control
+from .feed import build_home_feed
+from .mail import send_queued
+from .models import ImageManifest, OutboundEmail, PendingDerivatives
+from .testing import QueryBudgetTestCase, ReplicaTestCase, SMTPStub
+
+
+class HomeQueryTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeder = Seeder(seed=1)
+        cls.seeder.run(**scaled(20))
+
+    def grow(self):
+        self.seeder.run(**scaled(40))
+
+    def test_home_anonymous(self):
+        self.assertQueryBudget(reverse("home"), 4, self.grow)
+
+    def test_home_logged_in(self):
+        self.client.force_login(User.objects.earliest("pk"))
+        self.assertQueryBudget(reverse("home"), 8, self.grow)
+
+    def test_home_plans(self):
+        self.client.force_login(User.objects.earliest("pk"))
+        self.assertNoFullScans(reverse("home"))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear_all()
+        self.ns = cache.CacheNamespace("test")
+
+    def test_reads_go_through_l1_then_l2(self):
+        self.ns.set("key", "value")
+        self.assertEqual(self.ns.get("key"), "value")
+        cache.local_cache.clear()
+        self.assertEqual(self.ns.get("key"), "value")
+        self.assertEqual(self.ns.get("other", "default"), "default")
+        counts = self.ns.stats()
+        self.assertEqual(
+            (counts["l1_hits"], counts["l2_hits"], counts["misses"]), (1, 1, 1)
+        )
+
+    def test_invalidate_drops_the_whole_namespace(self):
+        self.ns.set("key", "value")
+        other = cache.CacheNamespace("other")
+        other.set("key", "kept")
+        self.ns.invalidate()
+        self.assertIsNone(self.ns.get("key"))
+        self.assertEqual(other.get("key"), "kept")
+
+    def test_l1_expires(self):
+        with self.settings(CACHE_L1_TIMEOUT=0.05):
+            ns = cache.CacheNamespace("short")
+        ns.set("key", "value")
+        ns.shared.delete(ns.make_key("key"))
+        self.assertEqual(ns.get("key"), "value")
+        time.sleep(0.06)
+        self.assertIsNone(ns.get("key"))
+
+    def test_lru_evicts_the_least_recently_used(self):
+        lru = cache.LRUCache(2)
+        lru.set("a", 1, None)
+        lru.set("b", 2, None)
+        lru.get("a")
+        lru.set("c", 3, None)
+        self.assertIs(lru.get("b"), cache.MISSING)
+        self.assertEqual((lru.get("a"), lru.get("c")), (1, 3))
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        started = threading.Barrier(8)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return "value"
+
+        def worker(results):
+            started.wait()
+            results.append(self.ns.get_or_set("key", compute))
+
+        results = []
+        threads = [threading.Thread(target=worker, args=(results,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["value"] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_waits_for_another_process_holding_the_lock(self):
+        # Another worker holds the L2 lock and stores the value shortly.
+        self.ns.shared.add(f"lock:{self.ns.make_key('key')}", "elsewhere", 30)
+        timer = threading.Timer(0.05, self.ns.shared.set, (self.ns.make_key("key"), "theirs"))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(self.ns.get_or_set("key", lambda: "ours"), "theirs")
+        self.assertEqual(self.ns.stats()["lock_waits"], 1)
+
+
+class HomeFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user("writer")
+        cls.builds = Category.objects.create(name="Builds", slug="builds")
+        cls.guides = Category.objects.create(name="Guides", slug="guides")
+        cls.posts = []
+        for number in range(6):
+            post = Post.objects.create(
+                title=f"Post {number}", content="Body", author=author, status="published"
+            )
+            post.category.add(cls.builds if number % 2 else cls.guides)
+            if number == 5:
+                post.category.add(cls.guides)
+            cls.posts.append(post)
+        Post.objects.create(title="Draft", content="Body", author=author).category.add(
+            cls.builds
+        )
+        # Newest last, one hour apart.
+        now = timezone.now()
+        for number, post in enumerate(cls.posts):
+            Post.objects.filter(pk=post.pk).update(
+                created_at=now - timedelta(hours=10 - number)
+            )
+
+    def feed(self):
+        sections = [("builds", "builds", 2), ("guides", "guides", 3)]
+        return build_home_feed(sections=sections, banner_size=2)
+
+    def titles(self, posts):
+        return [post.title for post in posts]
+
+    def test_sections_hold_the_newest_posts_of_their_category(self):
+        feed = self.feed()
+        self.assertEqual(self.titles(feed["banner_posts"]), ["Post 5", "Post 4"])
+        self.assertEqual(self.titles(feed["builds"]), ["Post 5", "Post 3"])
+        self.assertEqual(self.titles(feed["guides"]), ["Post 5", "Post 4", "Post 2"])
+        self.assertEqual(feed["total_posts"], 6)
+
+    def test_a_post_in_several_sections_is_loaded_once(self):
+        feed = self.feed()
+        self.assertIs(feed["builds"][0], feed["guides"][0])
+
+    def test_query_count_does_not_depend_on_the_sections(self):
+        # Posts, their categories and the published count.
+        with self.assertNumQueries(3):
+            self.feed()
+
+
+@skipUnless(
+    connection.vendor == "sqlite" and "init_command" in connection.settings_dict["OPTIONS"],
+    "SQLite production profile not in use",
+)
+class SQLiteProfileTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_on_every_connection(self):
+        connection.ensure_connection()
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("temp_store"), 2)  # MEMORY
+        self.assertEqual(self.pragma("busy_timeout"), settings.SQLITE_PRAGMAS["busy_timeout"])
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+
+@override_settings(
+    EMAIL_BACKEND="apps.core.mail.QueuedEmailBackend",
+    MAIL_QUEUE_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+    EMAIL_HOST="127.0.0.1",
+    EMAIL_USE_TLS=False,
+    EMAIL_HOST_USER="",
+    MAIL_QUEUE_RETRY_DELAY=60,
+)
+class MailQueueTests(TestCase):
+    def queue(self, *recipients):
+        for recipient in recipients:
+            EmailMessage("Hello", "Body", "blog@example.com", [recipient]).send()
+
+    def deliver(self, stub, **kwargs):
+        with self.settings(EMAIL_PORT=stub.port):
+            return send_queued(**kwargs)
+
+    def test_contact_form_only_queues(self):
+        response = self.client.post(
+            reverse("contact"),
+            {
+                "from_name": "Ada",
+                "from_email": "ada@example.com",
+                "subject": "Hi",
+                "message": "Hello there",
+            },
+        )
+        self.assertRedirects(response, reverse("contact"))
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.QUEUED)
+        self.assertIn("ada@example.com", email.message.body)
+
+    def test_password_reset_only_queues(self):
+        User.objects.create_user("ada", "ada@example.com", "x")
+        response = self.client.post(
+            reverse("password_reset"), {"email": "ada@example.com"}
+        )
+        self.assertRedirects(response, reverse("password_reset_done"))
+        self.assertEqual(OutboundEmail.objects.get().recipients, "ada@example.com")
+
+    def test_batch_shares_one_connection(self):
+        self.queue("a@example.com", "b@example.com", "c@example.com")
+        with SMTPStub() as stub:
+            results = self.deliver(stub)
+        self.assertEqual(results, {OutboundEmail.SENT: 3})
+        self.assertEqual(stub.connections, 1)
+        self.assertEqual(len(stub.messages), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT))
+
+    def test_temporary_failure_backs_off(self):
+        self.queue("a@example.com")
+        with SMTPStub(fail_data=2) as stub:
+            self.deliver(stub)
+            email = OutboundEmail.objects.get()
+            self.assertEqual((email.status, email.attempts), (OutboundEmail.QUEUED, 1))
+            self.assertIn("451", email.last_error)
+            first_delay = email.next_attempt_at - timezone.now()
+            # Not due yet, so nothing is claimed.
+            self.assertEqual(self.deliver(stub), {})
+
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            self.deliver(stub)
+            email.refresh_from_db()
+            self.assertGreater(email.next_attempt_at - timezone.now(), first_delay)
+
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(self.deliver(stub), {OutboundEmail.SENT: 1})
+        self.assertEqual(len(stub.messages), 1)
+
+    def test_permanent_failure_gives_up(self):
+        self.queue("gone@example.com", "a@example.com")
+        with SMTPStub(refuse={"gone@example.com"}) as stub:
+            results = self.deliver(stub)
+        self.assertEqual(results, {OutboundEmail.FAILED: 1, OutboundEmail.SENT: 1})
+        failed = OutboundEmail.objects.get(status=OutboundEmail.FAILED)
+        self.assertEqual(failed.attempts, 1)
+
+    def test_gives_up_after_max_attempts(self):
+        self.queue("a@example.com")
+        with SMTPStub(fail_data=5) as stub:
+            for _ in range(2):
+                OutboundEmail.objects.update(next_attempt_at=timezone.now())
+                self.deliver(stub, max_attempts=2)
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.FAILED, 2))
+
+    def test_unreachable_server_keeps_attempts(self):
+        self.queue("a@example.com")
+        with SMTPStub() as stub:
+            port = stub.port
+        with self.settings(EMAIL_PORT=port):
+            results = send_queued()
+        email = OutboundEmail.objects.get()
+        self.assertEqual(results, {OutboundEmail.QUEUED: 1})
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.QUEUED, 0))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+
+@override_settings(
+    DATABASE_ROUTERS=["apps.core.replicas.ReplicaRouter"],
+    DATABASE_REPLICAS=[ReplicaTestCase.replica],
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class ReplicaRoutingTests(ReplicaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Only on the primary: the stand-in replica never catches up.
+        cls.user = User.objects.create_user("ada", "ada@example.com", "x")
+        cls.post = Post.objects.create(
+            title="Fresh post", content="Body", author=cls.user, status="published"
+        )
+
+    def setUp(self):
+        replicas.reset_health()
+
+    def test_read_only_views_use_the_replica(self):
+        self.assertEqual(self.client.get(self.post.get_absolute_url()).status_code, 404)
+        self.assertEqual(self.client.get(reverse("search")).status_code, 200)
+
+    def test_writes_and_other_views_use_the_primary(self):
+        self.client.force_login(self.user)
+        response = self.client.post(self.post.get_absolute_url(), {"content": "Hi"})
+        self.assertRedirects(response, self.post.get_absolute_url())
+        self.assertTrue(Comment.objects.filter(post=self.post).exists())
+        self.assertEqual(self.client.get(reverse("profile")).status_code, 200)
+
+    def test_writer_is_pinned_to_the_primary(self):
+        self.client.force_login(self.user)
+        response = self.client.post(self.post.get_absolute_url(), {"content": "Hi"})
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertContains(response, "Hi")
+
+        # Once the pin expires the browser is back on the replica.
+        del self.client.cookies[replicas.PIN_COOKIE]
+        self.assertEqual(self.client.get(self.post.get_absolute_url()).status_code, 404)
+
+    def test_unhealthy_replica_fails_over_to_the_primary(self):
+        with (
+            self.unreachable_replica() as broken,
+            self.settings(DATABASE_REPLICAS=[broken]),
+        ):
+            response = self.client.get(self.post.get_absolute_url())
+            self.assertFalse(replicas.is_healthy(broken))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replicas.is_healthy(self.replica))
+
+
+class IconSubsetTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        source = finders.find(icons.SOURCE_STYLESHEET)
+        cls.css = Path(source).read_text(encoding="utf-8")
+
+    def tearDown(self):
+        icons.subset_available.cache_clear()
+
+    def test_templates_are_scanned(self):
+        classes = icons.used_classes()
+        self.assertLessEqual({"fas", "fab", "fa-search", "fa-github"}, classes)
+        self.assertNotIn("far", classes)
+
+    def test_only_used_icons_are_kept(self):
+        subset = icons.Subset(self.css, {"fas", "fa-search", "fab", "fa-github", "fa-nope"})
+        css = subset.css()
+        self.assertEqual(subset.fonts, {"fa-solid-900.woff2", "fa-brands-400.woff2"})
+        self.assertEqual(subset.codepoints, {0xF002, 0xF09B})
+        self.assertEqual(subset.unknown, {"fa-nope"})
+        self.assertIn(".fa-search{", css)
+        self.assertNotIn(".fa-trash", css)
+        self.assertNotIn("fa-regular-400", css)
+        self.assertNotIn("Font Awesome 5", css)
+        self.assertIn("@keyframes fa-spin", css)
+        self.assertTrue(css.startswith("/*!"))
+        self.assertLess(len(css), len(self.css) / 10)
+
+    def test_stylesheet_falls_back_to_the_full_set(self):
+        template = Template("{% load icons %}{% icon_stylesheet %}")
+        self.assertIn(icons.FULL_STYLESHEET, template.render(Context()))
+
+        with tempfile.TemporaryDirectory() as build:
+            target = Path(build) / icons.STYLESHEET
+            target.parent.mkdir(parents=True)
+            target.write_text(icons.Subset(self.css, {"fa-check"}).css())
+            icons.subset_available.cache_clear()
+            with self.settings(STATICFILES_DIRS=[*settings.STATICFILES_DIRS, build]):
+                self.assertIn(icons.STYLESHEET, template.render(Context()))
+
+    @skipUnless(
+        importlib.util.find_spec("fontTools") and importlib.util.find_spec("brotli"),
+        "Subsetting the webfonts needs fontTools and brotli.",
+    )
+    def test_build_writes_woff2_subsets(self):
+        from fontTools.ttLib import TTFont
+
+        with tempfile.TemporaryDirectory() as build:
+            call_command(
+                "build_icons", "--output", build, stdout=StringIO(), stderr=StringIO()
+            )
+            output = Path(build) / icons.OUTPUT_DIR
+            font = output / "webfonts" / "fa-solid-900.woff2"
+            self.assertEqual(font.read_bytes()[:4], b"wOF2")
+            vendor = Path(finders.find(icons.SOURCE_STYLESHEET)).parent.parent
+            full_size = (vendor / "webfonts" / font.name).stat().st_size
+            self.assertLess(font.stat().st_size, full_size / 5)
+            self.assertLessEqual({0xF002}, set(TTFont(font).getBestCmap()))
+            self.assertTrue((output / "css" / "icons.css").exists())
+            self.assertEqual([path.name for path in Path(build).iterdir()], [icons.OUTPUT_DIR])
+
+    def test_failed_build_falls_back_to_the_full_set(self):
+        with tempfile.TemporaryDirectory() as build:
+            stale = Path(build) / icons.STYLESHEET
+            stale.parent.mkdir(parents=True)
+            stale.write_text("/* from an older build */")
+            err = StringIO()
+            with mock.patch.dict(sys.modules, {"fontTools": None}):
+                call_command("build_icons", "--output", build, stdout=StringIO(), stderr=err)
+            self.assertIn("full Font Awesome stylesheet", err.getvalue())
+            self.assertEqual(list(Path(build).iterdir()), [])
+            self.assertEqual(icons.stylesheet(), icons.FULL_STYLESHEET)
+
+
+def png(width=800, height=400):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "#c0ffee").save(buffer, "PNG")
+    return ContentFile(buffer.getvalue(), name="cover.png")
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    IMAGE_DERIVATIVE_WIDTHS=(320, 640),
+    IMAGE_DERIVATIVES_SYNC=False,
+)
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear_all()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = {"BACKEND": "django.core.files.storage.FileSystemStorage"}
+        settings_override = self.settings(
+            MEDIA_ROOT=media.name, STORAGES={**settings.STORAGES, "default": storage}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_new_image_is_queued(self):
+        category = Category.objects.create(name="Espresso", image=png())
+        self.assertEqual(
+            list(PendingDerivatives.objects.values_list("name", flat=True)),
+            [category.image.name],
+        )
+        category.name = "Ristretto"
+        category.save()
+        self.assertEqual(PendingDerivatives.objects.count(), 1)
+
+    def test_render_only_reads_the_manifest(self):
+        category = Category.objects.create(name="Espresso", image=png())
+        PendingDerivatives.objects.all().delete()
+        self.assertEqual(images.srcset(category.image.name), "")
+        self.assertEqual(images.best_url(category.image.name, 640), category.image.url)
+        self.assertFalse(PendingDerivatives.objects.exists())
+        self.assertFalse(ImageManifest.objects.exists())
+
+    def test_worker_generates_queued_images(self):
+        category = Category.objects.create(name="Espresso", image=png())
+        self.assertEqual(images.generate_pending(), (1, 0))
+        self.assertFalse(PendingDerivatives.objects.exists())
+        manifest = images.get_manifest(category.image.name)
+        self.assertEqual([width for width, _ in manifest["webp"]], [320, 640])
+        self.assertIn(" 640w", images.srcset(category.image.name))
+
+    def test_manifest_survives_a_cleared_cache(self):
+        category = Category.objects.create(name="Espresso", image=png())
+        images.generate_pending()
+        cache.clear_all()
+        with self.assertNumQueries(1):
+            self.assertIn(" 640w", images.srcset(category.image.name))
+        with self.assertNumQueries(0):
+            self.assertIn(" 640w", images.srcset(category.image.name))
+
+    def test_broken_pool_reschedules_the_batch(self):
+        class BrokenPool:
+            def submit(self, fn, *args):
+                raise BrokenProcessPool("A child process terminated abruptly")
+
+        images.schedule_derivatives("categories/a.png", "categories/b.png")
+        with self.assertRaises(BrokenProcessPool):
+            images.generate_pending(pool=BrokenPool())
+        for task in PendingDerivatives.objects.all():
+            self.assertEqual(task.attempts, 1)
+            self.assertIn("BrokenProcessPool", task.last_error)
+            self.assertLess(task.next_attempt_at, timezone.now() + images.LEASE)
+
+    def test_failures_back_off(self):
+        images.schedule_derivatives("categories/missing.png")
+        self.assertEqual(images.generate_pending(), (0, 1))
+        task = PendingDerivatives.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.next_attempt_at, timezone.now())
+        self.assertEqual(images.generate_pending(), (0, 0))
+
+    def test_refresh_probes_storage_before_queueing(self):
+        done = Category.objects.create(name="Espresso", image=png())
+        images.generate_pending()
+        lost = Category.objects.create(name="Lungo", image=png())
+        PendingDerivatives.objects.all().delete()
+        cache.clear_all()
+
+        self.assertEqual(images.refresh_manifests(), [lost.image.name])
+        self.assertTrue(images.get_manifest(done.image.name)["webp"])
+        self.assertEqual(
+            list(PendingDerivatives.objects.values_list("name", flat=True)),
+            [lost.image.name],
+        )
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.storage = ContentAddressedStorage(location=media.name, base_url="/media/")
+
+    def test_identical_uploads_share_a_blob(self):
+        first = self.storage.save("posts/a.jpg", ContentFile(b"roast"))
+        second = self.storage.save("posts/b.JPG", ContentFile(b"roast"))
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.storage.resolve(first), self.storage.resolve(second))
+        self.assertTrue(self.storage.resolve(first).startswith("cas/"))
+        with self.storage.open(second) as stored:
+            self.assertEqual(stored.read(), b"roast")
+
+    def test_url_points_at_the_blob(self):
+        name = self.storage.save("posts/a.jpg", ContentFile(b"roast"))
+        url = self.storage.url(name)
+        self.assertEqual(url, f"/media/{self.storage.resolve(name)}")
+        self.assertIn("immutable", media_cache_control(url.removeprefix("/media/")))
+        self.assertNotIn("immutable", media_cache_control(name))
+
+    def test_resaved_name_gets_the_new_url(self):
+        name = self.storage.save("posts/a.jpg", ContentFile(b"light roast"))
+        before = self.storage.url(name)
+        # What another worker does when it replaces the file.
+        other = ContentAddressedStorage(location=self.storage.location, base_url="/media/")
+        other.delete(name)
+        self.assertEqual(other.save(name, ContentFile(b"dark roast")), name)
+        self.assertNotEqual(self.storage.url(name), before)
+
+    def test_delete_keeps_shared_blobs(self):
+        first = self.storage.save("posts/a.jpg", ContentFile(b"roast"))
+        second = self.storage.save("posts/b.jpg", ContentFile(b"roast"))
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertEqual(self.storage.orphaned_blobs(), [])
+        blob = self.storage.resolve(second)
+        self.storage.delete(second)
+        self.assertEqual(self.storage.orphaned_blobs(), [blob])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Seeder(seed=1).run(**scaled(10))
+
+    def setUp(self):
+        cache.clear_all()
+        self.addCleanup(timing.close_sink)
+
+    def test_header_counts_queries_and_templates(self):
+        response = self.client.get(reverse("home"))
+        timings = response["Server-Timing"]
+        self.assertRegex(
+            timings,
+            r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+$',
+        )
+        queries = int(re.search(r"(\d+) queries", timings)[1])
+        self.assertGreater(queries, 0)
+        self.assertGreater(float(re.search(r"tpl;dur=([\d.]+)", timings)[1]), 0)
+
+        cached = self.client.get(reverse("home"))
+        self.assertEqual(cached["X-Page-Cache"], "hit")
+        self.assertLess(int(re.search(r"(\d+) queries", cached["Server-Timing"])[1]), queries)
+
+    def test_sampled_requests_go_to_a_file_per_process(self):
+        with tempfile.TemporaryDirectory() as directory:
+            base = Path(directory) / "logs" / "perf.jsonl"
+            with self.settings(PERF_SAMPLE_RATE=1, PERF_LOG_FILE=str(base)):
+                for _ in range(3):
+                    self.client.get(reverse("home"))
+                timing.close_sink()
+                files = perflog.log_files(base)
+                own = base.parent / f"perf.{os.getpid()}.jsonl"
+                self.assertEqual(files, [str(own)])
+
+                records = [json.loads(line) for line in own.read_text().splitlines()]
+                self.assertEqual([record["view"] for record in records], ["home"] * 3)
+                self.assertEqual(
+                    [record["page_cache"] for record in records], ["miss", "hit", "hit"]
+                )
+                self.assertEqual(perflog.aggregate(perflog.read_records(files))["home"].requests, 3)
+
+
+class QuantileSketchTests(SimpleTestCase):
+    def test_quantiles_stay_within_the_relative_error(self):
+        rng = random.Random(7)
+        values = [rng.lognormvariate(3, 1.2) for _ in range(20000)]
+        values += [rng.uniform(500, 5000) for _ in range(500)]
+        sketch = perflog.QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+        values.sort()
+        for q in (0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 0.999):
+            with self.subTest(q=q):
+                exact = values[int(q * (len(values) - 1))]
+                self.assertLessEqual(abs(sketch.quantile(q) - exact), 0.01 * exact * 1.0001)
+
+    def test_merge_matches_a_single_sketch(self):
+        rng = random.Random(3)
+        values = [rng.expovariate(1 / 40) for _ in range(5000)]
+        whole, left, right = (perflog.QuantileSketch() for _ in range(3))
+        for index, value in enumerate(values):
+            whole.add(value)
+            (left if index % 2 else right).add(value)
+        left.merge(right)
+        for q in perflog.PERCENTILES:
+            self.assertEqual(left.quantile(q), whole.quantile(q))
+
+    def test_edges(self):
+        sketch = perflog.QuantileSketch()
+        self.assertIsNone(sketch.quantile(0.5))
+        for value in (0, 0, 0, 12.5):
+            sketch.add(value)
+        self.assertEqual(sketch.quantile(0.5), 0)
+        self.assertEqual(sketch.quantile(1), 12.5)
+
+    def test_collapsing_keeps_the_high_percentiles(self):
+        sketch = perflog.QuantileSketch(max_buckets=50)
+        values = [1.05**n for n in range(400)]
+        for value in values:
+            sketch.add(value)
+        self.assertLessEqual(len(sketch.buckets), 50)
+        exact = values[int(0.99 * (len(values) - 1))]
+        self.assertLessEqual(abs(sketch.quantile(0.99) - exact), 0.01 * exact * 1.0001)
+
+
+class PerfReportTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def log(self, name, day, view, latencies, queries=3):
+        path = self.directory / name
+        with path.open("a", encoding="utf-8") as log:
+            for latency in latencies:
+                record = {
+                    "ts": f"2026-10-{day:02d}T12:00:00+00:00",
+                    "view": view,
+                    "status": 200,
+                    "total_ms": latency,
+                    "sql_count": queries,
+                    "bytes": 2048,
+                }
+                log.write(json.dumps(record) + "\n")
+            log.write("not json\n")
+        return str(path)
+
+    def report(self, *args):
+        out = StringIO()
+        call_command("perf_report", *args, stdout=out)
+        return out.getvalue()
+
+    def test_summary_per_view(self):
+        path = self.log("perf.1.jsonl", 1, "home", range(1, 101))
+        self.log("perf.1.jsonl", 1, "post_detail", [40] * 10, queries=6)
+        report = json.loads(self.report(path, "--json"))["views"]
+        self.assertEqual(report["home"]["requests"], 100)
+        self.assertAlmostEqual(report["home"]["p50_ms"], 50, delta=0.5)
+        self.assertAlmostEqual(report["home"]["p95_ms"], 95, delta=1)
+        self.assertEqual(report["post_detail"]["max_queries"], 6)
+        self.assertIn("post_detail", self.report(path))
+
+    def test_reads_every_process_log_by_default(self):
+        self.log("perf.10.jsonl", 1, "home", [10] * 5)
+        self.log("perf.11.jsonl.1", 1, "home", [10] * 5)
+        self.log("perf.jsonl", 1, "home", [10] * 5)
+        self.log("perf.old.jsonl", 1, "home", [10] * 5)
+        with self.settings(PERF_LOG_FILE=str(self.directory / "perf.jsonl")):
+            report = json.loads(self.report("--json"))["views"]
+        self.assertEqual(report["home"]["requests"], 10)
+
+    def test_regressions_against_a_baseline(self):
+        path = self.log("perf.1.jsonl", 1, "home", [20] * 30)
+        self.log("perf.1.jsonl", 2, "home", [30] * 30, queries=5)
+        self.log("perf.1.jsonl", 2, "search", [30] * 30)
+        args = [path, "--baseline-until", "2026-10-02", "--since", "2026-10-02"]
+        out = self.report(*args)
+        self.assertIn("p50_ms", out)
+        self.assertIn("queries", out)
+        with self.assertRaisesMessage(CommandError, "Regressions in: home"):
+            self.report(*args, "--fail-on-regression")
+
+    def test_bad_input(self):
+        with self.assertRaisesMessage(CommandError, "Invalid time"):
+            self.report(str(self.directory), "--since", "yesterday")
+        with self.assertRaises(CommandError):
+            self.report(str(self.directory / "missing.jsonl"))
@@ -0,0 +1,179 @@
+"""
+Per-request cost accounting.
+
+``RequestTimingMiddleware`` opens a ``Timer`` for each request; SQL goes
+through an execute wrapper installed on every connection as it is created
+and template rendering through the ``TimedDjangoTemplates`` backend, both
+of which add to whichever timer is current. The timer lives in a context
+variable, so work an async view hands to other threads is counted too.
+
+Sampled records are handed to a queue and written to a rotating JSONL
+file by a background thread, so the request never waits on disk. Each
+process writes its own file (``perf.<pid>.jsonl``): processes sharing
+one rotating file would lose lines whenever one of them rotated it.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+_current = contextvars.ContextVar("request_timer", default=None)
+
+
+class Timer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current_timer():
+    return _current.get()
+
+
+def start():
+    timer = Timer()
+    return timer, _current.set(timer)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def record_sql(execute, sql, params, many, context):
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        with timer.lock:
+            timer.sql_count += 1
+            timer.sql_time += elapsed
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """``connection_created`` receiver adding ``record_sql`` to the connection."""
+    if record_sql not in connection.execute_wrappers:
+        # At the bottom of the stack, out of the way of execute_wrapper()
+        # blocks that push and pop their own wrappers.
+        connection.execute_wrappers.insert(0, record_sql)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timer = _current.get()
+        if timer is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            elapsed = time.perf_counter() - started
+            with timer.lock:
+                timer.template_time += elapsed
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The stock backend, timing each top-level render. Includes and
+    extends happen inside that render and are not counted twice.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def server_timing(timer, total):
+    return ", ".join(
+        (
+            f"total;dur={total * 1000:.1f}",
+            f'db;dur={timer.sql_time * 1000:.1f};desc="{timer.sql_count} queries"',
+            f"tpl;dur={timer.template_time * 1000:.1f}",
+        )
+    )
+
+
+# -- JSONL sink -----------------------------------------------------------
+
+logger = logging.getLogger("apps.core.timing.requests")
+logger.propagate = False
+
+_listener = None
+_listener_pid = None
+_sink_lock = threading.Lock()
+
+
+def process_log_file(pid=None):
+    """PERF_LOG_FILE with the process id before its extension."""
+    root, extension = os.path.splitext(os.fspath(settings.PERF_LOG_FILE))
+    return f"{root}.{pid or os.getpid()}{extension}"
+
+
+def _open_sink():
+    global _listener, _listener_pid
+    with _sink_lock:
+        # A forked worker inherits the parent's listener but not its thread.
+        if _listener is None or _listener_pid != os.getpid():
+            logger.handlers.clear()
+            _listener, _listener_pid = _start_listener(), os.getpid()
+
+
+def close_sink():
+    """Write out the queued records and close the file."""
+    global _listener
+    with _sink_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+        _listener = None
+        logger.handlers.clear()
+
+
+def _start_listener():
+    path = process_log_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=settings.PERF_LOG_MAX_BYTES,
+        backupCount=settings.PERF_LOG_BACKUPS,
+        encoding="utf-8",
+        delay=True,
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(logging.INFO)
+    return listener
+
+
+def write(record):
+    if _listener is None or _listener_pid != os.getpid():
+        _open_sink()
+    logger.info(json.dumps(record, separators=(",", ":")))
+
+
+atexit.register(close_sink)
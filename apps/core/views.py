@@ -1,44 +1,26 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.shortcuts import redirect, render
+from django.views.static import serve
 
-from apps.posts.models import Category, Post
-
+from .conditional import conditional_page
+from .feed import abuild_home_feed, home_version
 from .forms import ContactForm
+from .replicas import replica_reads
+from .storage import media_cache_control
 
 
 def landing(request):
     return render(request, "core/landing.html")
 
 
-def home(request):
-    banner_posts = Post.objects.filter(status="published").order_by("-created_at")[:5]
-
-    new_builds = Post.objects.filter(
-        status="published", category__slug="builds"
-    ).order_by("-created_at")[:9]
-
-    new_guides = Post.objects.filter(
-        status="published", category__slug="guides"
-    ).order_by("-created_at")[:6]
-
-    new_reviews = Post.objects.filter(
-        status="published", category__slug="reviews"
-    ).order_by("-created_at")[:4]
-    total_posts = Post.objects.filter(status="published").count()
-    categories = Category.objects.all()
-
-    context = {
-        "banner_posts": banner_posts,
-        "new_builds": new_builds,
-        "new_guides": new_guides,
-        "new_reviews": new_reviews,
-        "total_posts": total_posts,
-        "categories": categories,
-    }
-
-    return render(request, "core/home.html", context)
+@replica_reads
+@conditional_page(home_version)
+async def home(request):
+    context = await abuild_home_feed()
+    return await sync_to_async(render)(request, "core/home.html", context)
 
 
 def about(request):
@@ -73,3 +55,9 @@ def contact(request):
         "form": form,
     }
     return render(request, "core/contact.html", context)
+
+
+def media(request, path):
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response["Cache-Control"] = media_cache_control(path)
+    return response
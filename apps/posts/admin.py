@@ -5,7 +5,7 @@ from .models import Category, Comment, Post
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ["title", "author", "status", "created_at"]
+    list_display = ["title", "author", "status", "comment_count", "created_at"]
     list_filter = ["status", "created_at", "category"]
     search_fields = ["title", "content"]
     prepopulated_fields = {"slug": ("title",)}
@@ -18,6 +18,6 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
-    list_display = ["author", "post", "created_at", "is_active"]
+    list_display = ["author", "post", "created_at", "is_active", "reply_count"]
     list_filter = ["is_active", "created_at"]
     search_fields = ["content", "author__username"]
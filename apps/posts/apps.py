@@ -6,4 +6,4 @@ class PostsConfig(AppConfig):
     name = "apps.posts"
 
     def ready(self):
-        from .models import Category, Comment, Post
+        from . import signals  # noqa: F401
@@ -0,0 +1,79 @@
+"""
+Post cards, rendered once and kept in the "cards" cache namespace.
+
+A card's markup only depends on the post, so it is cached under the
+post id, its ``updated_at`` and the variant; editing a post moves it to a
+new key. What a card shows from other rows (category names, the author's
+username) is covered by invalidating the whole namespace when those
+change. A listing looks up all its cards with one ``get_many`` and only
+renders the misses, prefetching their categories in one query.
+"""
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+
+from apps.core import images
+from apps.core.cache import namespace
+
+TEMPLATE = "posts/partials/post_card.html"
+
+# Variant: (post fields besides updated_at the markup depends on,
+# whether it lists the categories).
+VARIANTS = {
+    "banner": ((), True),
+    "grid": ((), True),
+    "compact": ((), True),
+    "row": (("comment_count",), False),
+}
+
+cards_cache = namespace("cards")
+
+
+def timeout():
+    return getattr(settings, "POST_CARD_TIMEOUT", 60 * 60)
+
+
+def card_key(post, variant):
+    fields, _ = VARIANTS[variant]
+    parts = [variant, post.pk, post.updated_at.timestamp()]
+    parts.extend(getattr(post, field) for field in fields)
+    return ":".join(map(str, parts))
+
+
+def _derivatives_pending(post):
+    # Until the resized copies exist the card links the original image;
+    # keep that version only until the next time the manifest is checked.
+    return bool(post.image) and not images.srcset(post.image.name)
+
+
+def render_cards(posts, variant):
+    """The card markup of every post in ``posts``, in order."""
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown post card variant: {variant!r}")
+    posts = list(posts)
+    keys = [card_key(post, variant) for post in posts]
+    cards = cards_cache.get_many(keys)
+
+    missing = {key: post for key, post in zip(keys, posts) if key not in cards}
+    if missing:
+        if VARIANTS[variant][1]:
+            prefetch_related_objects(list(missing.values()), "category")
+        fresh, pending = {}, {}
+        for key, post in missing.items():
+            html = render_to_string(TEMPLATE, {"post": post, "variant": variant})
+            (pending if _derivatives_pending(post) else fresh)[key] = html
+        for batch, seconds in ((fresh, timeout()), (pending, 60)):
+            if batch:
+                cards_cache.set_many(batch, seconds)
+                cards.update(batch)
+    return [cards[key] for key in keys]
+
+
+def invalidate():
+    cards_cache.invalidate()
+
+
+def version():
+    """Moves whenever a card changes without its post row, e.g. on a rename."""
+    return cards_cache.version()
@@ -0,0 +1,158 @@
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Post
+
+
+class CommentThread:
+    """Active comments of a post arranged as a tree, loaded in one query."""
+
+    def __init__(self, comments):
+        self.roots = []
+        self.count = 0
+        by_id = {comment.pk: comment for comment in comments}
+        for comment in comments:
+            comment.children = []
+        for comment in comments:
+            if comment.parent_id is None:
+                self.roots.append(comment)
+            elif comment.parent_id in by_id:
+                by_id[comment.parent_id].children.append(comment)
+        # Replies whose parent was hidden are not reachable from the roots,
+        # so walking the tree both sets the depth and counts what is shown.
+        stack = [(comment, 0) for comment in reversed(self.roots)]
+        while stack:
+            comment, depth = stack.pop()
+            comment.depth = depth
+            self.count += 1
+            stack.extend((child, depth + 1) for child in reversed(comment.children))
+
+    def __iter__(self):
+        return iter(self.roots)
+
+    def __len__(self):
+        return len(self.roots)
+
+
+def load_comment_thread(post):
+    comments = list(
+        Comment.objects.filter(post=post, is_active=True)
+        .select_related("author", "author__profile")
+        .order_by("created_at", "pk")
+    )
+    return CommentThread(comments)
+
+
+# Comments a thread shows: active ones whose ancestors are all active.
+# Walks down from the roots, so a hidden comment hides its whole subtree.
+VISIBLE_SQL = """
+WITH RECURSIVE shown(id, post_id) AS (
+    SELECT id, post_id FROM {comments} WHERE parent_id IS NULL AND is_active
+    UNION ALL
+    SELECT c.id, c.post_id FROM {comments} c
+    JOIN shown s ON c.parent_id = s.id
+    WHERE c.is_active
+),
+visible(post_id, total) AS (
+    SELECT post_id, COUNT(*) FROM shown GROUP BY post_id
+)
+"""
+VISIBLE_TOTAL = (
+    "COALESCE((SELECT total FROM visible WHERE visible.post_id = {posts}.id), 0)"
+)
+
+
+def ancestors_active(parent_id):
+    """True if the comment ``parent_id`` and every comment above it are active."""
+    if parent_id is None:
+        return True
+    table = Comment._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH RECURSIVE chain(id, parent_id, is_active) AS (
+                SELECT id, parent_id, is_active FROM {table} WHERE id = %s
+                UNION ALL
+                SELECT c.id, c.parent_id, c.is_active FROM {table} c
+                JOIN chain ON c.id = chain.parent_id
+            )
+            SELECT COUNT(*) FROM chain WHERE NOT is_active
+            """,
+            [parent_id],
+        )
+        return not cursor.fetchone()[0]
+
+
+def visible_replies(comment_id):
+    """Replies below ``comment_id`` that show when it does."""
+    table = Comment._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH RECURSIVE shown(id) AS (
+                SELECT id FROM {table} WHERE parent_id = %s AND is_active
+                UNION ALL
+                SELECT c.id FROM {table} c JOIN shown s ON c.parent_id = s.id
+                WHERE c.is_active
+            )
+            SELECT COUNT(*) FROM shown
+            """,
+            [comment_id],
+        )
+        return cursor.fetchone()[0]
+
+
+def adjust_comment_counters(comment, delta, with_replies=False):
+    """
+    Apply +1/-1 for an active comment appearing or disappearing. With
+    ``with_replies`` (a comment switched on or off, or deleted with its
+    replies) the replies it shows or hides move the post's count too.
+    """
+    # Clamped: raw loads and queryset updates bypass these signals, and a
+    # drifted counter must not fail the delete that follows.
+    if comment.parent_id:
+        Comment.objects.filter(pk=comment.parent_id).update(
+            reply_count=Greatest(F("reply_count") + delta, 0)
+        )
+    if not ancestors_active(comment.parent_id):
+        # Under a hidden comment: the thread never showed it.
+        return
+    shown = 1 + (visible_replies(comment.pk) if with_replies else 0)
+    Post.objects.filter(pk=comment.post_id).update(
+        comment_count=Greatest(F("comment_count") + delta * shown, 0)
+    )
+
+
+def reconcile_comment_counts(post_model=Post, comment_model=Comment, dry_run=False):
+    """
+    Recompute every counter from the comments table, finding the drifted
+    rows in one query per counter and touching only those. Returns the number of
+    posts and comments that were wrong.
+    """
+    posts = post_model._meta.db_table
+    visible = VISIBLE_SQL.format(comments=comment_model._meta.db_table)
+    total = VISIBLE_TOTAL.format(posts=posts)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{visible} SELECT id, {total} FROM {posts} WHERE comment_count <> {total}"
+        )
+        drifted_posts = [
+            post_model(pk=pk, comment_count=count) for pk, count in cursor.fetchall()
+        ]
+
+    active = comment_model.objects.filter(is_active=True).order_by()
+    replies = Coalesce(
+        Subquery(
+            active.filter(parent=OuterRef("pk"))
+            .values("parent")
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+    drifted_comments = comment_model.objects.exclude(reply_count=replies)
+    if dry_run:
+        return len(drifted_posts), drifted_comments.count()
+    post_model.objects.bulk_update(drifted_posts, ["comment_count"], batch_size=500)
+    return len(drifted_posts), drifted_comments.update(reply_count=replies)
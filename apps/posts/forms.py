@@ -7,6 +7,7 @@ SORT_CHOICES = [
     ('oldest', 'Oldest'),
     ('title_asc', 'Title (A-Z)'),
     ('title_desc', 'Title (Z-A)'),
+    ('relevance', 'Relevance'),
 ]
 
 class CommentForm(forms.ModelForm):
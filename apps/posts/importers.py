@@ -0,0 +1,265 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from apps.core import images
+
+from . import related, search
+from .models import Category, Post, post_image_path
+from .slugs import SlugAllocator
+
+
+class RecordError(ValueError):
+    pass
+
+
+def read_jsonl(path):
+    """One post per line: {"title", "content", "author", "categories", ...}."""
+    path = Path(path)
+    with path.open(encoding="utf-8") as source:
+        for number, line in enumerate(source, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise RecordError(f"{path}:{number}: {exc}") from exc
+            record.setdefault("_source", f"{path}:{number}")
+            record.setdefault("_base_dir", str(path.parent))
+            yield record
+
+
+def read_markdown_folder(path):
+    """
+    Every ``*.md`` file below ``path`` is a post. An optional front matter
+    block between ``---`` lines holds ``key: value`` pairs; the rest of the
+    file is the content.
+    """
+    for md_file in sorted(Path(path).rglob("*.md")):
+        text = md_file.read_text(encoding="utf-8")
+        record = {}
+        if text.startswith("---"):
+            header, _, text = text[3:].partition("\n---")
+            for line in header.splitlines():
+                key, sep, value = line.partition(":")
+                if sep:
+                    record[key.strip().lower()] = value.strip()
+            text = text.lstrip("\n")
+        if isinstance(record.get("categories"), str):
+            record["categories"] = [
+                name.strip() for name in record["categories"].split(",") if name.strip()
+            ]
+        if "title" not in record:
+            first_line = text.lstrip().splitlines()[0] if text.strip() else ""
+            if first_line.startswith("# "):
+                record["title"] = first_line[2:].strip()
+                text = text.lstrip()[len(first_line) :].lstrip("\n")
+            else:
+                record["title"] = md_file.stem.replace("-", " ").replace("_", " ")
+        record["content"] = text.strip()
+        record["_source"] = str(md_file)
+        record["_base_dir"] = str(md_file.parent)
+        yield record
+
+
+class PostImporter:
+    """
+    Streams post records into the database in batches: one query to load
+    the taken slugs of the batch, ``bulk_create`` for posts and for the
+    ``Post.category`` through rows, and a thread pool for image uploads.
+    """
+
+    def __init__(
+        self,
+        default_author=None,
+        default_status="published",
+        batch_size=500,
+        with_images=True,
+        image_workers=8,
+        progress=None,
+    ):
+        self.default_author = default_author
+        self.default_status = default_status
+        self.batch_size = batch_size
+        self.with_images = with_images
+        self.image_workers = image_workers
+        self.progress = progress or (lambda message: None)
+        self.slugs = SlugAllocator(Post)
+        self.category_slugs = SlugAllocator(Category)
+        self.authors = {}
+        self.categories = {}
+        self.imported = 0
+        self.skipped = []
+        self.warnings = []
+
+    def run(self, records):
+        started = time.perf_counter()
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+                self._report(started)
+        if batch:
+            self._import_batch(batch)
+            self._report(started)
+        elapsed = time.perf_counter() - started
+        return {
+            "imported": self.imported,
+            "skipped": len(self.skipped),
+            "seconds": elapsed,
+            "rate": self.imported / elapsed if elapsed else 0.0,
+        }
+
+    def _report(self, started):
+        elapsed = time.perf_counter() - started
+        rate = self.imported / elapsed if elapsed else 0.0
+        self.progress(f"{self.imported} posts imported ({rate:.0f} posts/s)")
+
+    # -- lookups --------------------------------------------------------
+
+    def _load_authors(self, batch):
+        usernames = {r.get("author") for r in batch if r.get("author")}
+        missing = usernames - self.authors.keys()
+        if missing:
+            for user in User.objects.filter(username__in=missing):
+                self.authors[user.username] = user
+
+    def _load_categories(self, batch):
+        names = {name for r in batch for name in r.get("categories") or []}
+        missing = names - self.categories.keys()
+        if not missing:
+            return
+        for category in Category.objects.filter(name__in=missing):
+            self.categories[category.name] = category
+        new_names = sorted(missing - self.categories.keys())
+        if new_names:
+            self.category_slugs.prime(
+                self.category_slugs.base_for(name) for name in new_names
+            )
+            created = Category.objects.bulk_create(
+                Category(name=name, slug=self.category_slugs.allocate(name))
+                for name in new_names
+            )
+            for category in created:
+                self.categories[category.name] = category
+
+    # -- batch ----------------------------------------------------------
+
+    def _build_post(self, record):
+        if not record.get("title") or not record.get("content"):
+            raise RecordError("title and content are required")
+        author = self.authors.get(record.get("author")) or self.default_author
+        if author is None:
+            raise RecordError(f"unknown author {record.get('author')!r}")
+        status = record.get("status") or self.default_status
+        if status not in dict(Post.STATUS_CHOICES):
+            raise RecordError(f"invalid status {status!r}")
+        post = Post(
+            title=record["title"][:200],
+            content=record["content"],
+            author=author,
+            status=status,
+        )
+        post.render_content()
+        post.slug = self.slugs.allocate(record.get("slug") or post.title)
+        created_at = record.get("created_at")
+        if created_at:
+            try:
+                created_at = parse_datetime(created_at)
+            except ValueError:
+                created_at = None
+            if created_at is None:
+                raise RecordError(f"invalid created_at {record['created_at']!r}")
+            if is_naive(created_at):
+                created_at = make_aware(created_at)
+        post._imported_created_at = created_at
+        return post
+
+    def _store_image(self, post, record):
+        path = Path(record["image"])
+        if not path.is_absolute():
+            path = Path(record["_base_dir"]) / path
+        with path.open("rb") as image:
+            name = post_image_path(post, path.name)
+            post.image.name = default_storage.save(name, File(image, name=path.name))
+
+    def _import_batch(self, batch):
+        self._load_authors(batch)
+        self._load_categories(batch)
+        self.slugs.prime(
+            self.slugs.base_for(r.get("slug") or r.get("title") or "") for r in batch
+        )
+
+        posts, records = [], []
+        for record in batch:
+            try:
+                posts.append(self._build_post(record))
+                records.append(record)
+            except RecordError as exc:
+                self.skipped.append((record.get("_source"), str(exc)))
+
+        if self.with_images:
+            with_image = [(p, r) for p, r in zip(posts, records) if r.get("image")]
+            with ThreadPoolExecutor(max_workers=self.image_workers) as pool:
+                for (post, record), error in zip(
+                    with_image, pool.map(self._try_store_image, with_image)
+                ):
+                    if error:
+                        self.warnings.append((record.get("_source"), error))
+
+        with transaction.atomic():
+            Post.objects.bulk_create(posts, batch_size=self.batch_size)
+            dated = [p for p in posts if p._imported_created_at]
+            for post in dated:
+                post.created_at = post.updated_at = post._imported_created_at
+            if dated:
+                Post.objects.bulk_update(
+                    dated, ["created_at", "updated_at"], batch_size=self.batch_size
+                )
+            Post.category.through.objects.bulk_create(
+                (
+                    Post.category.through(
+                        post_id=post.pk, category_id=self.categories[name].pk
+                    )
+                    for post, record in zip(posts, records)
+                    for name in dict.fromkeys(record.get("categories") or [])
+                ),
+                batch_size=self.batch_size,
+            )
+            search.index_posts(posts)
+            related.schedule_related_update(*(post.pk for post in posts))
+            images.schedule_derivatives(*(post.image.name for post in posts if post.image))
+        self.imported += len(posts)
+
+    def _try_store_image(self, item):
+        post, record = item
+        try:
+            self._store_image(post, record)
+        except OSError as exc:
+            return f"image {record['image']!r}: {exc}"
+        return None
+
+
+def open_source(path, source_format=None):
+    path = Path(path)
+    if source_format is None:
+        source_format = "markdown" if path.is_dir() else "jsonl"
+    if source_format == "markdown":
+        if not path.is_dir():
+            raise RecordError(f"{path} is not a directory")
+        return read_markdown_folder(path)
+    if not os.path.isfile(path):
+        raise RecordError(f"{path} does not exist")
+    return read_jsonl(path)
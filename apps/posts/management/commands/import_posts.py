@@ -0,0 +1,64 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.posts.importers import PostImporter, RecordError, open_source
+
+
+class Command(BaseCommand):
+    help = "Bulk import posts from a JSONL file or a folder of Markdown files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="JSONL file or directory of .md files.")
+        parser.add_argument("--format", choices=["jsonl", "markdown"])
+        parser.add_argument(
+            "--author",
+            help="Username used for records without a known author.",
+        )
+        parser.add_argument(
+            "--status",
+            default="published",
+            choices=["draft", "published"],
+            help="Status for records that do not set one.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--image-workers", type=int, default=8)
+        parser.add_argument(
+            "--no-images", action="store_true", help="Ignore the image field."
+        )
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options["author"]:
+            try:
+                default_author = User.objects.get(username=options["author"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['author']!r} does not exist.")
+
+        try:
+            records = open_source(options["source"], options["format"])
+        except RecordError as exc:
+            raise CommandError(str(exc))
+
+        importer = PostImporter(
+            default_author=default_author,
+            default_status=options["status"],
+            batch_size=options["batch_size"],
+            with_images=not options["no_images"],
+            image_workers=options["image_workers"],
+            progress=self.stdout.write,
+        )
+        try:
+            result = importer.run(records)
+        except RecordError as exc:
+            raise CommandError(str(exc))
+
+        for source, message in importer.skipped:
+            self.stderr.write(f"Skipped {source}: {message}")
+        for source, message in importer.warnings:
+            self.stderr.write(f"Warning {source}: {message}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result['imported']} posts in {result['seconds']:.1f}s "
+                f"({result['rate']:.0f} posts/s), skipped {result['skipped']}."
+            )
+        )
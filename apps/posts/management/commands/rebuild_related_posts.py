@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from apps.posts import related
+from apps.posts.models import PendingRelatedUpdate
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the related posts of every published post, or with --loop "
+        "keep refreshing the posts queued by edits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep applying queued updates instead of rebuilding everything once.",
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when the queue is empty (with --loop).",
+        )
+        parser.add_argument(
+            "--reload-every",
+            type=float,
+            default=60 * 60,
+            help="Seconds between full reloads of the corpus (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        if not options["loop"]:
+            return self.rebuild()
+        corpus = loaded = None
+        try:
+            while True:
+                # A long-running worker never gets request_finished.
+                close_old_connections()
+                if corpus is None or time.monotonic() - loaded > options["reload_every"]:
+                    corpus = related.Corpus.load()
+                    loaded = time.monotonic()
+                handled = related.update_pending(corpus, options["batch_size"])
+                if handled:
+                    self.stdout.write(f"Refreshed related posts of {handled} posts.")
+                if handled < options["batch_size"]:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+    def rebuild(self):
+        started = time.perf_counter()
+        queued_before = timezone.now()
+        total = related.rebuild_related()
+        # The rebuild covers everything that was queued before it.
+        PendingRelatedUpdate.objects.filter(queued_at__lte=queued_before).delete()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Stored {total} related posts in {elapsed:.2f}s.")
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.posts.comments import reconcile_comment_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.comment_count and Comment.reply_count from the comments table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many rows have drifted.",
+        )
+
+    def handle(self, *args, **options):
+        posts, comments = reconcile_comment_counts(dry_run=options["dry_run"])
+        verb = "drifted" if options["dry_run"] else "fixed"
+        self.stdout.write(
+            self.style.SUCCESS(f"{posts} post and {comments} comment counters {verb}.")
+        )
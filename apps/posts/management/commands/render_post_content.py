@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from apps.posts.models import Post
+from apps.posts.rendering import render_many
+
+FIELDS = ["content_html", "excerpt", "reading_time"]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Render Post.content to HTML, excerpt and reading time for existing posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render every post, not only those never rendered.",
+        )
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.order_by("pk")
+        if not options["all"]:
+            queryset = queryset.filter(content_html="")
+        rows = queryset.values_list("pk", "content").iterator(chunk_size=2000)
+
+        started = time.perf_counter()
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            for results in pool.map(render_many, chunked(rows, options["batch_size"])):
+                Post.objects.bulk_update(
+                    [
+                        Post(pk=pk, content_html=html, excerpt=excerpt, reading_time=minutes)
+                        for pk, html, excerpt, minutes in results
+                    ],
+                    FIELDS,
+                )
+                rendered += len(results)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Rendered {rendered} posts in {elapsed:.1f}s.")
+        )
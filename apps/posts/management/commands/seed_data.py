@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from apps.posts.seeding import SEED_PASSWORD, Seeder
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, categories, posts and comment threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--categories", type=int, default=5)
+        parser.add_argument("--posts", type=int, default=100)
+        parser.add_argument(
+            "--comments", type=int, default=8, help="Average comments per post."
+        )
+        parser.add_argument(
+            "--max-depth", type=int, default=6, help="Deepest reply level."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        seeder = Seeder(seed=options["seed"], progress=self.stdout.write)
+        result = seeder.run(
+            users=options["users"],
+            categories=options["categories"],
+            posts=options["posts"],
+            comments=options["comments"],
+            max_depth=options["max_depth"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result['users']} users, {result['categories']} categories, "
+                f"{result['posts']} posts and {result['comments']} comments. "
+                f"Seeded users log in with the password {SEED_PASSWORD!r}."
+            )
+        )
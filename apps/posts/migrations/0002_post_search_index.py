@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from apps.posts.search import get_backend
+
+    get_backend(schema_editor.connection.vendor).create(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    from apps.posts.search import get_backend
+
+    get_backend(schema_editor.connection.vendor).drop(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
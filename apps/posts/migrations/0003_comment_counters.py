@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:09
+
+from django.db import migrations, models
+
+
+def count_existing_comments(apps, schema_editor):
+    from apps.posts.comments import reconcile_comment_counts
+
+    reconcile_comment_counts(
+        apps.get_model("posts", "Post"), apps.get_model("posts", "Comment")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0002_post_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="reply_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:16
+
+from django.db import migrations, models
+
+
+def render_existing_posts(apps, schema_editor):
+    from apps.posts.rendering import render
+
+    Post = apps.get_model("posts", "Post")
+    posts = list(Post.objects.only("id", "content"))
+    for post in posts:
+        post.content_html, post.excerpt, post.reading_time = render(post.content)
+    Post.objects.bulk_update(
+        posts, ["content_html", "excerpt", "reading_time"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_comment_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(render_existing_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def relate_existing_posts(apps, schema_editor):
+    from apps.posts.related import rebuild_related
+
+    rebuild_related(apps.get_model("posts", "Post"), apps.get_model("posts", "RelatedPost"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_rendered_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='posts.post')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post')),
+            ],
+            options={
+                'verbose_name': 'Related post',
+                'verbose_name_plural': 'Related posts',
+                'ordering': ['post', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('post', 'rank'), name='unique_related_rank')],
+            },
+        ),
+        migrations.RunPython(relate_existing_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-17 12:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRelatedUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.BigIntegerField(unique=True)),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Pending related update',
+                'verbose_name_plural': 'Pending related updates',
+                'indexes': [models.Index(fields=['queued_at'], name='posts_related_queued_idx')],
+            },
+        ),
+    ]
@@ -3,7 +3,10 @@ import os
 from django.contrib.auth.models import User
 from django.db import models
 from django.urls import reverse
-from django.utils.text import slugify
+from django.utils import timezone
+
+from . import rendering
+from .slugs import SlugAllocator, save_with_unique_slug
 
 
 def post_image_path(instance, filename):
@@ -18,8 +21,10 @@ class Category(models.Model):
     image = models.ImageField(upload_to="categories/", null=True, blank=True)
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+            self.slug = SlugAllocator(Category).allocate(self.name, exclude_pk=self.pk)
+        save_with_unique_slug(
+            self, self.name, lambda: super(Category, self).save(*args, **kwargs)
+        )
 
     def __str__(self):
         return self.name
@@ -38,25 +43,68 @@ class Post(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=250, unique=True, blank=True, null=True)
     content = models.TextField()
+    content_html = models.TextField(blank=True, editable=False)
+    excerpt = models.TextField(blank=True, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False)
     image = models.ImageField(upload_to=post_image_path, null=True, blank=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.ManyToManyField(Category)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="draft")
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_title = loaded.get("title")
+        instance._loaded_slug = loaded.get("slug")
+        instance._loaded_content = loaded.get("content")
+        return instance
+
+    def render_content(self):
+        self.content_html, self.excerpt, self.reading_time = rendering.render(
+            self.content
+        )
+        self._loaded_content = self.content
+
+    def _content_is_stale(self):
+        if "content" not in self.__dict__:
+            # Deferred and never touched, so it cannot have changed.
+            return False
+        return not self.content_html or self.content != getattr(
+            self, "_loaded_content", None
+        )
+
+    def _slug_is_stale(self):
+        if not self.slug or self._state.adding:
+            return True
+        if self.title == getattr(self, "_loaded_title", None):
+            return False
+        allocator = SlugAllocator(Post)
+        return allocator.suffix_of(self.slug, allocator.base_for(self.title)) is None
+
     def save(self, *args, **kwargs):
-        if not self.slug or self.slug != slugify(self.title):
-            self.slug = slugify(self.title)
-            original_slug = self.slug
-            counter = 1
-        while Post.objects.filter(slug=self.slug).exists():
-            self.slug = f"{original_slug}-{counter}"
-            counter += 1
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if (update_fields is None or "title" in update_fields) and self._slug_is_stale():
+            self.slug = SlugAllocator(Post).allocate(self.title, exclude_pk=self.pk)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "slug"}
+        update_fields = kwargs.get("update_fields")
+        if (update_fields is None or "content" in update_fields) and self._content_is_stale():
+            self.render_content()
+            if update_fields is not None:
+                kwargs["update_fields"] = {
+                    *update_fields, "content_html", "excerpt", "reading_time"
+                }
+        save_with_unique_slug(
+            self, self.title, lambda: super(Post, self).save(*args, **kwargs)
+        )
+        self._loaded_title = self.title
 
     def get_absolute_url(self):
         return reverse("post_detail", kwargs={"slug": self.slug})
@@ -65,6 +113,51 @@ class Post(models.Model):
         verbose_name = "Post"
         verbose_name_plural = "Posts"
         ordering = ["-created_at"]
+        indexes = [
+            # Home, search and the published count only ever look at
+            # published posts, newest first.
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(status="published"),
+                name="post_published_recent_idx",
+            ),
+        ]
+
+
+class RelatedPost(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="related_entries")
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"{self.post} -> {self.related}"
+
+    class Meta:
+        verbose_name = "Related post"
+        verbose_name_plural = "Related posts"
+        ordering = ["post", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["post", "rank"], name="unique_related_rank"),
+        ]
+
+
+class PendingRelatedUpdate(models.Model):
+    """
+    A post whose related lists the worker still has to refresh. Not a
+    foreign key: deleted posts are queued too, so they leave the lists.
+    """
+
+    post_id = models.BigIntegerField(unique=True)
+    queued_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return str(self.post_id)
+
+    class Meta:
+        verbose_name = "Pending related update"
+        verbose_name_plural = "Pending related updates"
+        indexes = [models.Index(fields=["queued_at"], name="posts_related_queued_idx")]
 
 
 class Comment(models.Model):
@@ -78,6 +171,15 @@ class Comment(models.Model):
     parent = models.ForeignKey(
         "self", on_delete=models.CASCADE, null=True, blank=True, related_name="replies"
     )
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored state so the counter signals can tell when a
+        # comment is switched on or off.
+        instance._loaded_is_active = dict(zip(field_names, values)).get("is_active")
+        return instance
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
@@ -86,3 +188,11 @@ class Comment(models.Model):
         verbose_name = "Comment"
         verbose_name_plural = "Comments"
         ordering = ["created_at"]
+        indexes = [
+            # The thread under a post, already in display order.
+            models.Index(
+                fields=["post", "created_at"],
+                condition=models.Q(is_active=True),
+                name="comment_active_thread_idx",
+            ),
+        ]
@@ -0,0 +1,119 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over a unique ordering such as ("-created_at", "-id").
+
+    Each page is fetched with a WHERE on the ordering columns instead of an
+    OFFSET, so page 500 costs the same as page 1 and no COUNT is needed.
+    The last field of the ordering must be unique to break ties.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip("-") for name in self.ordering]
+
+    def page(self, cursor=None):
+        if not cursor:
+            return self._page(None, forward=True)
+        forward, values = self.decode(cursor)
+        return self._page(values, forward)
+
+    def _page(self, values, forward):
+        queryset = self.queryset
+        ordering = self.ordering if forward else self._reversed(self.ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, forward))
+        rows = list(queryset.order_by(*ordering)[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not forward:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if forward and has_more or not forward and values is not None:
+                next_cursor = self.encode(rows[-1], forward=True)
+            if not forward and has_more or forward and values is not None:
+                previous_cursor = self.encode(rows[0], forward=False)
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def _after(self, values, forward):
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            descending = name.startswith("-")
+            lookup = "lt" if descending == forward else "gt"
+            step = Q(**{f"{self.fields[index]}__{lookup}": values[index]})
+            for field, value in zip(self.fields[:index], values[:index]):
+                step &= Q(**{field: value})
+            condition |= step
+        return condition
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(name[1:] if name.startswith("-") else f"-{name}" for name in ordering)
+
+    # -- cursor encoding ------------------------------------------------
+
+    def encode(self, obj, forward):
+        values = []
+        for field in self.fields:
+            value = obj.pk if field in ("id", "pk") else getattr(obj, field)
+            if hasattr(value, "isoformat"):
+                value = value.isoformat()
+            values.append(value)
+        payload = json.dumps(["n" if forward else "p", values], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in ("n", "p") or len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            return direction == "n", [
+                self._to_python(field, value) for field, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, TypeError, ValueError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+    def _to_python(self, field, value):
+        try:
+            model_field = self.queryset.model._meta.get_field(field)
+        except FieldDoesNotExist:
+            return value
+        return model_field.to_python(value)
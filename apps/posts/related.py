@@ -0,0 +1,337 @@
+"""
+Related posts, precomputed into the RelatedPost table.
+
+Each published post gets a TF-IDF vector over its title and content plus
+one component per category, so the dot product of two vectors is their
+text cosine plus a bonus for shared categories. Neighbours are found
+through an inverted index that keeps only the strongest postings of each
+term, which bounds the work per post no matter how large the blog grows.
+
+Saving a post queues its id in PendingRelatedUpdate. The worker
+(``rebuild_related_posts --loop``) keeps the corpus in memory, together
+with the document frequencies, re-vectorises only the queued posts and
+recomputes their lists and the lists they now enter or leave; the rest of
+the table is left alone.
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import PendingRelatedUpdate, Post, RelatedPost
+
+RELATED_LIMIT = 6
+TITLE_WEIGHT = 3
+TERMS_PER_POST = 30
+POSTINGS_PER_TERM = 100
+CATEGORY_WEIGHT = 0.3
+# Terms found in more than this share of the posts say nothing about
+# which ones are alike.
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+STOP_WORDS = frozenset(
+    """
+    about after again all also and any are because been before being between
+    both but can could did does doing down during each few for from further
+    had has have having her here hers him his how into its itself just more
+    most not now off once only other our ours out over own same she should
+    some such than that the their theirs them then there these they this
+    those through too under until very was were what when where which while
+    who whom why will with would you your yours
+    """.split()
+)
+
+_words = re.compile(r"[^\W\d_]{3,}")
+
+
+def terms(title, content):
+    counts = Counter(_words.findall((content or "").lower()))
+    for word in _words.findall((title or "").lower()):
+        counts[word] += TITLE_WEIGHT
+    for word in STOP_WORDS.intersection(counts):
+        del counts[word]
+    return counts
+
+
+class Corpus:
+    """Vectors and the pruned inverted index of every published post."""
+
+    def __init__(self, documents, categories):
+        # documents: {pk: (title, content)}, categories: {pk: {category ids}}
+        self.counts = {}
+        self.categories = {}
+        self.frequency = Counter()
+        self._add(documents, categories)
+        self.idf = self._idf()
+        self.vectors = {}
+        # Every posting of a term, and the strongest ones (computed when
+        # first needed, dropped when the term changes).
+        self.postings = defaultdict(dict)
+        self._top = {}
+        for pk in self.counts:
+            self._index(pk)
+
+    def _add(self, documents, categories):
+        for pk, (title, content) in documents.items():
+            counts = self.counts[pk] = terms(title, content)
+            self.frequency.update(counts.keys())
+            self.categories[pk] = set(categories.get(pk, ()))
+
+    def _idf(self):
+        total = len(self.counts)
+        ceiling = max(2, total * MAX_DOCUMENT_FREQUENCY)
+        return {
+            term: math.log((1 + total) / (1 + seen)) + 1
+            for term, seen in self.frequency.items()
+            if 0 < seen <= ceiling
+        }
+
+    def _index(self, pk):
+        vector = self.vectors[pk] = self._vector(self.counts[pk], self.categories[pk])
+        for term, weight in vector.items():
+            self.postings[term][pk] = weight
+            self._top.pop(term, None)
+
+    def _unindex(self, pk):
+        for term in self.vectors.pop(pk, ()):
+            postings = self.postings[term]
+            postings.pop(pk, None)
+            if not postings:
+                del self.postings[term]
+            self._top.pop(term, None)
+
+    def update(self, documents, categories, removed=()):
+        """
+        Replace the posts in ``documents`` and drop those in ``removed``.
+        Only these posts are re-vectorised: the document frequencies are
+        kept current, but the other vectors keep the weights they were
+        built with until the next full ``load()``.
+        """
+        for pk in {*documents, *removed}:
+            self._unindex(pk)
+            counts = self.counts.pop(pk, None)
+            if counts is not None:
+                self.frequency.subtract(counts.keys())
+            self.categories.pop(pk, None)
+        self._add(documents, categories)
+        self.idf = self._idf()
+        for pk in documents:
+            self._index(pk)
+
+    @classmethod
+    def load(cls, post_model=Post):
+        published = post_model.objects.filter(status="published")
+        documents = {
+            pk: (title, content)
+            for pk, title, content in published.values_list("pk", "title", "content")
+        }
+        categories = defaultdict(set)
+        through = post_model.category.through.objects.filter(post__status="published")
+        for post_id, category_id in through.values_list("post_id", "category_id"):
+            categories[post_id].add(category_id)
+        return cls(documents, categories)
+
+    def _vector(self, counts, category_ids):
+        weights = {
+            term: (1 + math.log(count)) * self.idf[term]
+            for term, count in counts.items()
+            if term in self.idf
+        }
+        strongest = heapq.nlargest(TERMS_PER_POST, weights.items(), key=lambda item: item[1])
+        norm = math.sqrt(sum(weight * weight for _, weight in strongest)) or 1.0
+        vector = {term: weight / norm for term, weight in strongest}
+        # Two posts sharing k of their a and b categories gain
+        # CATEGORY_WEIGHT * k / sqrt(a * b).
+        if category_ids:
+            weight = math.sqrt(CATEGORY_WEIGHT / len(category_ids))
+            for category_id in category_ids:
+                vector[("category", category_id)] = weight
+        return vector
+
+    def __contains__(self, pk):
+        return pk in self.vectors
+
+    def top(self, term):
+        """
+        The strongest postings of ``term``, newer posts first on ties. A
+        pair of posts only scores on terms where both are kept, so scores
+        stay symmetric.
+        """
+        top = self._top.get(term)
+        if top is None:
+            kept = heapq.nlargest(
+                POSTINGS_PER_TERM,
+                ((weight, pk) for pk, weight in self.postings[term].items()),
+            )
+            top = self._top[term] = {pk: weight for weight, pk in kept}
+        return top
+
+    def scores(self, pk):
+        """Similarity of ``pk`` to every post it shares an indexed term with."""
+        scores = defaultdict(float)
+        for term, weight in self.vectors.get(pk, {}).items():
+            top = self.top(term)
+            if pk in top:
+                for other, other_weight in top.items():
+                    scores[other] += weight * other_weight
+        scores.pop(pk, None)
+        return scores
+
+    def neighbours(self, pk, limit=RELATED_LIMIT, scores=None):
+        scores = self.scores(pk) if scores is None else scores
+        # Ties go to the newer post.
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+def _entries(related_model, pk, neighbours):
+    return [
+        related_model(post_id=pk, related_id=other, score=score, rank=rank)
+        for rank, (other, score) in enumerate(neighbours, 1)
+    ]
+
+
+def rebuild_related(post_model=Post, related_model=RelatedPost, limit=RELATED_LIMIT):
+    """Recompute the whole table. Returns the number of rows written."""
+    corpus = Corpus.load(post_model)
+    entries = []
+    for pk in corpus.vectors:
+        entries.extend(_entries(related_model, pk, corpus.neighbours(pk, limit)))
+    with transaction.atomic():
+        related_model.objects.all().delete()
+        related_model.objects.bulk_create(entries, batch_size=1000)
+    return len(entries)
+
+
+def update_related(post_ids, limit=RELATED_LIMIT, corpus=None):
+    """
+    Refresh the lists touched by changes to ``post_ids``: their own lists,
+    the lists that currently include them, and the lists they now score
+    high enough to enter. ``corpus`` must already reflect the changes; a
+    fresh one is loaded when it is not given.
+    """
+    post_ids = set(post_ids)
+    affected = set(
+        RelatedPost.objects.filter(related_id__in=post_ids).values_list("post_id", flat=True)
+    )
+    published = set(
+        Post.objects.filter(pk__in=post_ids, status="published").values_list("pk", flat=True)
+    )
+    if not published and not affected:
+        RelatedPost.objects.filter(post_id__in=post_ids).delete()
+        return
+
+    corpus = corpus or Corpus.load()
+    lists = {}
+    current = {
+        row["post_id"]: row
+        for row in RelatedPost.objects.exclude(post_id__in=post_ids)
+        .values("post_id")
+        .annotate(entries=Count("pk"), lowest=Min("score"))
+        .order_by()
+    }
+    for pk in published & corpus.vectors.keys():
+        scores = corpus.scores(pk)
+        lists[pk] = corpus.neighbours(pk, limit, scores)
+        # Similarity is symmetric, so these are also the scores the other
+        # posts give this one. Ties count, as they are broken by recency.
+        for other, score in scores.items():
+            row = current.get(other)
+            if row is None or row["entries"] < limit or score >= row["lowest"]:
+                affected.add(other)
+    for pk in affected - post_ids:
+        if pk in corpus:
+            lists[pk] = corpus.neighbours(pk, limit)
+
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=post_ids | affected).delete()
+        RelatedPost.objects.bulk_create(
+            entry
+            for pk, neighbours in lists.items()
+            for entry in _entries(RelatedPost, pk, neighbours)
+        )
+
+
+def refresh_corpus(corpus, post_ids, post_model=Post):
+    """Reload ``post_ids`` from the database into ``corpus``."""
+    published = post_model.objects.filter(pk__in=post_ids, status="published")
+    documents = {
+        pk: (title, content)
+        for pk, title, content in published.values_list("pk", "title", "content")
+    }
+    categories = defaultdict(set)
+    through = post_model.category.through.objects.filter(post_id__in=documents)
+    for post_id, category_id in through.values_list("post_id", "category_id"):
+        categories[post_id].add(category_id)
+    corpus.update(documents, categories, removed=set(post_ids) - documents.keys())
+
+
+def update_pending(corpus, batch_size=200):
+    """
+    Apply one batch of queued changes to ``corpus`` and the table. Returns
+    how many posts were handled. Posts queued again meanwhile stay queued.
+    """
+    started = timezone.now()
+    post_ids = set(
+        PendingRelatedUpdate.objects.order_by("queued_at").values_list(
+            "post_id", flat=True
+        )[:batch_size]
+    )
+    if not post_ids:
+        return 0
+    refresh_corpus(corpus, post_ids)
+    update_related(post_ids, corpus=corpus)
+    PendingRelatedUpdate.objects.filter(
+        post_id__in=post_ids, queued_at__lte=started
+    ).delete()
+    return len(post_ids)
+
+
+_pending = threading.local()
+
+
+def schedule_related_update(*post_ids):
+    """
+    Queue ``post_ids`` for the worker as part of the current transaction.
+    With RELATED_POSTS_SYNC they are updated right after the commit
+    instead, for development without a worker.
+    """
+    if not post_ids:
+        return
+    if getattr(settings, "RELATED_POSTS_SYNC", False):
+        if not hasattr(_pending, "ids"):
+            _pending.ids = set()
+        _pending.ids.update(post_ids)
+        transaction.on_commit(_flush_pending)
+        return
+    now = timezone.now()
+    PendingRelatedUpdate.objects.bulk_create(
+        [PendingRelatedUpdate(post_id=pk, queued_at=now) for pk in set(post_ids)],
+        update_conflicts=True,
+        unique_fields=["post_id"],
+        update_fields=["queued_at"],
+    )
+
+
+def _flush_pending():
+    # Several saves in one transaction register several callbacks; the
+    # first one does the work for all of them.
+    post_ids, _pending.ids = getattr(_pending, "ids", set()), set()
+    if post_ids:
+        update_related(post_ids)
+
+
+def related_posts_for(post, limit=3):
+    entries = (
+        RelatedPost.objects.filter(post=post, related__status="published")
+        .select_related("related__author")
+        .defer("related__content", "related__content_html")
+        .order_by("rank")[:limit]
+    )
+    return [entry.related for entry in entries]
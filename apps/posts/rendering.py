@@ -0,0 +1,51 @@
+"""
+Post body rendering, done once when a post is saved.
+
+Content is Markdown; single newlines become ``<br>`` so posts written as
+plain paragraphs render the way ``|linebreaks`` used to show them. Raw
+HTML in the source is escaped rather than passed through.
+"""
+
+import math
+import re
+from html import unescape
+
+from markdown_it import MarkdownIt
+
+EXCERPT_WORDS = 30
+WORDS_PER_MINUTE = 200
+
+_markdown = MarkdownIt("commonmark", {"html": False, "breaks": True}).enable(
+    ["table", "strikethrough"]
+)
+# Block tags and line breaks separate words; inline ones (<em>, <a>) don't.
+_breaks = re.compile(
+    r"</?(?:p|br|hr|h[1-6]|li|ul|ol|blockquote|pre|table|thead|tbody|tr|th|td)\b[^>]*>"
+)
+_tags = re.compile(r"<[^>]+>")
+_spaces = re.compile(r"\s+")
+
+
+def render_markdown(text):
+    return _markdown.render(text.replace("\r\n", "\n"))
+
+
+def plain_text(html):
+    text = _tags.sub("", _breaks.sub(" ", html))
+    return _spaces.sub(" ", unescape(text)).strip()
+
+
+def render(content):
+    """Return ``(content_html, excerpt, reading_time)`` for a post body."""
+    html = render_markdown(content or "")
+    words = plain_text(html).split()
+    excerpt = " ".join(words[:EXCERPT_WORDS])
+    if len(words) > EXCERPT_WORDS:
+        excerpt += "…"
+    reading_time = max(1, math.ceil(len(words) / WORDS_PER_MINUTE)) if words else 0
+    return html, excerpt, reading_time
+
+
+def render_many(rows):
+    """``[(pk, content), ...]`` to ``[(pk, html, excerpt, minutes), ...]``."""
+    return [(pk, *render(content)) for pk, content in rows]
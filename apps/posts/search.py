@@ -0,0 +1,210 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+FTS_TABLE = "posts_post_fts"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize_query(query):
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+class SQLiteSearchBackend:
+    """FTS5 index kept in a separate virtual table keyed by the post id."""
+
+    def create(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, content, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, content) "
+            f"SELECT id, title, content FROM {Post._meta.db_table}"
+        )
+
+    def drop(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    def index(self, posts):
+        rows = [(post.pk, post.title, post.content) for post in posts]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in post_ids]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    def filter(self, queryset, tokens):
+        # Every token must match, the last one as a prefix so partial words
+        # typed in the search box still find something.
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += "*"
+        match = " ".join(terms)
+        table = Post._meta.db_table
+        matches = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+        queryset = queryset.filter(pk__in=matches)
+        # bm25() is lower-is-better; negate it so callers sort descending.
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+                (match,),
+                output_field=FloatField(),
+            )
+        )
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector column on posts_post with a GIN index."""
+
+    config = "simple"
+
+    def create(self, schema_editor):
+        table = Post._meta.db_table
+        schema_editor.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS posts_post_search_vector_idx "
+            f"ON {table} USING GIN (search_vector)"
+        )
+        schema_editor.execute(f"UPDATE {table} SET search_vector = {self._vector_sql()}")
+
+    def drop(self, schema_editor):
+        table = Post._meta.db_table
+        schema_editor.execute("DROP INDEX IF EXISTS posts_post_search_vector_idx")
+        schema_editor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+
+    def _vector_sql(self):
+        return (
+            f"setweight(to_tsvector('{self.config}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{self.config}', coalesce(content, '')), 'B')"
+        )
+
+    def index(self, posts):
+        ids = [post.pk for post in posts]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Post._meta.db_table} SET search_vector = {self._vector_sql()} "
+                "WHERE id = ANY(%s)",
+                [ids],
+            )
+
+    def remove(self, post_ids):
+        # The vector lives on the post row and goes away with it.
+        pass
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {Post._meta.db_table} SET search_vector = NULL")
+
+    def filter(self, queryset, tokens):
+        tsquery = " & ".join(f"{token}:*" for token in tokens)
+        table = Post._meta.db_table
+        queryset = queryset.filter(
+            RawSQL(
+                f"{table}.search_vector @@ to_tsquery('{self.config}', %s)",
+                (tsquery,),
+                output_field=BooleanField(),
+            )
+        )
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f"ts_rank({table}.search_vector, to_tsquery('{self.config}', %s))",
+                (tsquery,),
+                output_field=FloatField(),
+            )
+        )
+
+
+class LikeSearchBackend:
+    """Unindexed fallback for database vendors without a full-text engine."""
+
+    def create(self, schema_editor):
+        pass
+
+    def drop(self, schema_editor):
+        pass
+
+    def index(self, posts):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def filter(self, queryset, tokens):
+        for token in tokens:
+            queryset = queryset.filter(
+                Q(title__icontains=token) | Q(content__icontains=token)
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_backend(vendor=None):
+    return BACKENDS.get(vendor or connection.vendor, LikeSearchBackend)()
+
+
+def search_posts(queryset, query):
+    tokens = tokenize_query(query)
+    if not tokens:
+        # Still annotated, so sorting by relevance works on no results.
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return get_backend().filter(queryset, tokens)
+
+
+def index_posts(posts):
+    posts = list(posts)
+    if posts:
+        get_backend().index(posts)
+
+
+def remove_posts(post_ids):
+    post_ids = list(post_ids)
+    if post_ids:
+        get_backend().remove(post_ids)
+
+
+def rebuild_index(batch_size=500):
+    backend = get_backend()
+    backend.clear()
+    total = 0
+    batch = []
+    for post in Post.objects.only("id", "title", "content").order_by("pk").iterator(
+        chunk_size=batch_size
+    ):
+        batch.append(post)
+        if len(batch) >= batch_size:
+            backend.index(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        backend.index(batch)
+        total += len(batch)
+    return total
@@ -0,0 +1,215 @@
+"""
+Synthetic data for development and benchmarks.
+
+Users come with profiles, posts go through ``PostImporter`` so they get
+slugs, rendered content and search rows like imported posts do, the
+related posts are rebuilt in one pass, and comments are built as
+threads: most replies continue the latest branch, so long conversations
+nest deeply the way real ones do. Counters are reconciled at the end.
+The same ``seed`` gives the same data.
+"""
+
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts.models import Profile
+
+from .comments import reconcile_comment_counts
+from .importers import PostImporter
+from .models import Category, Comment, Post
+from .related import rebuild_related
+from .slugs import SlugAllocator
+
+SEED_PASSWORD = "seed-password"
+USERNAME_PREFIX = "seed-user-"
+
+WORDS = """
+    cafe racer tank seat fairing clip-ons rearsets exhaust header carburettor
+    jetting piston cylinder head valve cam chain sprocket swingarm fork shock
+    spring damping tyre rim spoke hub brake caliper disc drum lever cable
+    throttle clutch gearbox crank bearing gasket wiring harness battery coil
+    spark plug ignition points timing headlight tail light indicator gauge
+    speedometer frame weld bracket powder coat paint primer chrome polish
+    leather stitching upholstery garage workshop bench vice spanner socket
+    torque wrench ride road corner apex lean weekend morning coffee espresso
+    route mountain coast highway rain dust engine restoration barn find build
+    project budget parts catalogue original vintage classic modern twin single
+    triple four stroke two rotary horsepower weight balance handling fuel oil
+    filter airbox pod intake manifold sound rumble bark idle rev tachometer
+    mirror handlebar grip footpeg kickstand centre stand mudguard number plate
+""".split()
+
+CATEGORY_TOPICS = (
+    "Builds", "Restoration", "Engines", "Electrics", "Suspension", "Brakes",
+    "Paint", "Rides", "Gear", "Events", "Tools", "Coffee", "Reviews",
+    "History", "Racing", "Tyres", "Upholstery", "Exhausts", "Carburettors",
+    "Frames",
+)
+
+
+class Seeder:
+    def __init__(self, seed=0, progress=None):
+        self.random = random.Random(seed)
+        self.progress = progress or (lambda message: None)
+
+    # -- text -----------------------------------------------------------
+
+    def words(self, low, high):
+        return " ".join(self.random.choices(WORDS, k=self.random.randint(low, high)))
+
+    def title(self):
+        return self.words(4, 9).capitalize()
+
+    def paragraphs(self, low, high):
+        return "\n\n".join(
+            self.words(40, 120).capitalize() + "."
+            for _ in range(self.random.randint(low, high))
+        )
+
+    # -- rows -----------------------------------------------------------
+
+    def create_users(self, count):
+        """``count`` users with profiles, all with the password SEED_PASSWORD."""
+        start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        password = make_password(SEED_PASSWORD)
+        users = User.objects.bulk_create(
+            User(
+                username=f"{USERNAME_PREFIX}{start + number}",
+                email=f"{USERNAME_PREFIX}{start + number}@example.com",
+                password=password,
+            )
+            for number in range(count)
+        )
+        # bulk_create skips the post_save signal that normally adds these.
+        Profile.objects.bulk_create(
+            Profile(
+                user=user,
+                bio=self.words(5, 30).capitalize(),
+                has_moto=self.random.random() < 0.7,
+            )
+            for user in users
+        )
+        return users
+
+    def create_categories(self, count):
+        existing = set(Category.objects.values_list("name", flat=True))
+        names = []
+        number = 0
+        while len(names) < count:
+            topic = CATEGORY_TOPICS[number % len(CATEGORY_TOPICS)]
+            round_ = number // len(CATEGORY_TOPICS)
+            name = topic if round_ == 0 else f"{topic} {round_ + 1}"
+            if name not in existing:
+                names.append(name)
+            number += 1
+        slugs = SlugAllocator(Category)
+        slugs.prime(slugs.base_for(name) for name in names)
+        return Category.objects.bulk_create(
+            Category(name=name, slug=slugs.allocate(name)) for name in names
+        )
+
+    def post_records(self, count, authors, categories, drafts=0.1):
+        now = timezone.now()
+        for _ in range(count):
+            picked = self.random.sample(
+                categories, k=min(len(categories), self.random.choice((1, 1, 2, 3)))
+            )
+            age = timedelta(minutes=self.random.randint(0, 2 * 365 * 24 * 60))
+            yield {
+                "title": self.title(),
+                "content": self.paragraphs(2, 8),
+                "author": self.random.choice(authors).username,
+                "categories": [category.name for category in picked],
+                "status": "draft" if self.random.random() < drafts else "published",
+                "created_at": (now - age).isoformat(),
+                "_source": "seed",
+            }
+
+    def create_posts(self, count, authors, categories):
+        last_pk = Post.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        importer = PostImporter(with_images=False, progress=self.progress)
+        importer.run(self.post_records(count, authors, categories))
+        rebuild_related()
+        return list(Post.objects.filter(pk__gt=last_pk).values_list("pk", flat=True))
+
+    def comment_threads(self, post_ids, per_post, max_depth, reply_ratio=0.6):
+        """
+        Plan the threads as ``(post_id, parent_index, depth)`` tuples, where
+        ``parent_index`` points at an earlier entry of the same list.
+        """
+        plan = []
+        for post_id in post_ids:
+            total = round(self.random.expovariate(1 / per_post)) if per_post else 0
+            thread = []
+            for _ in range(total):
+                parent = None
+                if thread and self.random.random() < reply_ratio:
+                    # Carry on the latest conversation, or now and then
+                    # answer something older.
+                    if self.random.random() < 0.7:
+                        parent = thread[-1]
+                    else:
+                        parent = self.random.choice(thread)
+                    if plan[parent][2] >= max_depth:
+                        parent = None
+                depth = 0 if parent is None else plan[parent][2] + 1
+                plan.append((post_id, parent, depth))
+                thread.append(len(plan) - 1)
+        return plan
+
+    def create_comments(self, post_ids, authors, per_post, max_depth):
+        plan = self.comment_threads(post_ids, per_post, max_depth)
+        pks = [None] * len(plan)
+        # One bulk insert per depth, so every parent already has its pk.
+        for depth in range(max_depth + 1):
+            level = [index for index, (_, _, d) in enumerate(plan) if d == depth]
+            if not level:
+                break
+            created = Comment.objects.bulk_create(
+                (
+                    Comment(
+                        post_id=plan[index][0],
+                        parent_id=None if plan[index][1] is None else pks[plan[index][1]],
+                        author=self.random.choice(authors),
+                        content=self.words(5, 60).capitalize(),
+                    )
+                    for index in level
+                ),
+                batch_size=1000,
+            )
+            for index, comment in zip(level, created):
+                pks[index] = comment.pk
+        return len(plan)
+
+    def run(self, users=10, categories=5, posts=100, comments=8, max_depth=6):
+        authors = self.create_users(users)
+        self.progress(f"{len(authors)} users")
+        new_categories = self.create_categories(categories)
+        self.progress(f"{len(new_categories)} categories")
+        post_ids = self.create_posts(posts, authors, new_categories)
+        with transaction.atomic():
+            total = self.create_comments(post_ids, authors, comments, max_depth)
+            reconcile_comment_counts()
+        self.progress(f"{total} comments")
+        return {
+            "users": len(authors),
+            "categories": len(new_categories),
+            "posts": len(post_ids),
+            "comments": total,
+        }
+
+
+def scaled(posts):
+    """``Seeder.run`` arguments for a blog of ``posts`` posts."""
+    return {
+        "users": max(3, posts // 20),
+        "categories": max(3, min(60, posts // 25)),
+        "posts": posts,
+        "comments": 8,
+        "max_depth": 6,
+    }
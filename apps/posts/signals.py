@@ -0,0 +1,208 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.urls import reverse
+
+from apps.core import pagecache
+
+from . import cards, search
+from .comments import adjust_comment_counters
+from .models import Category, Comment, Post, RelatedPost
+from .related import schedule_related_update
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"title", "content"} & update_fields:
+        return
+    search.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def relate_saved_post(sender, instance, raw, **kwargs):
+    if not raw:
+        schedule_related_update(instance.pk)
+
+
+@receiver(m2m_changed, sender=Post.category.through)
+def relate_recategorised_post(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        schedule_related_update(instance.pk)
+    else:
+        schedule_related_update(*(pk_set or ()))
+
+
+@receiver(pre_delete, sender=Post)
+def unrelate_deleted_post(sender, instance, **kwargs):
+    # The rows pointing at this post go with it; refill those lists, and
+    # let the worker drop the post from its corpus.
+    schedule_related_update(
+        instance.pk,
+        *RelatedPost.objects.filter(related=instance).values_list("post_id", flat=True),
+    )
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    was_active = False if created else getattr(instance, "_loaded_is_active", None)
+    if was_active is not None and was_active != instance.is_active:
+        # A new comment has no replies yet; a switched one takes its
+        # replies with it.
+        adjust_comment_counters(
+            instance, 1 if instance.is_active else -1, with_replies=not created
+        )
+    instance._loaded_is_active = instance.is_active
+
+
+@receiver(pre_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    # Before the delete, while the thread above and below still exists.
+    if isinstance(origin, Comment) and origin.pk != instance.pk:
+        # A reply going with the comment deleted below; counted there.
+        return
+    if isinstance(origin, Post):
+        # The post and its counter go too.
+        return
+    was_active = getattr(instance, "_loaded_is_active", None)
+    if was_active is None:
+        was_active = instance.is_active
+    if was_active:
+        # Deleting one comment removes its replies as well; comments
+        # deleted in a queryset are each counted on their own.
+        adjust_comment_counters(
+            instance, -1, with_replies=isinstance(origin, Comment)
+        )
+
+
+# -- page cache ---------------------------------------------------------
+
+
+def purge_on_commit(paths):
+    paths = set(paths)
+    transaction.on_commit(lambda: pagecache.purge(paths))
+
+
+def post_paths(post, category_slugs=None):
+    if category_slugs is None:
+        category_slugs = Category.objects.filter(post=post).values_list("slug", flat=True)
+    slugs = {post.slug, getattr(post, "_loaded_slug", None)} - {None, ""}
+    return [
+        reverse("home"),
+        *(reverse("post_detail", args=[slug]) for slug in slugs),
+        *(reverse("category_view", args=[slug]) for slug in category_slugs),
+    ]
+
+
+def category_paths(category):
+    posts = Post.objects.filter(category=category).exclude(slug=None)
+    return [
+        reverse("home"),
+        reverse("category_view", args=[category.slug]),
+        *(reverse("post_detail", args=[slug]) for slug in posts.values_list("slug", flat=True)),
+    ]
+
+
+@receiver(post_save, sender=Post)
+def purge_saved_post(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    purge_on_commit(post_paths(instance))
+    instance._loaded_slug = instance.slug
+
+
+@receiver(pre_delete, sender=Post)
+def purge_deleted_post(sender, instance, **kwargs):
+    # Before the delete, while the category rows still exist.
+    purge_on_commit(post_paths(instance))
+
+
+@receiver(m2m_changed, sender=Post.category.through)
+def purge_recategorised_post(sender, instance, action, pk_set, **kwargs):
+    if action not in ("pre_clear", "post_add", "post_remove"):
+        return
+    if kwargs["reverse"]:
+        purge_on_commit(category_paths(instance))
+        posts = Post.objects.filter(pk__in=pk_set or ()).exclude(slug=None)
+        purge_on_commit(
+            reverse("post_detail", args=[slug])
+            for slug in posts.values_list("slug", flat=True)
+        )
+    elif action == "pre_clear":
+        purge_on_commit(post_paths(instance))
+    else:
+        slugs = Category.objects.filter(pk__in=pk_set or ()).values_list("slug", flat=True)
+        purge_on_commit(post_paths(instance, slugs))
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def purge_category(sender, instance, raw=False, **kwargs):
+    if not raw:
+        purge_on_commit(category_paths(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_commented_post(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    slug = Post.objects.filter(pk=instance.post_id).values_list("slug", flat=True).first()
+    if slug:
+        purge_on_commit([reverse("post_detail", args=[slug])])
+
+
+# -- post cards ---------------------------------------------------------
+# Cards are keyed on the post's updated_at; these are the changes that
+# alter a card without touching its post row.
+
+
+def invalidate_cards_on_commit():
+    transaction.on_commit(cards.invalidate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def invalidate_category_cards(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_cards_on_commit()
+
+
+@receiver(m2m_changed, sender=Post.category.through)
+def invalidate_recategorised_cards(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_cards_on_commit()
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    # Read the raw value so a deferred username is not fetched.
+    instance._loaded_username = instance.__dict__.get("username")
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cards(sender, instance, created, raw, **kwargs):
+    # Logins, profile and password changes save the user too; only a
+    # rename changes what the cards show.
+    username = instance.__dict__.get("username")
+    renamed = username != getattr(instance, "_loaded_username", username)
+    instance._loaded_username = username
+    if created or raw or not renamed:
+        return
+    if Post.objects.filter(author=instance).exists():
+        invalidate_cards_on_commit()
@@ -0,0 +1,81 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+SUFFIX_ROOM = 8
+
+
+class SlugAllocator:
+    """
+    Hands out unique slugs for a model. Taken suffixes of a base slug
+    ("my-build", "my-build-1", "my-build-7", ...) are read with a single
+    prefix query and remembered, so one allocator can be reused to number a
+    whole batch of objects without going back to the database.
+    """
+
+    def __init__(self, model, field="slug"):
+        self.model = model
+        self.field = field
+        self.max_length = model._meta.get_field(field).max_length
+        self._taken = {}
+
+    def base_for(self, text):
+        base = slugify(text)[: self.max_length - SUFFIX_ROOM].strip("-")
+        return base or self.model._meta.model_name
+
+    def prime(self, bases, exclude_pk=None):
+        """Load the taken suffixes of every base in ``bases`` in one query."""
+        bases = [base for base in set(bases) if base not in self._taken]
+        if not bases:
+            return
+        prefixes = Q()
+        for base in bases:
+            self._taken[base] = set()
+            prefixes |= Q(**{f"{self.field}__startswith": base})
+        queryset = self.model._default_manager.filter(prefixes)
+        if exclude_pk is not None:
+            queryset = queryset.exclude(pk=exclude_pk)
+        for slug in queryset.values_list(self.field, flat=True).iterator():
+            for base in bases:
+                suffix = self.suffix_of(slug, base)
+                if suffix is not None:
+                    self._taken[base].add(suffix)
+
+    @staticmethod
+    def suffix_of(slug, base):
+        """0 for the bare base, N for "base-N", None if unrelated."""
+        if slug == base:
+            return 0
+        head, _, tail = slug.rpartition("-")
+        if head == base and tail.isdigit():
+            return int(tail)
+        return None
+
+    def allocate(self, text, exclude_pk=None):
+        base = self.base_for(text)
+        self.prime([base], exclude_pk=exclude_pk)
+        taken = self._taken[base]
+        suffix = max(taken) + 1 if taken else 0
+        taken.add(suffix)
+        return f"{base}-{suffix}" if suffix else base
+
+
+def save_with_unique_slug(instance, text, save, attempts=5):
+    """
+    Run ``save()`` and, if another writer took the same slug between
+    allocation and insert, allocate a fresh one from ``text`` and retry.
+    """
+    model = type(instance)
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic(using=instance._state.db):
+                return save()
+        except IntegrityError:
+            clash = (
+                model._default_manager.filter(slug=instance.slug)
+                .exclude(pk=instance.pk)
+                .exists()
+            )
+            if not clash or attempt == attempts - 1:
+                raise
+            instance.slug = SlugAllocator(model).allocate(text, exclude_pk=instance.pk)
@@ -0,0 +1,17 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from apps.posts.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, variant="grid"):
+    """
+    Render ``posts`` with the shared card partial, from the fragment cache
+    where possible.
+
+        {% post_cards new_reviews "compact" %}
+    """
+    return mark_safe("".join(render_cards(posts, variant)))
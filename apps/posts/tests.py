@@ -1,3 +1,851 @@
-from django.test import TestCase
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core import cache
+from apps.core.testing import QueryBudgetTestCase
+
+from . import related, rendering, search
+from .cards import render_cards
+from .comments import load_comment_thread, reconcile_comment_counts
+from .models import Category, Comment, PendingRelatedUpdate, Post, RelatedPost
+from .pagination import CursorPaginator, InvalidCursor
+from .slugs import SlugAllocator
+from .seeding import SEED_PASSWORD, Seeder, scaled
+
+
+class SeededTestCase(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeder = Seeder(seed=1)
+        cls.seeder.run(**scaled(20))
+        cls.authors = list(User.objects.all())
+        cls.categories = list(Category.objects.all())
+        cls.post = (
+            Post.objects.filter(status="published", comment_count__gt=0)
+            .order_by("pk")
+            .first()
+        )
+        cls.category = cls.post.category.first()
+
+    def add_posts(self, count=20):
+        self.seeder.create_posts(count, self.authors, [self.category])
+
+    def add_comments(self, post, count=10):
+        parent = None
+        for number in range(count):
+            # Alternate new threads and ever deeper replies.
+            parent = Comment.objects.create(
+                post=post,
+                author=self.authors[number % len(self.authors)],
+                content=f"Comment {number}",
+                parent=parent if number % 2 else None,
+            )
+
+
+class PublicViewQueryTests(SeededTestCase):
+    def setUp(self):
+        self.client.force_login(self.authors[0])
+
+    def test_post_detail(self):
+        def grow():
+            self.add_comments(self.post)
+            self.post.category.add(*self.categories)
+            self.add_posts()
+
+        self.assertQueryBudget(self.post.get_absolute_url(), 9, grow)
+
+    def test_category_view(self):
+        url = reverse("category_view", args=[self.category.slug])
+        # Cold cards prefetch their categories; warm ones skip that query.
+        self.assertQueryBudget(url, 8, self.add_posts)
+
+    def test_search(self):
+        url = f"{reverse('search')}?q=engine"
+        self.assertQueryBudget(url, 6, self.add_posts)
+
+    def test_comment_edit(self):
+        comment = Comment.objects.filter(post=self.post).first()
+        self.client.force_login(comment.author)
+        url = reverse("comment_edit", args=[comment.pk])
+        self.assertQueryBudget(url, 7, lambda: self.add_comments(self.post))
+
+
+class PublicViewPlanTests(SeededTestCase):
+    def test_post_detail(self):
+        self.assertNoFullScans(self.post.get_absolute_url())
+
+    def test_category_view(self):
+        self.assertNoFullScans(reverse("category_view", args=[self.category.slug]))
+
+    def test_search(self):
+        url = reverse("search")
+        self.assertNoFullScans(f"{url}?q=engine")
+        self.assertNoFullScans(url)
+        self.assertNoFullScans(f"{url}?category={self.category.pk}&sort=oldest")
+
+
+class AdminChangelistQueryTests(SeededTestCase):
+    def setUp(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "x")
+        )
+
+    def test_post_changelist(self):
+        url = reverse("admin:posts_post_changelist")
+        self.assertQueryBudget(url, 6, self.add_posts)
+
+    def test_category_changelist(self):
+        def grow():
+            self.seeder.create_categories(10)
+
+        self.assertQueryBudget(reverse("admin:posts_category_changelist"), 5, grow)
+
+    def test_comment_changelist(self):
+        self.assertQueryBudget(
+            reverse("admin:posts_comment_changelist"),
+            5,
+            lambda: self.add_comments(self.post, 30),
+        )
+
+
+class PostCardTests(SeededTestCase):
+    def setUp(self):
+        cache.clear_all()
+
+    def published(self):
+        return list(
+            Post.objects.filter(status="published")
+            .select_related("author")
+            .order_by("-created_at", "-id")[:6]
+        )
+
+    def test_warm_cards_are_not_rendered_or_queried_again(self):
+        cold = render_cards(self.published(), "grid")
+        posts = self.published()
+        with self.assertNumQueries(0):
+            warm = render_cards(posts, "grid")
+        self.assertEqual(warm, cold)
+        self.assertIn(posts[0].title, warm[0])
+
+    def test_variants_are_cached_apart(self):
+        post = self.published()[0]
+        grid, row = render_cards([post], "grid") + render_cards([post], "row")
+        self.assertNotEqual(grid, row)
+        self.assertIn("comment", row)
+
+    def test_edited_post_gets_a_new_card(self):
+        post = self.published()[0]
+        render_cards([post], "grid")
+        post.title = "A brand new title"
+        post.save()
+        self.assertIn("A brand new title", render_cards([post], "grid")[0])
+
+    def test_renamed_category_invalidates_cards(self):
+        post = self.published()[0]
+        category = post.category.first()
+        render_cards([post], "grid")
+        with self.captureOnCommitCallbacks(execute=True):
+            category.name = "Renamed category"
+            category.save()
+        self.assertIn("Renamed category", render_cards(self.published()[:1], "grid")[0])
+
+    def test_only_author_renames_invalidate_cards(self):
+        post = self.published()[0]
+        card = render_cards([post], "grid")[0]
+        author = User.objects.get(pk=post.author_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            author.email = "new@example.com"
+            author.set_password("another-password")
+            author.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(render_cards([post], "grid")[0], card)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            author.username = "renamed-author"
+            author.save()
+        self.assertIn("renamed-author", render_cards(self.published()[:1], "grid")[0])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("writer")
+        cls.in_title = Post.objects.create(
+            title="Engine rebuild", content="Pistons and rings.", author=cls.author,
+            status="published",
+        )
+        cls.in_content = Post.objects.create(
+            title="Carburettor tuning", content="Jets, then the engine idle.",
+            author=cls.author, status="published",
+        )
+        cls.draft = Post.objects.create(
+            title="Engine swap", content="Not ready.", author=cls.author
+        )
+
+    def search(self, query, queryset=None):
+        queryset = Post.objects.filter(status="published") if queryset is None else queryset
+        return search.search_posts(queryset, query).order_by("-search_rank", "-id")
+
+    def test_every_word_must_match(self):
+        self.assertEqual(list(self.search("engine idle")), [self.in_content])
+        self.assertFalse(self.search("engine gearbox").exists())
+        self.assertFalse(self.search("  ").exists())
+
+    def test_last_word_matches_as_a_prefix(self):
+        self.assertEqual(list(self.search("carbur")), [self.in_content])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(list(self.search("engine")), [self.in_title, self.in_content])
+
+    def test_unpublished_posts_are_excluded(self):
+        response = self.client.get(reverse("search"), {"q": "engine"})
+        self.assertContains(response, self.in_title.title)
+        self.assertNotContains(response, self.draft.title)
+
+    def test_index_follows_edits(self):
+        self.in_content.content = "Now about gearboxes."
+        self.in_content.save()
+        self.assertEqual(list(self.search("gearboxes")), [self.in_content])
+        self.assertEqual(list(self.search("engine")), [self.in_title])
+
+    def test_unrelated_field_saves_skip_the_index(self):
+        self.in_title.title = "Zeppelin"
+        self.in_title.save(update_fields=["status"])
+        self.assertFalse(self.search("zeppelin").exists())
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("reader")
+        cls.post = Post.objects.create(
+            title="Thread", content="Body", author=cls.author, status="published"
+        )
+
+    def comment(self, text, parent=None, **kwargs):
+        return Comment.objects.create(
+            post=self.post, author=self.author, content=text, parent=parent, **kwargs
+        )
+
+    def test_replies_nest_under_their_parents_in_order(self):
+        first = self.comment("first")
+        reply = self.comment("reply", first)
+        self.comment("nested", reply)
+        self.comment("second")
+        with self.assertNumQueries(1):
+            thread = load_comment_thread(self.post)
+        self.assertEqual([c.content for c in thread], ["first", "second"])
+        [child] = thread.roots[0].children
+        self.assertEqual((child.content, child.depth), ("reply", 1))
+        self.assertEqual(child.children[0].depth, 2)
+        self.assertEqual((len(thread), thread.count), (2, 4))
+
+    def test_hidden_comments_take_their_replies_with_them(self):
+        hidden = self.comment("hidden", is_active=False)
+        self.comment("orphan", hidden)
+        self.comment("shown")
+        thread = load_comment_thread(self.post)
+        self.assertEqual([c.content for c in thread], ["shown"])
+        self.assertEqual(thread.count, 1)
+
+
+class CommentCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("counter")
+        cls.post = Post.objects.create(
+            title="Counted", content="Body", author=cls.author, status="published"
+        )
+
+    def comment(self, parent=None, **kwargs):
+        return Comment.objects.create(
+            post=self.post, author=self.author, content="Hi", parent=parent, **kwargs
+        )
+
+    def counts(self, comment=None):
+        self.post.refresh_from_db()
+        if comment is None:
+            return self.post.comment_count
+        comment.refresh_from_db()
+        return self.post.comment_count, comment.reply_count
+
+    def test_create_and_delete(self):
+        parent = self.comment()
+        reply = self.comment(parent)
+        self.assertEqual(self.counts(parent), (2, 1))
+        reply.delete()
+        self.assertEqual(self.counts(parent), (1, 0))
+        parent.delete()
+        self.assertEqual(self.counts(), 0)
+
+    def test_deleting_a_parent_removes_its_replies(self):
+        parent = self.comment()
+        self.comment(self.comment(parent))
+        self.assertEqual(self.counts(), 3)
+        parent.delete()
+        self.assertEqual(self.counts(), 0)
+
+    def test_count_matches_the_thread_when_a_parent_is_hidden(self):
+        parent = self.comment()
+        self.comment(parent)
+        self.comment()
+        self.assertEqual(self.counts(parent), (3, 1))
+        parent.is_active = False
+        parent.save()
+        self.assertEqual(self.counts(), 1)
+        self.assertEqual(self.counts(), load_comment_thread(self.post).count)
+        parent.is_active = True
+        parent.save()
+        self.assertEqual(self.counts(parent), (3, 1))
+
+    def test_inactive_comments_are_not_counted(self):
+        parent = self.comment()
+        hidden = self.comment(parent, is_active=False)
+        self.assertEqual(self.counts(parent), (1, 0))
+        hidden.is_active = True
+        hidden.save()
+        self.assertEqual(self.counts(parent), (2, 1))
+
+    def test_drifted_counters_do_not_break_deletes(self):
+        parent = self.comment()
+        reply = self.comment(parent)
+        # Raw loads and queryset updates bypass the signals.
+        Comment.objects.filter(pk=parent.pk).update(reply_count=0)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=0)
+        reply.delete()
+        self.assertEqual(self.counts(parent), (0, 0))
+
+    def test_replies_under_a_hidden_comment_are_not_counted(self):
+        hidden = self.comment(is_active=False)
+        reply = self.comment(hidden)
+        self.comment(reply)
+        self.assertEqual(self.counts(hidden), (0, 1))
+        reply.delete()
+        self.assertEqual(self.counts(hidden), (0, 0))
+
+    def test_queryset_delete_counts_every_comment(self):
+        parent = self.comment()
+        reply = self.comment(parent)
+        self.comment(reply)
+        self.comment()
+        Comment.objects.filter(pk__in=[parent.pk, reply.pk]).delete()
+        self.assertEqual(self.counts(), 1)
+
+    def test_each_write_is_one_counter_update(self):
+        parent = self.comment()
+        # Insert, reply counter, ancestor check, post counter, and the
+        # post's slug for the page cache purge.
+        with self.assertNumQueries(5):
+            self.comment(parent)
+        with self.assertNumQueries(3):
+            self.comment()
+
+    def test_reconcile_fixes_drift(self):
+        parent = self.comment()
+        self.comment(parent)
+        self.comment(self.comment(is_active=False))
+        self.comment(self.comment(parent, is_active=False))
+        Post.objects.filter(pk=self.post.pk).update(comment_count=7)
+        Comment.objects.filter(pk=parent.pk).update(reply_count=0)
+        self.assertEqual(reconcile_comment_counts(dry_run=True), (1, 1))
+        self.assertEqual(reconcile_comment_counts(), (1, 1))
+        self.assertEqual(self.counts(parent), (2, 1))
+        self.assertEqual(self.counts(), load_comment_thread(self.post).count)
+        self.assertEqual(reconcile_comment_counts(), (0, 0))
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user("pager")
+        cls.category = Category.objects.create(name="Paged")
+        Post.objects.bulk_create(
+            Post(
+                title=f"Post {n}",
+                slug=f"post-{n}",
+                content="Body",
+                author=author,
+                status="published",
+            )
+            for n in range(7)
+        )
+        # Every post shares one timestamp, so only the id breaks ties.
+        Post.objects.update(created_at=timezone.now())
+        cls.ids = list(Post.objects.order_by("-id").values_list("id", flat=True))
+        cls.category.post_set.add(*cls.ids)
+
+    def paginator(self):
+        return CursorPaginator(Post.objects.all(), 3, ("-created_at", "-id"))
+
+    def ids_of(self, page):
+        return [post.pk for post in page]
+
+    def test_pages_forward_and_back_through_ties(self):
+        paginator = self.paginator()
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(
+            self.ids_of(first) + self.ids_of(second) + self.ids_of(third), self.ids
+        )
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+        self.assertEqual(self.ids_of(paginator.page(third.previous_cursor)), self.ids[3:6])
+        self.assertEqual(self.ids_of(paginator.page(second.previous_cursor)), self.ids[:3])
+
+    def test_bad_cursors_are_rejected(self):
+        paginator = self.paginator()
+        for cursor in ("not base64!", "e30", "WyJ4IixbXV0", "WyJuIiw1XQ"):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+
+    def test_tampered_cursors_are_a_404(self):
+        cursor = self.paginator().page().next_cursor
+        tampered = cursor[:-4] + "AAAA"
+        for url in (reverse("category_view", args=[self.category.slug]), reverse("search")):
+            for bad in ("garbage", tampered):
+                with self.subTest(url=url, cursor=bad):
+                    response = self.client.get(url, {"cursor": bad})
+                    self.assertEqual(response.status_code, 404)
+
+
+class SlugTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("slugger")
+
+    def post(self, title):
+        return Post.objects.create(title=title, content="Body", author=self.author)
+
+    def test_collisions_get_the_next_free_suffix(self):
+        self.assertEqual(self.post("My build").slug, "my-build")
+        self.assertEqual(self.post("My build").slug, "my-build-1")
+        self.post("My build log")
+        Post.objects.filter(slug="my-build-1").update(slug="my-build-7")
+        self.assertEqual(self.post("My  Build!").slug, "my-build-8")
+
+    def test_batches_take_one_query(self):
+        self.post("Batch")
+        allocator = SlugAllocator(Post)
+        with self.assertNumQueries(1):
+            slugs = [allocator.allocate("Batch") for _ in range(3)]
+        self.assertEqual(slugs, ["batch-1", "batch-2", "batch-3"])
+
+    def test_retitling_keeps_a_slug_of_the_same_base(self):
+        self.post("Same")
+        post = self.post("Same")
+        post.title = "SAME"
+        post.save()
+        self.assertEqual(post.slug, "same-1")
+        post.title = "Different"
+        post.save()
+        self.assertEqual(post.slug, "different")
+
+    def test_empty_titles_fall_back_to_the_model_name(self):
+        self.assertEqual(self.post("!!!").slug, "post")
+
+    def test_a_slug_taken_meanwhile_is_reallocated(self):
+        Category.objects.create(name="Race")
+        # Allocated before the other writer committed "race".
+        late = Category(name="Race!", slug="race")
+        late.save()
+        self.assertEqual(late.slug, "race-1")
+
+
+class ImportPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("importer")
+        Category.objects.create(name="Engines")
+        Post.objects.create(title="Old timer", content="Body", author=cls.author)
+
+    def import_(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_posts", *args, "--no-images", stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_jsonl(self):
+        records = [
+            {
+                "title": "Old timer",
+                "content": "Some *engine* talk.",
+                "author": "importer",
+                "categories": ["Engines", "Paint"],
+                "created_at": "2024-05-01T10:00:00",
+            },
+            {"title": "No body", "author": "importer"},
+            {"title": "Stranger", "content": "Hi", "author": "nobody"},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "posts.jsonl"
+            path.write_text("\n".join(map(json.dumps, records)), encoding="utf-8")
+            out, err = self.import_(str(path))
+
+        self.assertIn("Imported 1 posts", out)
+        self.assertIn("title and content are required", err)
+        self.assertIn("unknown author 'nobody'", err)
+        post = Post.objects.get(slug="old-timer-1")
+        self.assertEqual(post.status, "published")
+        self.assertEqual(post.created_at.year, 2024)
+        self.assertIn("<em>engine</em>", post.content_html)
+        self.assertEqual(
+            sorted(post.category.values_list("name", flat=True)), ["Engines", "Paint"]
+        )
+        self.assertEqual(Category.objects.count(), 2)
+        found = search.search_posts(Post.objects.all(), "engine")
+        self.assertEqual(list(found), [post])
+
+    def test_markdown_folder(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, "first-ride.md").write_text(
+                "---\ncategories: Rides, Engines\nstatus: draft\n---\n"
+                "# First ride\n\nBody.",
+                encoding="utf-8",
+            )
+            Path(directory, "untitled_notes.md").write_text("Just notes.", encoding="utf-8")
+            self.import_(directory, "--author", "importer")
+
+        first = Post.objects.get(title="First ride")
+        self.assertEqual(first.status, "draft")
+        self.assertEqual(first.content, "Body.")
+        self.assertEqual(first.category.count(), 2)
+        self.assertTrue(Post.objects.filter(title="untitled notes").exists())
+
+    def test_missing_source(self):
+        with self.assertRaisesMessage(CommandError, "does not exist"):
+            self.import_("/nonexistent/posts.jsonl")
+
+
+class RenderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("writer")
+
+    def test_save_renders_markdown(self):
+        post = Post.objects.create(
+            title="Beans", content="**Bold** roast\nnext line <script>x</script>", author=self.author
+        )
+        self.assertIn("<strong>Bold</strong> roast<br />", post.content_html)
+        self.assertIn("&lt;script&gt;", post.content_html)
+        self.assertEqual(post.excerpt, "Bold roast next line <script>x</script>")
+        self.assertEqual(post.reading_time, 1)
+
+        post.content = "Changed"
+        post.save(update_fields=["content"])
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, "<p>Changed</p>\n")
+
+    def test_excerpt_and_reading_time(self):
+        words = " ".join(f"word{n}" for n in range(450))
+        html, excerpt, minutes = rendering.render(f"# Title\n\n{words}")
+        self.assertTrue(html.startswith("<h1>Title</h1>"))
+        self.assertEqual(len(excerpt.split()), rendering.EXCERPT_WORDS)
+        self.assertTrue(excerpt.startswith("Title word0 "))
+        self.assertTrue(excerpt.endswith("…"))
+        self.assertEqual(minutes, 3)
+        self.assertEqual(rendering.render(""), ("", "", 0))
+
+    def test_loaddata_then_render_post_content(self):
+        fixture = [
+            {
+                "model": "posts.post",
+                "pk": 900,
+                "fields": {
+                    "title": "Fixture",
+                    "slug": "fixture",
+                    "content": "From a *fixture*.",
+                    "author": self.author.pk,
+                    "status": "published",
+                    "created_at": "2024-01-01T00:00:00Z",
+                    "updated_at": "2024-01-01T00:00:00Z",
+                },
+            }
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "posts.json"
+            path.write_text(json.dumps(fixture), encoding="utf-8")
+            call_command("loaddata", str(path), verbosity=0)
+        # Raw saves bypass Post.save(), as in build.sh.
+        self.assertEqual(Post.objects.get(pk=900).content_html, "")
+
+        call_command("render_post_content", "--workers", "1", stdout=StringIO())
+        post = Post.objects.get(pk=900)
+        self.assertEqual(post.content_html, "<p>From a <em>fixture</em>.</p>\n")
+        self.assertEqual(post.excerpt, "From a fixture.")
+        self.assertEqual(post.reading_time, 1)
+
+
+class RelatedPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("writer")
+        cls.coffee = Category.objects.create(name="Coffee")
+        cls.bikes = Category.objects.create(name="Bikes")
+        cls.espresso = cls.create(
+            "Espresso basics", "Espresso grind, espresso crema and tamping pressure.", cls.coffee
+        )
+        cls.crema = cls.create(
+            "Chasing crema", "Crema depends on grind, tamping and fresh espresso beans.", cls.coffee
+        )
+        cls.filter = cls.create("Filter coffee", "Paper filter, pour over and bloom.", cls.coffee)
+        cls.chain = cls.create("Chain care", "Clean the chain, then lube the chain.", cls.bikes)
+        cls.create("Tyre pressure", "Pump tyres before every ride.", cls.bikes)
+        cls.create("Brake pads", "Worn pads squeal; swap pads early.", cls.bikes)
+        cls.create("Saddle height", "Set saddle height for long rides.", cls.bikes)
+        cls.draft = cls.create(
+            "Espresso draft", "Espresso crema grind tamping espresso.", cls.coffee, "draft"
+        )
+
+    @classmethod
+    def create(cls, title, content, category, status="published"):
+        post = Post.objects.create(title=title, content=content, author=cls.author, status=status)
+        post.category.add(category)
+        return post
+
+    def test_rebuild_ranks_similar_posts_first(self):
+        related.rebuild_related()
+        self.assertEqual(related.related_posts_for(self.espresso)[:2], [self.crema, self.filter])
+        self.assertNotIn(self.espresso, related.related_posts_for(self.chain))
+
+    def test_unpublished_posts_are_left_out(self):
+        related.rebuild_related()
+        self.assertFalse(RelatedPost.objects.filter(post=self.draft).exists())
+        self.assertFalse(RelatedPost.objects.filter(related=self.draft).exists())
+
+    def test_saves_are_queued_for_the_worker(self):
+        self.assertEqual(
+            set(PendingRelatedUpdate.objects.values_list("post_id", flat=True)),
+            set(Post.objects.values_list("pk", flat=True)),
+        )
+        corpus = related.Corpus.load()
+        self.assertEqual(related.update_pending(corpus), 8)
+        self.assertFalse(PendingRelatedUpdate.objects.exists())
+        self.assertEqual(related.related_posts_for(self.espresso)[:1], [self.crema])
+
+    def test_worker_only_revectorises_changed_posts(self):
+        related.rebuild_related()
+        PendingRelatedUpdate.objects.all().delete()
+        corpus = related.Corpus.load()
+        untouched = corpus.vectors[self.espresso.pk]
+
+        self.draft.status = "published"
+        self.draft.save()
+        chain_pk = self.chain.pk
+        self.chain.delete()
+        queued = set(PendingRelatedUpdate.objects.values_list("post_id", flat=True))
+        self.assertLessEqual({self.draft.pk, chain_pk}, queued)
+        self.assertEqual(related.update_pending(corpus), len(queued))
+
+        self.assertIs(corpus.vectors[self.espresso.pk], untouched)
+        self.assertIn(self.draft.pk, corpus)
+        self.assertNotIn(chain_pk, corpus)
+        self.assertEqual(related.related_posts_for(self.draft)[:1], [self.espresso])
+        self.assertIn(self.draft, related.related_posts_for(self.crema))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user("reader")
+        cls.category = Category.objects.create(name="Roasts")
+        cls.post = Post.objects.create(
+            title="Light roast", content="Bright.", author=cls.reader, status="published"
+        )
+        cls.post.category.add(cls.category)
+
+    def setUp(self):
+        cache.clear_all()
+        # Logged in, so the page cache stays out of the way.
+        self.client.force_login(self.reader)
+        self.urls = [
+            reverse("home"),
+            self.post.get_absolute_url(),
+            reverse("category_view", args=[self.category.slug]),
+        ]
+
+    def etag(self, url):
+        # The first visit sets the CSRF cookie, which is part of the ETag.
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+        return response["ETag"]
+
+    def test_matching_etag_gets_304(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.etag(url)
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+                self.assertEqual(response["ETag"], etag)
+
+    def test_if_modified_since_gets_304(self):
+        url = self.post.get_absolute_url()
+        self.client.get(url)
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_give_a_new_etag(self):
+        etags = {url: self.etag(url) for url in self.urls}
+        Comment.objects.create(post=self.post, author=self.reader, content="Nice")
+        response = self.client.get(self.urls[1], HTTP_IF_NONE_MATCH=etags[self.urls[1]])
+        self.assertEqual(response.status_code, 200)
+
+        self.post.title = "Lighter roast"
+        self.post.save()
+        for url in (self.urls[0], self.urls[2]):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+
+    def test_renamed_author_gives_a_new_etag(self):
+        etags = {url: self.etag(url) for url in self.urls}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.username = "roaster"
+            self.reader.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etags[url])
+
+    def test_etag_is_per_viewer(self):
+        url = self.post.get_absolute_url()
+        etag = self.etag(url)
+        self.client.force_login(User.objects.create_user("other"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.client.logout()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_post_is_still_404(self):
+        response = self.client.get(
+            reverse("post_detail", args=["nope"]), HTTP_IF_NONE_MATCH="*"
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user("reader")
+        cls.category = Category.objects.create(name="Roasts")
+        cls.post = Post.objects.create(
+            title="Light roast", content="Bright.", author=cls.reader, status="published"
+        )
+        cls.post.category.add(cls.category)
+
+    def setUp(self):
+        cache.clear_all()
+        self.url = self.post.get_absolute_url()
+
+    def assertCache(self, url, state):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Page-Cache"], state)
+        return response
+
+    def test_anonymous_pages_are_cached(self):
+        for url in (reverse("home"), self.url, reverse("category_view", args=[self.category.slug])):
+            with self.subTest(url=url):
+                self.assertCache(url, "miss")
+                self.assertCache(url, "hit")
+
+    def test_hits_answer_conditional_requests(self):
+        etag = self.assertCache(self.url, "miss")["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+
+    def test_logged_in_pages_are_not_cached(self):
+        self.client.force_login(self.reader)
+        self.client.get(self.url)
+        self.assertNotIn("X-Page-Cache", self.client.get(self.url))
+
+    def test_comment_purges_the_post_page(self):
+        home = reverse("home")
+        self.assertCache(self.url, "miss")
+        self.assertCache(home, "miss")
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.reader, content="Fresh crema")
+        self.assertContains(self.assertCache(self.url, "miss"), "Fresh crema")
+        self.assertCache(self.url, "hit")
+        self.assertCache(home, "hit")
+
+    def test_post_edit_purges_its_listings(self):
+        category_url = reverse("category_view", args=[self.category.slug])
+        for url in (reverse("home"), self.url, category_url):
+            self.assertCache(url, "miss")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = "Medium roast"
+            self.post.save()
+        for url in (reverse("home"), category_url):
+            with self.subTest(url=url):
+                self.assertContains(self.assertCache(url, "miss"), "Medium roast")
+        # The slug followed the title; the old page is no longer served.
+        self.assertNotEqual(self.post.get_absolute_url(), self.url)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class SeederTests(TestCase):
+    def test_run_builds_a_consistent_blog(self):
+        out = StringIO()
+        call_command(
+            "seed_data", "--users", "4", "--categories", "3", "--posts", "30",
+            "--comments", "6", "--max-depth", "3", "--seed", "2", stdout=out,
+        )
+        self.assertIn("Created 4 users, 3 categories, 30 posts", out.getvalue())
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertFalse(Post.objects.filter(content_html="").exists())
+        self.assertFalse(Post.objects.filter(category=None).exists())
+        self.assertTrue(RelatedPost.objects.exists())
+        self.assertEqual(reconcile_comment_counts(dry_run=True), (0, 0))
+
+        depth = {}
+        for pk, parent_id in Comment.objects.order_by("pk").values_list("pk", "parent_id"):
+            depth[pk] = 0 if parent_id is None else depth[parent_id] + 1
+        self.assertLessEqual(max(depth.values()), 3)
+        self.assertGreater(max(depth.values()), 0)
+
+        user = User.objects.get(username="seed-user-0")
+        self.assertTrue(user.profile.bio)
+        self.assertTrue(self.client.login(username=user.username, password=SEED_PASSWORD))
+        title = Post.objects.filter(status="published").earliest("pk").title
+        self.assertTrue(search.search_posts(Post.objects.all(), title.split()[0]).exists())
+
+    def test_same_seed_same_data(self):
+        def plan(seed):
+            seeder = Seeder(seed=seed)
+            records = list(seeder.post_records(5, [User(username="a")], [Category(name="c")]))
+            threads = seeder.comment_threads(range(5), per_post=8, max_depth=4)
+            return [(r["title"], r["content"], r["status"]) for r in records], threads
+
+        self.assertEqual(plan(4), plan(4))
+        self.assertNotEqual(plan(4), plan(5))
+        _, threads = plan(4)
+        self.assertTrue(all(depth <= 4 for _, _, depth in threads))
+
+    def test_runs_add_up(self):
+        seeder = Seeder(seed=1)
+        seeder.run(**scaled(10))
+        seeder.run(**scaled(10))
+        self.assertEqual(Post.objects.count(), 20)
+        seeded_users = User.objects.filter(username__startswith="seed-user-")
+        self.assertEqual(seeded_users.count(), 2 * scaled(10)["users"])
+        self.assertEqual(Category.objects.count(), 2 * scaled(10)["categories"])
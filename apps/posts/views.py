@@ -1,53 +1,122 @@
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.db.models import Q
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db.models import Count, Max, Q
+from django.http import Http404
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
 from django.views.generic import CreateView, DeleteView, ListView, UpdateView
 
+from apps.core.concurrency import gather
+from apps.core.conditional import conditional_page
+from apps.core.replicas import replica_reads
+
+from . import cards, search
+from .comments import load_comment_thread
 from .forms import CommentForm, PostForm, PostSearchForm
 from .models import Category, Comment, Post
+from .pagination import CursorPaginator, InvalidCursor
+from .related import related_posts_for
+
+
+def post_detail_version(request, slug):
+    row = (
+        Post.objects.filter(slug=slug, status="published")
+        .annotate(last_comment=Max("comments__updated_at"))
+        .values_list("pk", "updated_at", "comment_count", "last_comment")
+        .first()
+    )
+    if row is None:
+        return None
+    updated_at, last_comment = row[1], row[3]
+    # Author and category names are not on the post row; a rename moves
+    # the cards version instead.
+    return (row, cards.version()), max(filter(None, (updated_at, last_comment)))
+
+
+def _add_comment(request, post, form):
+    """Handle a comment POST; returns a redirect, or None to show the errors."""
+    if not request.user.is_authenticated:
+        messages.error(request, "You must be logged in to comment.")
+        return redirect("login")
+
+    if form.is_valid():
+        new_comment = form.save(commit=False)
+        new_comment.post = post
+        new_comment.author = request.user
+        new_comment.save()
+
+        messages.success(request, "Comment added successfully!")
+        return redirect("post_detail", slug=post.slug)
+    messages.error(
+        request,
+        "There was an error with your comment. Please try again.",
+    )
+    return None
 
 
-def post_detail(request, slug):
-    post = get_object_or_404(Post, slug=slug, status="published")
-    comments = post.comments.filter(is_active=True, parent=None)
+@replica_reads
+@conditional_page(post_detail_version)
+async def post_detail(request, slug):
+    post = await aget_object_or_404(
+        Post.objects.select_related("author", "author__profile").defer("content"),
+        slug=slug,
+        status="published",
+    )
     form = CommentForm(request.POST or None)
     if request.method == "POST":
-        if not request.user.is_authenticated:
-            messages.error(request, "You must be logged in to comment.")
-            return redirect("login")
-
-        if form.is_valid():
-            new_comment = form.save(commit=False)
-            new_comment.post = post
-            new_comment.author = request.user
-            new_comment.save()
-
-            messages.success(request, "Comment added successfully!")
-            return redirect("post_detail", slug=post.slug)
-        else:
-            messages.error(
-                request,
-                "There was an error with your comment. Please try again.",
-            )
+        response = await sync_to_async(_add_comment)(request, post, form)
+        if response is not None:
+            return response
+    comments, related_posts = await gather(
+        lambda: load_comment_thread(post),
+        lambda: related_posts_for(post),
+    )
     context = {
         "post": post,
         "comments": comments,
+        "related_posts": related_posts,
         "form": form,
     }
-    return render(request, "posts/post_detail.html", context)
+    return await sync_to_async(render)(request, "posts/post_detail.html", context)
+
+
+def category_version(request, category_slug):
+    published = Q(post__status="published")
+    row = (
+        Category.objects.filter(slug=category_slug)
+        .annotate(
+            latest=Max("post__updated_at", filter=published),
+            total=Count("post", filter=published),
+        )
+        .values_list("pk", "name", "image", "latest", "total")
+        .first()
+    )
+    if row is None:
+        return None
+    return (row, cards.version()), row[3]
 
 
+@replica_reads
+@conditional_page(category_version)
 def category_view(request, category_slug):
     category = get_object_or_404(Category, slug=category_slug)
-    posts = Post.objects.filter(category=category, status="published").order_by(
-        "-created_at"
+    posts = (
+        Post.objects.filter(category=category, status="published")
+        .select_related("author")
+        .defer("content", "content_html")
     )
+    paginator = CursorPaginator(posts, 12, ("-created_at", "-id"))
+    try:
+        page = paginator.page(request.GET.get("cursor"))
+    except InvalidCursor:
+        raise Http404("Invalid page.")
     context = {
         "category": category,
-        "posts": posts,
+        "posts": page,
+        "page_obj": page,
     }
     return render(request, "posts/category_view.html", context)
 
@@ -85,11 +154,19 @@ def comment_delete(request, comment_id):
     return render(request, "posts/comment_delete_confirm.html", context)
 
 
+@method_decorator(replica_reads, name='get')
 class PostSearchView(ListView):
     model = Post
     template_name = 'posts/search_results.html'
     context_object_name = 'results'
     paginate_by = 12
+    sort_mapping = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+        'title_asc': ('title', 'id'),
+        'title_desc': ('-title', '-id'),
+        'relevance': ('-search_rank', '-id'),
+    }
 
     def get_queryset(self):
         queryset = Post.objects.filter(status='published')
@@ -99,31 +176,51 @@ class PostSearchView(ListView):
         sort_by = self.request.GET.get('sort', 'newest')
 
         if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) | Q(content__icontains=query)
-            ).distinct()
+            queryset = search.search_posts(queryset, query)
+        elif sort_by == 'relevance':
+            sort_by = 'newest'
 
         if category_id:
             queryset = queryset.filter(category__id=category_id)
 
-        sort_mapping = {
-            'newest': '-created_at',
-            'oldest': 'created_at',
-            'title_asc': 'title',
-            'title_desc': '-title',
+        self.ordering = self.sort_mapping.get(sort_by, self.sort_mapping['newest'])
+        return (
+            queryset.select_related('author')
+            .defer('content', 'content_html')
+            .order_by(*self.ordering)
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.get_ordering())
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid page.")
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        page, categories = await gather(
+            lambda: self.paginate_queryset(queryset, self.paginate_by)[1],
+            lambda: list(Category.objects.all()),
+        )
+        form = PostSearchForm(request.GET or None)
+        field = form.fields['category']
+        field.choices = [('', field.empty_label)] + [
+            (category.pk, category.name) for category in categories
+        ]
+        context = {
+            'view': self,
+            'results': page.object_list,
+            'object_list': page.object_list,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'form': form,
+            'query': request.GET.get('q', ''),
+            'current_category': request.GET.get('category', ''),
+            'current_sort': request.GET.get('sort', 'newest'),
         }
-        order_by_field = sort_mapping.get(sort_by, '-created_at')
-        queryset = queryset.order_by(order_by_field)
-        
-        return queryset
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['form'] = PostSearchForm(self.request.GET or None)
-        context['query'] = self.request.GET.get('q', '')
-        context['current_category'] = self.request.GET.get('category', '')
-        context['current_sort'] = self.request.GET.get('sort', 'newest')
-        return context
+        return await sync_to_async(render)(request, self.template_name, context)
 
 
 class PostCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
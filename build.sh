@@ -2,6 +2,9 @@ set -o errexit
 
 pip install -r requirements.txt
 
+python manage.py build_icons
 python manage.py collectstatic --no-input
 python manage.py migrate
-python manage.py loaddata initial_data.json
\ No newline at end of file
+python manage.py loaddata initial_data.json
+python manage.py render_post_content
+python manage.py rebuild_related_posts
\ No newline at end of file
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 import dj_database_url
@@ -50,7 +51,7 @@ INSTALLED_APPS = [
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.messages",
-    "django.contrib.staticfiles",
+    "apps.core.apps.StaticFilesConfig",
     'cloudinary_storage',
     'cloudinary',
     # My Apps
@@ -60,14 +61,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "apps.core.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "apps.core.middleware.StaticFilesMiddleware",
+    "apps.core.middleware.ReplicaMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "apps.core.middleware.AnonymousPageCacheMiddleware",
 ]
 
 # ======================================================================
@@ -76,7 +80,7 @@ MIDDLEWARE = [
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "apps.core.timing.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -103,6 +107,103 @@ DATABASES = {
 if 'DATABASE_URL' in os.environ:
     DATABASES['default'] = dj_database_url.config(conn_max_age=600)
 
+# Read replicas, as comma-separated database URLs. Read-only views use
+# them unless the browser wrote something in the last REPLICA_PIN_SECONDS;
+# a replica that fails a health check is skipped for
+# REPLICA_HEALTH_INTERVAL seconds. See apps.core.replicas.
+DATABASE_REPLICAS = []
+for number, url in enumerate(
+    filter(None, os.getenv("DATABASE_REPLICA_URLS", "").split(",")), start=1
+):
+    alias = f"replica{number}"
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ["apps.core.replicas.ReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 10))
+REPLICA_HEALTH_INTERVAL = int(os.getenv("REPLICA_HEALTH_INTERVAL", 30))
+
+# Production SQLite profile, applied to every new connection. WAL lets
+# readers carry on while a comment is written, and BEGIN IMMEDIATE takes
+# the write lock when a transaction starts, so concurrent writers wait on
+# busy_timeout instead of failing with "database is locked" halfway
+# through. WAL needs the database on a local disk, not a network share.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    # Negative values are KiB rather than pages.
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),
+    "temp_store": "MEMORY",
+}
+SQLITE_OPTIONS = {
+    "init_command": ";".join(
+        f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+    ),
+    "transaction_mode": "IMMEDIATE",
+}
+if (
+    DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3'
+    and os.getenv("SQLITE_PRODUCTION", "True") == "True"
+):
+    DATABASES['default'].setdefault('OPTIONS', {}).update(SQLITE_OPTIONS)
+
+# Let async views run independent queries on separate threads and
+# connections. Leave off for SQLite test databases, which live in memory
+# and are invisible to other threads.
+CONCURRENT_ORM_QUERIES = os.getenv("CONCURRENT_ORM_QUERIES", "False") == "True"
+
+# ======================================================================
+# CACHE
+# ======================================================================
+
+# Shared (L2) cache for apps.core.cache. Every worker also keeps a small
+# in-process LRU (L1) in front of it.
+if "REDIS_URL" in os.environ:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv(
+                "CACHE_DIR", os.path.join(tempfile.gettempdir(), "caffeinelane-cache")
+            ),
+            "TIMEOUT": 300,
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+CACHE_L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", 1024))
+CACHE_L1_TIMEOUT = int(os.getenv("CACHE_L1_TIMEOUT", 5))
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 5
+CACHE_STATS_FLUSH_INTERVAL = 10
+
+# Whole pages served to logged-out readers; purged when content changes.
+PAGE_CACHE_TIMEOUT = int(os.getenv("PAGE_CACHE_TIMEOUT", 600))
+
+# Rendered post cards, keyed on the post's updated_at.
+POST_CARD_TIMEOUT = int(os.getenv("POST_CARD_TIMEOUT", 3600))
+
+# ======================================================================
+# PERFORMANCE LOG
+# ======================================================================
+
+# Share of requests written to PERF_LOG_FILE (0 turns the log off; the
+# Server-Timing header is always sent). Each process writes its own
+# perf.<pid>.jsonl next to it; perf_report reads them all.
+PERF_SAMPLE_RATE = float(os.getenv("PERF_SAMPLE_RATE", 0))
+PERF_LOG_FILE = os.getenv("PERF_LOG_FILE", BASE_DIR / "logs" / "perf.jsonl")
+PERF_LOG_MAX_BYTES = int(os.getenv("PERF_LOG_MAX_BYTES", 10 * 1024 * 1024))
+PERF_LOG_BACKUPS = int(os.getenv("PERF_LOG_BACKUPS", 5))
+
 # ======================================================================
 # PASSWORD VALIDATION
 # ======================================================================
@@ -132,9 +233,42 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
+# Generated assets (the Font Awesome subset from `manage.py build_icons`).
+STATIC_BUILD_DIR = BASE_DIR / "static_build"
+if STATIC_BUILD_DIR.is_dir():
+    STATICFILES_DIRS.append(STATIC_BUILD_DIR)
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Resized copies generated for post, category and avatar uploads.
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1024, 1600)
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", 2))
+IMAGE_DERIVATIVES_SYNC = os.getenv("IMAGE_DERIVATIVES_SYNC", "False") == "True"
+
+# Related posts are refreshed by "rebuild_related_posts --loop"; set this
+# to refresh them after each commit instead (development only).
+RELATED_POSTS_SYNC = os.getenv("RELATED_POSTS_SYNC", "False") == "True"
+
+# ======================================================================
+# EMAIL
+# ======================================================================
+
+# Views only queue mail; `manage.py send_queued_mail --loop` delivers it
+# through MAIL_QUEUE_BACKEND.
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "apps.core.mail.QueuedEmailBackend")
+MAIL_QUEUE_BACKEND = os.getenv(
+    "MAIL_QUEUE_BACKEND", "django.core.mail.backends.smtp.EmailBackend"
+)
+MAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv("MAIL_QUEUE_MAX_ATTEMPTS", 5))
+MAIL_QUEUE_RETRY_DELAY = int(os.getenv("MAIL_QUEUE_RETRY_DELAY", 60))
+
+EMAIL_HOST = os.getenv("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", 25))
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "False") == "True"
+EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", 10))
+
 # ======================================================================
 # AUTHENTICATION
 # ======================================================================
@@ -144,20 +278,33 @@ LOGIN_REDIRECT_URL = "/home/"
 LOGOUT_REDIRECT_URL = "home"
 
 # ======================================================================
-# CLOUDINARY
+# MEDIA STORAGE
 # ======================================================================
 
-STORAGES = {
-    "default": {
+# "cloudinary" uploads to Cloudinary; "local" keeps uploads under
+# MEDIA_ROOT, deduplicated by content hash and served by Django with
+# immutable cache headers.
+MEDIA_STORAGE = os.getenv("MEDIA_STORAGE", "cloudinary")
+
+MEDIA_STORAGE_BACKENDS = {
+    "cloudinary": {
         "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
-        },
-    "staticfiles": {
-        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
-        },
+    },
+    "local": {
+        "BACKEND": "apps.core.storage.ContentAddressedStorage",
+    },
 }
 
-CLOUDINARY_STORAGE = {
-    'CLOUD_NAME': env('CLOUD_NAME'),
-    'API_KEY': env('CLOUD_API_KEY'),
-    'API_SECRET': env('CLOUD_API_SECRET'),
+STORAGES = {
+    "default": MEDIA_STORAGE_BACKENDS[MEDIA_STORAGE],
+    "staticfiles": {
+        "BACKEND": "apps.core.storage.StaticStorage",
+    },
 }
+
+if MEDIA_STORAGE == "cloudinary":
+    CLOUDINARY_STORAGE = {
+        'CLOUD_NAME': env('CLOUD_NAME'),
+        'API_KEY': env('CLOUD_API_KEY'),
+        'API_SECRET': env('CLOUD_API_SECRET'),
+    }